@@ -0,0 +1,319 @@
+# account_state.py
+# In-memory positions / open orders / balance, seeded once from REST and
+# kept current from the futures user-data stream (ACCOUNT_UPDATE,
+# ORDER_TRADE_UPDATE, ACCOUNT_CONFIG_UPDATE, ALGO_UPDATE). Readers get
+# answers without a signed round trip.
+
+import json
+import threading
+import time
+
+from websockets.sync.client import connect
+
+import config
+import logs
+import market_data
+import metrics
+
+LISTEN_KEY_KEEPALIVE = 30 * 60  # seconds; Binance expires keys after 60 min
+RESYNC_INTERVAL = 5 * 60        # periodic REST reseed (liquidation prices etc.)
+RECONNECT_DELAY_MAX = 30
+ALGO_REFRESH_DELAY = 1          # seconds; coalesces listings for payloads we cannot apply
+ALGO_OPEN_STATUSES = ('NEW', 'TRIGGERING')
+
+
+def _format_stream_order(o):
+    return {
+        'orderId': o['i'],
+        'type': o['o'],
+        'side': o['S'],
+        'price': float(o.get('sp') or 0) or float(o.get('p') or 0),
+        'origQty': float(o['q']),
+        'status': o['X'],
+        'reduceOnly': bool(o.get('R', False))
+    }
+
+
+def _format_stream_algo_order(o):
+    return {
+        'orderId': o['aid'],
+        'type': o.get('o'),
+        'side': o.get('S'),
+        'price': float(o.get('tp') or 0) or float(o.get('p') or 0),
+        'origQty': float(o.get('q') or 0),
+        'status': o['X'],
+        'algo': True
+    }
+
+
+def _leverage_of(row):
+    """Leverage of a position row; positionRisk v3 rows carry only the margin"""
+    if row.get('leverage'):
+        return int(float(row['leverage']))
+    margin = float(row.get('initialMargin') or 0)
+    if margin > 0:
+        return max(1, round(abs(float(row.get('notional') or 0)) / margin))
+    return None
+
+
+class AccountState:
+    """
+    seed(client) must return {"positions": [...futures_position_information rows],
+    "orders": {symbol: [formatted orders]}, "balance": (wallet, margin)}.
+    refresh_algo_orders() returns {symbol: [formatted algo orders]}; it is
+    called (debounced, off the stream thread) only for an ALGO_UPDATE whose
+    payload cannot be applied directly.
+    """
+
+    def __init__(self, client, seed, refresh_algo_orders, base_url=None):
+        self.client = client
+        self.seed = seed
+        self.refresh_algo_orders = refresh_algo_orders
+        self.base_url = (base_url or config.FSTREAM_URL).rstrip('/')
+
+        self.positions = {}
+        self.orders = {}
+        self.algo_orders = {}
+        self.leverage = {}      # symbol -> leverage, whether or not a position is open
+        self.balance = (None, None)
+        self.connected = False
+        self.seeded_at = 0
+        self.version = 0   # bumped on every change to positions/orders/balance
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._reseed_due = False
+        self._algo_refresh = None
+
+    # ── readers ──────────────────────────────────────────────────
+    @property
+    def ready(self):
+        return self.connected and self.seeded_at > 0
+
+    def _with_mark(self, row):
+        """Fill in the streamed mark price; row is the caller's copy"""
+        mark = market_data.get_price(row['symbol'])
+        if mark is not None:
+            amt = float(row['positionAmt'])
+            row['markPrice'] = str(mark)
+            row['notional'] = str(amt * mark)
+            row['unRealizedProfit'] = str((mark - float(row['entryPrice'])) * amt)
+        return row
+
+    # The stream thread updates rows in place, so readers copy them under
+    # the lock and work on the copies.
+    def get_positions(self):
+        """Open positions in futures_position_information row format"""
+        with self._lock:
+            rows = [dict(p) for p in self.positions.values() if float(p['positionAmt']) != 0]
+        return [self._with_mark(row) for row in rows]
+
+    def get_position(self, symbol):
+        with self._lock:
+            row = self.positions.get(symbol)
+            if row is None or float(row['positionAmt']) == 0:
+                return None
+            row = dict(row)
+        return self._with_mark(row)
+
+    def get_orders_by_symbol(self):
+        grouped = {}
+        with self._lock:
+            for book in (self.orders, self.algo_orders):
+                for symbol, orders in book.items():
+                    grouped.setdefault(symbol, []).extend(dict(o) for o in orders.values())
+        return grouped
+
+    def get_balance(self):
+        return self.balance
+
+    # ── seeding ──────────────────────────────────────────────────
+    def reseed(self):
+        snapshot = self.seed(self.client)
+        with self._lock:
+            self.positions = {p['symbol']: dict(p) for p in snapshot['positions'] if p.get('positionSide', 'BOTH') == 'BOTH'}
+            for symbol, row in self.positions.items():
+                lev = _leverage_of(row)
+                if lev:
+                    self.leverage[symbol] = lev
+                    row['leverage'] = str(lev)
+            self.orders = {}
+            self.algo_orders = {}
+            for symbol, orders in snapshot['orders'].items():
+                for o in orders:
+                    if o.get('algo'):
+                        self.algo_orders.setdefault(symbol, {})[o['orderId']] = o
+                    else:
+                        self.orders.setdefault(symbol, {})[o['orderId']] = o
+            self.balance = snapshot['balance']
+            self._reseed_due = False
+            self.seeded_at = time.time()
+            self.version += 1
+
+    # ── stream events ────────────────────────────────────────────
+    def _recompute_margin(self):
+        """Initial margin of the positions plus that of resting LIMIT entries"""
+        wallet, _ = self.balance
+        margin = 0.0
+        for p in self.positions.values():
+            lev = self.leverage.get(p['symbol']) or int(p.get('leverage') or 1)
+            margin += abs(float(p['positionAmt']) * float(p['entryPrice'])) / max(lev, 1)
+        for symbol, orders in self.orders.items():
+            lev = self.leverage.get(symbol) or 1
+            for o in orders.values():
+                if o['type'] == 'LIMIT' and not o.get('reduceOnly'):
+                    margin += o['origQty'] * o['price'] / max(lev, 1)
+        self.balance = (wallet, margin)
+
+    def _apply_algo_update(self, o):
+        """ALGO_UPDATE payload -> local algo-order map; False if it lacks the fields"""
+        if 'aid' not in o or 'X' not in o or not o.get('s'):
+            return False
+        orders = self.algo_orders.setdefault(o['s'], {})
+        if o['X'] in ALGO_OPEN_STATUSES:
+            if not o.get('S'):
+                return o['aid'] in orders
+            orders[o['aid']] = _format_stream_algo_order(o)
+        else:
+            orders.pop(o['aid'], None)
+        return True
+
+    def _schedule_algo_refresh(self):
+        """One full algo listing ALGO_REFRESH_DELAY s after the first unappliable event"""
+        if self._algo_refresh is not None and self._algo_refresh.is_alive():
+            return
+        self._algo_refresh = threading.Timer(ALGO_REFRESH_DELAY, self._refresh_algo_orders)
+        self._algo_refresh.daemon = True
+        self._algo_refresh.start()
+
+    def _refresh_algo_orders(self):
+        try:
+            grouped = self.refresh_algo_orders()
+        except Exception as e:
+            logs.warning("algo_orders_refresh_failed", error=str(e))
+            return
+        with self._lock:
+            self.algo_orders = {symbol: {o['orderId']: o for o in orders} for symbol, orders in grouped.items()}
+            self.version += 1
+
+    def handle_event(self, event):
+        kind = event.get('e')
+        metrics.WS_MESSAGES.inc(stream="userData")
+        if event.get('E'):
+            metrics.WS_LAG.observe(max(0.0, time.time() - event['E'] / 1000), stream="userData")
+        with self._lock:
+            if kind == 'ACCOUNT_UPDATE':
+                for b in event['a'].get('B', []):
+                    if b['a'] == 'USDT':
+                        self.balance = (float(b['wb']), self.balance[1])
+                for p in event['a'].get('P', []):
+                    if p.get('ps', 'BOTH') != 'BOTH':
+                        continue
+                    row = self.positions.get(p['s'])
+                    if row is None:
+                        lev = self.leverage.get(p['s'])
+                        if lev is None:
+                            # Leverage never seen: reseed for it and the liquidation price
+                            self._reseed_due = True
+                        row = self.positions[p['s']] = {
+                            'symbol': p['s'], 'leverage': str(lev or 1), 'markPrice': '0',
+                            'liquidationPrice': '0', 'notional': '0'
+                        }
+                    row['positionAmt'] = p['pa']
+                    row['entryPrice'] = p['ep']
+                    row['unRealizedProfit'] = p['up']
+                    row['notional'] = str(float(p['pa']) * float(row.get('markPrice') or p['ep']))
+                self._recompute_margin()
+
+            elif kind == 'ORDER_TRADE_UPDATE':
+                o = event['o']
+                orders = self.orders.setdefault(o['s'], {})
+                if o['X'] in ('NEW', 'PARTIALLY_FILLED'):
+                    orders[o['i']] = _format_stream_order(o)
+                else:
+                    orders.pop(o['i'], None)
+                self._recompute_margin()
+
+            elif kind == 'ACCOUNT_CONFIG_UPDATE' and 'ac' in event:
+                symbol, lev = event['ac']['s'], int(event['ac']['l'])
+                self.leverage[symbol] = lev
+                row = self.positions.get(symbol)
+                if row is not None:
+                    row['leverage'] = str(lev)
+                self._recompute_margin()
+
+            elif kind == 'ALGO_UPDATE':
+                if not self._apply_algo_update(event.get('o') or {}):
+                    self._schedule_algo_refresh()
+            self.version += 1
+
+        if kind == 'listenKeyExpired':
+            raise ConnectionError("listenKey expired")
+
+    # ── lifecycle ────────────────────────────────────────────────
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="user-data-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        delay = 1
+        while not self._stop.is_set():
+            try:
+                listen_key = self.client.futures_stream_get_listen_key()
+                with connect(f"{self.base_url}/ws/{listen_key}", open_timeout=10) as ws:
+                    # Seed after subscribing so no event falls in the gap
+                    self.reseed()
+                    self.connected = True
+                    metrics.WS_CONNECTED.set(1, stream="userData")
+                    delay = 1
+                    logs.info("ws_connected", stream="userData")
+                    last_keepalive = time.time()
+                    while not self._stop.is_set():
+                        now = time.time()
+                        if now - last_keepalive > LISTEN_KEY_KEEPALIVE:
+                            self.client.futures_stream_keepalive(listenKey=listen_key)
+                            last_keepalive = now
+                        if self._reseed_due or now - self.seeded_at > RESYNC_INTERVAL:
+                            self.reseed()
+                        try:
+                            message = ws.recv(timeout=1)
+                        except TimeoutError:
+                            continue
+                        self.handle_event(json.loads(message))
+            except Exception as e:
+                if not self._stop.is_set():
+                    metrics.WS_RECONNECTS.inc(stream="userData")
+                    logs.warning("ws_disconnected", stream="userData", error=str(e), reconnect_in=delay)
+            finally:
+                self.connected = False
+                metrics.WS_CONNECTED.set(0, stream="userData")
+            self._stop.wait(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def start(client, seed, refresh_algo_orders):
+    """Start the shared store once per process"""
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = AccountState(client, seed, refresh_algo_orders)
+        _state.start()
+    return _state
+
+
+def get_state():
+    """The store if it is seeded and its stream is live, otherwise None"""
+    if _state is not None and _state.ready:
+        return _state
+    return None
@@ -0,0 +1,104 @@
+# accounts.py
+# Registry of Binance sub-accounts for fan-out trading. The main account
+# (config.BINANCE_KEY) stays on logic.get_client(); every sub-account listed
+# in config.ACCOUNTS_FILE gets its own client and its own keep-alive transport
+# (connection pool + signer). All of them share the process-wide server-clock
+# tracker (clock.py): the offset is per host, not per key.
+
+import json
+import os
+import threading
+
+import config
+import logs
+from transport import SignedTransport
+
+MAIN_ACCOUNT = "main"
+
+
+class Account:
+    """Credentials plus the per-account connection state (client built by logic)"""
+
+    def __init__(self, account_id, api_key, api_secret):
+        self.id = account_id
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.transport = SignedTransport(api_key, api_secret, account=account_id)
+        self.client = None
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.client = None
+        self.transport.close()
+
+
+def _credential(entry, name):
+    """Key from the file, or from the environment variable it names"""
+    if entry.get(name):
+        return entry[name]
+    env_name = entry.get(f"{name}_env")
+    return os.getenv(env_name) if env_name else None
+
+
+def load_accounts(path=None):
+    """{id: Account} from the accounts file; missing file = no sub-accounts"""
+    path = path or config.ACCOUNTS_FILE
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        entries = json.load(f)
+
+    accounts = {}
+    for entry in entries:
+        account_id = str(entry.get("id") or "").strip()
+        api_key, api_secret = _credential(entry, "api_key"), _credential(entry, "api_secret")
+        if not account_id or account_id == MAIN_ACCOUNT:
+            logs.warning("account_skipped", account=repr(account_id), reason="no usable id")
+            continue
+        if not api_key or not api_secret:
+            logs.warning("account_skipped", account=account_id, reason="missing API key/secret")
+            continue
+        accounts[account_id] = Account(account_id, api_key, api_secret)
+
+    logs.info("accounts_loaded", count=len(accounts), path=path)
+    return accounts
+
+
+_accounts = None
+_accounts_lock = threading.Lock()
+
+
+def _registry():
+    global _accounts
+    if _accounts is None:
+        with _accounts_lock:
+            if _accounts is None:
+                _accounts = load_accounts()
+    return _accounts
+
+
+def register(account_id, api_key, api_secret):
+    """Add (or replace) a sub-account at runtime"""
+    global _accounts
+    account = Account(account_id, api_key, api_secret)
+    _registry()
+    with _accounts_lock:
+        # Copy-on-write: readers iterate the old dict without locking
+        registry = dict(_accounts)
+        old = registry.get(account_id)
+        registry[account_id] = account
+        _accounts = registry
+    if old is not None:
+        old.close()
+    return account
+
+
+def get(account_id):
+    """Registered sub-account, or None"""
+    return _registry().get(account_id)
+
+
+def ids():
+    """Registered sub-account ids, in file order"""
+    return list(_registry())
@@ -1,9 +1,16 @@
-from flask import Flask, render_template, request, session, jsonify, redirect, url_for, Response
-from datetime import datetime
+from flask import Flask, render_template, request, session, jsonify, redirect, url_for, Response, g
+from datetime import datetime, timezone
 import logic
+import accounts
+import governor
+import live_feed
+import metrics
+import export
+import sizing
+import warmup
 import os
-import csv
-import io
+import queue
+import time
 
 app = Flask(__name__)
 app.secret_key = "trading_secret_key_ultra_secure_2025"
@@ -11,6 +18,23 @@ app.secret_key = "trading_secret_key_ultra_secure_2025"
 # Use simple client-side sessions
 app.config['SESSION_PERMANENT'] = False
 
+# Connect, preload and open the streams in the background (per process)
+warmup.start()
+
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _record_latency(response):
+    """Per-route latency histogram, labelled by the URL rule (not the raw path)"""
+    start = g.pop("request_start", None)
+    if start is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - start, route=rule,
+                                     method=request.method, status=str(response.status_code))
+    return response
+
 @app.route("/get_live_price/<symbol>")
 def live_price_api(symbol):
     """Get live price for a symbol"""
@@ -25,22 +49,105 @@ def get_open_positions_api():
 
 @app.route("/get_trade_history")
 def get_trade_history_api():
-    """FIX #1: Get COMPLETE trade history from Binance (500 trades)"""
-    trades = logic.get_trade_history()
+    """FIX #1: Get COMPLETE trade history from the local trade store (paged)"""
+    trades = logic.get_trade_history(
+        limit=request.args.get("limit", 500, type=int),
+        offset=request.args.get("offset", 0, type=int),
+        symbol=request.args.get("symbol") or None
+    )
     return jsonify({"trades": trades})
 
+@app.route("/stream")
+def stream():
+    """
+    Server-Sent Events: shared positions/fills/price snapshot, sent as diffs.
+    Each open tab holds one worker thread for as long as it is connected, so
+    run Flask threaded (gunicorn --worker-class gthread --threads N) or serve
+    the dashboard from async_app, where a stream is a coroutine.
+    """
+    symbol = request.args.get("symbol", "BTCUSDT")
+    stats = logic.get_today_stats()
+    q = live_feed.subscribe(symbol)
+
+    def events():
+        try:
+            # Limits only change after an order POST, which reloads the page
+            yield live_feed.format_event("stats", stats)
+            while live_feed.is_subscribed(q):
+                try:
+                    event, data = q.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield live_feed.format_event(event, data)
+        finally:
+            live_feed.unsubscribe(q)
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route("/get_today_stats")
 def get_today_stats_api():
     """Get today's trade statistics for limit display"""
     stats = logic.get_today_stats()
     return jsonify(stats)
 
+@app.route("/rate_limits")
+def rate_limits_api():
+    """Current request-weight / order-count budget usage"""
+    return jsonify(governor.snapshot())
+
+@app.route("/ready")
+def ready_api():
+    """Start-up readiness: 200 once connected (ready or degraded), 503 before"""
+    state = warmup.snapshot()
+    return jsonify(state), 200 if state["ready"] else 503
+
+@app.route("/metrics")
+def metrics_api():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route("/sizing/batch", methods=["POST"])
+def sizing_batch_api():
+    """Position sizing for a whole watchlist in one call (columnar JSON arrays)"""
+    data = request.get_json() or {}
+    try:
+        symbols, entries, sl_types, sl_values, sides = sizing.request_columns(data)
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    if not all(entries):
+        prices = logic.get_live_prices([s for s, e in zip(symbols, entries) if not e])
+        entries = [e or prices.get(s, 0) for s, e in zip(symbols, entries)]
+
+    unutilized = data.get('unutilized')
+    if unutilized is None:
+        balance, margin = logic.get_live_balance()
+        unutilized = max((balance or 0.0) - (margin or 0.0), 0.0)
+
+    rows = logic.calculate_position_sizing_batch(float(unutilized), symbols, entries, sl_types, sl_values, sides)
+    return jsonify({"success": True, "unutilized": round(float(unutilized), 2), "rows": rows})
+
+@app.route("/portfolio_risk")
+def portfolio_risk_api():
+    """Vectorized risk over all open positions (exposure, liquidation, SL, shocks)"""
+    return jsonify(logic.get_portfolio_risk())
+
 @app.route("/close_position/<symbol>", methods=["POST"])
 def close_position_api(symbol):
     """Close entire position for a symbol"""
     result = logic.close_position(symbol)
     return jsonify(result)
 
+@app.route("/close_all", methods=["POST"])
+def close_all_api():
+    """Close every open position: batched market closes, then parallel SL/TP cancels"""
+    return jsonify(logic.close_all_positions())
+
 @app.route("/partial_close", methods=["POST"])
 def partial_close_api():
     """Partial close position"""
@@ -68,42 +175,92 @@ def update_sl_api():
     result = logic.update_stop_loss(symbol, new_sl_percent)
     return jsonify(result)
 
+@app.route("/accounts")
+def accounts_api():
+    """Registered sub-accounts (ids only) available for fan-out"""
+    return jsonify({"main": accounts.MAIN_ACCOUNT, "accounts": accounts.ids()})
+
+@app.route("/fanout_trade", methods=["POST"])
+def fanout_trade_api():
+    """Place the same bracket in several accounts, each sized on its own balance"""
+    data = request.get_json()
+    symbol = data.get('symbol')
+    if not symbol:
+        return jsonify({"success": False, "message": "Symbol required"})
+
+    entry = float(data.get('entry') or logic.get_live_price(symbol) or 0)
+    if entry <= 0:
+        return jsonify({"success": False, "message": "Entry price unavailable"})
+    try:
+        tp_ladder = logic.parse_tp_ladder(data.get('tp_ladder'))
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"❌ {e}"})
+
+    result = logic.execute_fanout_trade(
+        data.get('accounts'),
+        symbol,
+        data.get('side', 'LONG'),
+        entry,
+        data.get('order_type', 'MARKET'),
+        data.get('sl_type', 'SL % Movement'),
+        float(data.get('sl_value') or 0),
+        float(data.get('user_units') or 0),
+        float(data.get('user_lev') or 0),
+        data.get('margin_mode', 'ISOLATED'),
+        float(data.get('tp1') or 0),
+        float(data.get('tp1_pct') or 0),
+        float(data.get('tp2') or 0),
+        tp_ladder=tp_ladder
+    )
+    return jsonify(result)
+
+
 
+def _date_arg_ms(name):
+    """YYYY-MM-DD query arg -> UTC epoch ms (None if absent)"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    return int(datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
 
 @app.route("/download_trades")
 def download_trades():
-    """Download trade history as CSV"""
-    trades = logic.get_trade_history()
-    
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        'Time (UTC)', 'Symbol', 'Side', 'Quantity', 
-        'Price', 'Realized PnL', 'Commission'
-    ])
-    
-    # Write trade data
-    for trade in trades:
-        writer.writerow([
-            trade.get('time', ''),
-            trade.get('symbol', ''),
-            trade.get('side', ''),
-            trade.get('qty', ''),
-            trade.get('price', ''),
-            trade.get('realized_pnl', ''),
-            trade.get('commission', '')
-        ])
-    
-    # Prepare response
-    output.seek(0)
+    """
+    Stream trade history as CSV (default), Arrow IPC (?format=arrow) or
+    Parquet (?format=parquet). Optional ?symbol=, ?start= and ?end=
+    (YYYY-MM-DD, end exclusive) filters. Rows are encoded batch by batch.
+    """
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in export.FORMATS:
+        return jsonify({"success": False, "message": f"Unknown format: {fmt}"}), 400
+
+    try:
+        start_ms = _date_arg_ms("start")
+        end_ms = _date_arg_ms("end")
+    except ValueError:
+        return jsonify({"success": False, "message": "Dates must be YYYY-MM-DD"}), 400
+
+    batches = logic.iter_trade_batches(
+        symbol=request.args.get("symbol") or None,
+        start_ms=start_ms,
+        end_ms=end_ms
+    )
+
+    if fmt == "csv":
+        body = export.csv_chunks(batches)
+    else:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return jsonify({"success": False, "message": "pyarrow is required for Arrow/Parquet export"}), 501
+        body = export.columnar_chunks(batches, fmt)
+
+    mimetype, extension = export.FORMATS[fmt]
     return Response(
-        output.getvalue(),
-        mimetype='text/csv',
+        body,
+        mimetype=mimetype,
         headers={
-            'Content-Disposition': f'attachment; filename=trade_history_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.csv'
+            'Content-Disposition': f'attachment; filename=trade_history_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.{extension}'
         }
     )
 
@@ -131,27 +288,36 @@ def index():
     tp1 = float(request.form.get("tp1") or 0)
     tp1_pct = float(request.form.get("tp1_pct") or 0)
     tp2 = float(request.form.get("tp2") or 0)
+    tp_ladder = request.form.get("tp_ladder", "").strip()
 
-    sizing = logic.calculate_position_sizing(unutilized, entry, sl_type, sl_val)
+    sizing_result = logic.calculate_position_sizing(unutilized, entry, sl_type, sl_val, selected_symbol, side)
+    if not sizing_result.get("error"):
+        sizing_result["fill_estimate"] = logic.estimate_entry_fill(selected_symbol, side, sizing_result["suggested_units"])
     trade_status = session.pop("trade_status", None)
 
-    if request.method == "POST" and "place_order" in request.form and not sizing.get("error"):
-        result = logic.execute_trade_action(
-            balance,
-            selected_symbol,
-            side,
-            entry,
-            order_type,
-            sl_type,
-            sl_val,
-            sizing,
-            float(request.form.get("user_units") or 0),
-            float(request.form.get("user_lev") or 0),
-            margin_mode,
-            tp1,
-            tp1_pct,
-            tp2
-        )
+    if request.method == "POST" and "place_order" in request.form and not sizing_result.get("error"):
+        try:
+            tp_ladder_levels = logic.parse_tp_ladder(tp_ladder)
+        except ValueError as e:
+            result = {"success": False, "message": f"❌ {e}"}
+        else:
+            result = logic.execute_trade_action(
+                balance,
+                selected_symbol,
+                side,
+                entry,
+                order_type,
+                sl_type,
+                sl_val,
+                sizing_result,
+                float(request.form.get("user_units") or 0),
+                float(request.form.get("user_lev") or 0),
+                margin_mode,
+                tp1,
+                tp1_pct,
+                tp2,
+                tp_ladder=tp_ladder_levels
+            )
         session["trade_status"] = result
         session.modified = True
         return redirect(url_for("index"))
@@ -162,7 +328,7 @@ def index():
     return render_template(
         "index.html",
         trade_status=trade_status,
-        sizing=sizing,
+        sizing=sizing_result,
         balance=round(balance, 2),
         unutilized=round(unutilized, 2),
         symbols=symbols,
@@ -176,6 +342,7 @@ def index():
         tp1=tp1,
         tp1_pct=tp1_pct,
         tp2=tp2,
+        tp_ladder=tp_ladder,
         today_stats=today_stats
     )
 
@@ -187,7 +354,7 @@ def verify_orders_api(symbol):
         if client is None:
             return jsonify({"success": False, "message": "Client not connected"})
         
-        orders = client.futures_get_open_orders(symbol=symbol, recvWindow=10000)
+        orders = client.futures_get_open_orders(symbol=symbol)
         tp_sl_orders = []
         
         for order in orders:
@@ -0,0 +1,363 @@
+# async_app.py
+# Async entry point alongside app.py: same dashboard and JSON routes, served
+# by aiohttp on one event loop (async_logic). Run with
+#
+#   python async_app.py
+#   gunicorn async_app:create_app --worker-class aiohttp.GunicornWebWorker --bind 0.0.0.0:5001
+
+import asyncio
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+
+import jinja2
+from aiohttp import web
+
+import async_logic
+import export
+import governor
+import live_feed
+import logic
+import metrics
+import sizing
+import warmup
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TEMPLATES = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(os.path.join(BASE_DIR, "templates")),
+    autoescape=jinja2.select_autoescape(["html"])
+)
+TEMPLATES.globals["url_for"] = lambda endpoint, filename=None: f"/static/{filename}"
+
+# One-shot trade results shown after the POST -> redirect (keyed by cookie)
+_trade_status = {}
+
+routes = web.RouteTableDef()
+
+
+@routes.get("/get_live_price/{symbol}")
+async def live_price_api(request):
+    """Get live price for a symbol"""
+    price = await async_logic.get_live_price(request.match_info["symbol"])
+    return web.json_response({"price": price if price else 0})
+
+
+@routes.get("/get_open_positions")
+async def get_open_positions_api(request):
+    positions = await async_logic.get_open_positions()
+    return web.json_response({"positions": positions})
+
+
+@routes.get("/get_trade_history")
+async def get_trade_history_api(request):
+    """Trade history from the local trade store (paged)"""
+    trades = await async_logic.get_trade_history(
+        limit=int(request.query.get("limit", 500)),
+        offset=int(request.query.get("offset", 0)),
+        symbol=request.query.get("symbol") or None
+    )
+    return web.json_response({"trades": trades})
+
+
+@routes.get("/stream")
+async def stream(request):
+    """Server-Sent Events from the shared live feed"""
+    symbol = request.query.get("symbol", "BTCUSDT")
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    await response.prepare(request)
+
+    q = live_feed.subscribe(symbol, loop=asyncio.get_running_loop())
+    try:
+        await response.write(live_feed.format_event("stats", async_logic.get_today_stats()).encode())
+        while live_feed.is_subscribed(q):
+            try:
+                event, data = await q.get(timeout=15)
+            except asyncio.TimeoutError:
+                await response.write(b": keepalive\n\n")
+                continue
+            await response.write(live_feed.format_event(event, data).encode())
+    except ConnectionResetError:
+        pass
+    finally:
+        live_feed.unsubscribe(q)
+    return response
+
+
+@routes.get("/get_today_stats")
+async def get_today_stats_api(request):
+    return web.json_response(async_logic.get_today_stats())
+
+
+@routes.get("/rate_limits")
+async def rate_limits_api(request):
+    """Current request-weight / order-count budget usage"""
+    return web.json_response(governor.snapshot())
+
+
+@routes.get("/ready")
+async def ready_api(request):
+    """Start-up readiness: 200 once connected (ready or degraded), 503 before"""
+    state = warmup.snapshot()
+    state["async_client"] = async_logic._client is not None
+    return web.json_response(state, status=200 if state["ready"] else 503)
+
+
+@routes.get("/metrics")
+async def metrics_api(request):
+    """Prometheus scrape endpoint"""
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+
+@routes.post("/sizing/batch")
+async def sizing_batch_api(request):
+    """Position sizing for a whole watchlist in one call (columnar JSON arrays)"""
+    data = await request.json()
+    try:
+        symbols, entries, sl_types, sl_values, sides = sizing.request_columns(data)
+    except (ValueError, TypeError) as e:
+        return web.json_response({"success": False, "message": str(e)}, status=400)
+
+    # Filters come from the shared exchangeInfo cache; warm it without blocking the loop
+    await async_logic.get_all_exchange_symbols()
+    if not all(entries):
+        missing = [s for s, e in zip(symbols, entries) if not e]
+        prices = dict(zip(missing, await asyncio.gather(*(async_logic.get_live_price(s) for s in missing))))
+        entries = [e or prices.get(s) or 0 for s, e in zip(symbols, entries)]
+
+    unutilized = data.get('unutilized')
+    if unutilized is None:
+        balance, margin = await async_logic.get_live_balance()
+        unutilized = max((balance or 0.0) - (margin or 0.0), 0.0)
+
+    rows = logic.calculate_position_sizing_batch(float(unutilized), symbols, entries, sl_types, sl_values, sides)
+    return web.json_response({"success": True, "unutilized": round(float(unutilized), 2), "rows": rows})
+
+
+@routes.get("/portfolio_risk")
+async def portfolio_risk_api(request):
+    """Vectorized risk over all open positions; the store path is in-memory"""
+    return web.json_response(await asyncio.to_thread(logic.get_portfolio_risk))
+
+
+@routes.post("/close_position/{symbol}")
+async def close_position_api(request):
+    result = await async_logic.close_position(request.match_info["symbol"])
+    return web.json_response(result)
+
+
+@routes.post("/close_all")
+async def close_all_api(request):
+    return web.json_response(await async_logic.close_all_positions())
+
+
+@routes.post("/partial_close")
+async def partial_close_api(request):
+    data = await request.json()
+    symbol = data.get('symbol')
+    if not symbol:
+        return web.json_response({"success": False, "message": "Symbol required"})
+
+    result = await async_logic.partial_close_position(symbol, data.get('close_percent'), data.get('close_qty'))
+    return web.json_response(result)
+
+
+@routes.post("/update_sl")
+async def update_sl_api(request):
+    data = await request.json()
+    symbol = data.get('symbol')
+    if not symbol:
+        return web.json_response({"success": False, "message": "Symbol required"})
+
+    result = await async_logic.update_stop_loss(symbol, float(data.get('new_sl_percent', 0)))
+    return web.json_response(result)
+
+
+def _date_arg_ms(request, name):
+    """YYYY-MM-DD query arg -> UTC epoch ms (None if absent)"""
+    value = request.query.get(name)
+    if not value:
+        return None
+    return int(datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+@routes.get("/download_trades")
+async def download_trades(request):
+    """Streaming CSV / Arrow / Parquet export, same query args as app.py"""
+    fmt = request.query.get("format", "csv").lower()
+    if fmt not in export.FORMATS:
+        return web.json_response({"success": False, "message": f"Unknown format: {fmt}"}, status=400)
+
+    try:
+        start_ms = _date_arg_ms(request, "start")
+        end_ms = _date_arg_ms(request, "end")
+    except ValueError:
+        return web.json_response({"success": False, "message": "Dates must be YYYY-MM-DD"}, status=400)
+
+    if fmt != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return web.json_response({"success": False, "message": "pyarrow is required for Arrow/Parquet export"}, status=501)
+
+    mimetype, extension = export.FORMATS[fmt]
+    response = web.StreamResponse(headers={
+        "Content-Type": mimetype,
+        "Content-Disposition": f'attachment; filename=trade_history_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    })
+    await response.prepare(request)
+    async for chunk in async_logic.iter_trade_export(fmt, request.query.get("symbol") or None, start_ms, end_ms):
+        await response.write(chunk.encode() if isinstance(chunk, str) else chunk)
+    await response.write_eof()
+    return response
+
+
+@routes.route("*", "/")
+async def index(request):
+    form = await request.post() if request.method == "POST" else {}
+
+    symbols, (live_bal, live_margin) = await asyncio.gather(
+        async_logic.get_all_exchange_symbols(), async_logic.get_live_balance())
+
+    balance = live_bal or 0.0
+    margin_used = live_margin or 0.0
+    unutilized = max(balance - margin_used, 0.0)
+
+    selected_symbol = form.get("symbol", "BTCUSDT")
+    side = form.get("side", "LONG")
+    order_type = form.get("order_type", "MARKET")
+    margin_mode = form.get("margin_mode", "ISOLATED")
+
+    entry = float(form.get("entry") or await async_logic.get_live_price(selected_symbol) or 0)
+    sl_type = form.get("sl_type", "SL % Movement")
+    sl_val = float(form.get("sl_value") or 0)
+
+    tp1 = float(form.get("tp1") or 0)
+    tp1_pct = float(form.get("tp1_pct") or 0)
+    tp2 = float(form.get("tp2") or 0)
+    tp_ladder = form.get("tp_ladder", "").strip()
+
+    sizing_result = logic.calculate_position_sizing(unutilized, entry, sl_type, sl_val, selected_symbol, side)
+    if not sizing_result.get("error"):
+        sizing_result["fill_estimate"] = logic.estimate_entry_fill(selected_symbol, side, sizing_result["suggested_units"])
+    trade_status = _trade_status.pop(request.cookies.get("trade_status", ""), None)
+
+    if request.method == "POST" and "place_order" in form and not sizing_result.get("error"):
+        try:
+            tp_ladder_levels = logic.parse_tp_ladder(tp_ladder)
+        except ValueError as e:
+            result = {"success": False, "message": f"❌ {e}"}
+        else:
+            result = await async_logic.execute_trade_action(
+                balance,
+                selected_symbol,
+                side,
+                entry,
+                order_type,
+                sl_type,
+                sl_val,
+                sizing_result,
+                float(form.get("user_units") or 0),
+                float(form.get("user_lev") or 0),
+                margin_mode,
+                tp1,
+                tp1_pct,
+                tp2,
+                tp_ladder=tp_ladder_levels
+            )
+        token = secrets.token_urlsafe(16)
+        _trade_status[token] = result
+        response = web.HTTPFound("/")
+        response.set_cookie("trade_status", token, httponly=True)
+        raise response
+
+    html = TEMPLATES.get_template("index.html").render(
+        trade_status=trade_status,
+        sizing=sizing_result,
+        balance=round(balance, 2),
+        unutilized=round(unutilized, 2),
+        symbols=symbols,
+        selected_symbol=selected_symbol,
+        default_entry=entry,
+        default_sl_value=sl_val,
+        default_sl_type=sl_type,
+        default_side=side,
+        order_type=order_type,
+        margin_mode=margin_mode,
+        tp1=tp1,
+        tp1_pct=tp1_pct,
+        tp2=tp2,
+        tp_ladder=tp_ladder,
+        today_stats=async_logic.get_today_stats()
+    )
+    response = web.Response(text=html, content_type="text/html")
+    if trade_status is not None:
+        response.del_cookie("trade_status")
+    return response
+
+
+@routes.get("/verify_orders/{symbol}")
+async def verify_orders_api(request):
+    """Verify that TP/SL orders are placed for a symbol"""
+    try:
+        client = await async_logic.get_client()
+        if client is None:
+            return web.json_response({"success": False, "message": "Client not connected"})
+
+        orders = await client.futures_get_open_orders(symbol=request.match_info["symbol"])
+        tp_sl_orders = [{
+            'type': order['type'],
+            'side': order['side'],
+            'stopPrice': float(order['stopPrice']),
+            'origQty': float(order['origQty']) if 'origQty' in order else None,
+            'status': order['status']
+        } for order in orders if order['type'] in ['STOP_MARKET', 'TAKE_PROFIT_MARKET']]
+
+        return web.json_response({"success": True, "orders": tp_sl_orders, "count": len(tp_sl_orders)})
+    except Exception as e:
+        return web.json_response({"success": False, "message": str(e)})
+
+
+async def _on_startup(app):
+    app["connect_task"] = await async_logic.start_background()
+
+
+async def _on_cleanup(app):
+    await async_logic.close()
+
+
+@web.middleware
+async def _latency_middleware(request, handler):
+    """Per-route latency histogram, labelled by the canonical route (not the raw path)"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - start,
+                                     route=resource.canonical if resource is not None else "unmatched",
+                                     method=request.method, status=str(status))
+
+
+def create_app():
+    app = web.Application(middlewares=[_latency_middleware])
+    app.add_routes(routes)
+    app.router.add_static("/static", os.path.join(BASE_DIR, "static"))
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host="0.0.0.0", port=5001)
@@ -0,0 +1,816 @@
+# async_logic.py
+# asyncio twin of logic.py for async_app.py, built on python-binance's
+# AsyncClient and the aiohttp transport. Request paths await Binance instead
+# of holding a worker thread, so one process serves many dashboards and
+# orders at once. Filter index, caches, rounding and formatting are shared
+# with logic.py. The background components (price / account streams, trade
+# store sync, live feed) stay on their own threads and the sync client.
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from binance import AsyncClient
+from binance.client import Client
+from binance.exceptions import BinanceAPIException
+
+import clock
+import config
+import logs
+import metrics
+import export
+import logic
+import market_data
+import warmup
+import account_state
+from governor import AsyncGovernedClientMixin, order_priority
+from transport import get_async_transport
+
+_client = None
+_client_lock = asyncio.Lock()
+
+
+# ────────────────────────────────────────────────────────────────
+#      Client, time sync and algo orders
+# ────────────────────────────────────────────────────────────────
+async def place_algo_order(
+    symbol,
+    side,
+    order_type,
+    stopPrice,
+    quantity=None,
+    closePosition=False,
+    reduceOnly=True,
+    workingType="MARK_PRICE",
+    priceProtect=True
+):
+    try:
+        params = logic._algo_order_params(symbol, side, order_type, stopPrice, quantity, closePosition,
+                                          reduceOnly, workingType, priceProtect)
+
+        logs.info("algo_order_sent", sample=True, **params)
+
+        status, data = await get_async_transport().signed_request('POST', '/fapi/v1/algoOrder', params)
+
+        if status == 200 and 'algoId' in data:
+            logs.info("algo_order_placed", sample=True, symbol=symbol, type=order_type, algo_id=data['algoId'])
+            return {"success": True, "algoId": data['algoId'], "status": data.get('status', 'NEW')}
+        else:
+            error_msg = data.get('msg', str(data)) if isinstance(data, dict) else str(data)
+            logs.warning("algo_order_rejected", symbol=symbol, type=order_type,
+                         code=data.get('code') if isinstance(data, dict) else None, error=error_msg)
+            return {"success": False, "error": error_msg}
+
+    except Exception as e:
+        logs.error("algo_order_error", symbol=symbol, type=order_type, error=str(e))
+        return {"success": False, "error": str(e)}
+
+
+async def sync_time_with_binance():
+    """Server-clock offset (ms) from the shared drift tracker (first burst on a worker thread)"""
+    return await asyncio.to_thread(logic.sync_time_with_binance)
+
+
+def _client_class():
+    """AsyncClient metered by the rate-limit governor, re-pointed like logic._client_class"""
+    base = config.FAPI_BASE_URL.rstrip('/')
+    urls = {}
+    if base != "https://fapi.binance.com":
+        urls = {"API_URL": f"{base}/api", "FUTURES_URL": f"{base}/fapi"}
+    return type("AsyncGovernedClient", (clock.AsyncClockedClientMixin, AsyncGovernedClientMixin, AsyncClient), urls)
+
+
+async def _drop_client():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.close_connection()
+
+
+async def get_client(force_refresh=False):
+    """
+    Shared AsyncClient. A connect already in progress is not waited on:
+    other callers get None at once and serve cached/degraded data.
+    """
+    if _client is not None and not force_refresh:
+        return _client
+    if config.CREDENTIALS_ERROR or _client_lock.locked():
+        return None
+
+    async with _client_lock:
+        if force_refresh:
+            await _drop_client()
+        if _client is None:
+            await _connect()
+    return _client
+
+
+async def _connect():
+    global _client
+    client = None
+    try:
+        await sync_time_with_binance()
+
+        client = _client_class()(
+            config.BINANCE_KEY,
+            config.BINANCE_SECRET,
+            {'timeout': 20}
+        )
+        await client.futures_account()
+        _client = client
+        logs.info("client_connected", account="main", client="async")
+
+    except Exception as e:
+        logs.error("client_init_failed", account="main", client="async", error=str(e))
+        if client is not None:
+            await client.close_connection()
+
+
+async def start_background():
+    """
+    Warm up without holding server start-up: the shared warm-up thread
+    (clock, sync client, exchangeInfo, balance, streams) plus this loop's
+    AsyncClient connect as a task
+    """
+    warmup.start()
+    return asyncio.create_task(get_client())
+
+
+async def close():
+    await _drop_client()
+    await get_async_transport().close()
+
+
+def _account_state():
+    return account_state.get_state() if config.USE_USER_STREAM else None
+
+
+# ────────────────────────────────────────────────────────────────
+#      Symbols, balance and prices
+# ────────────────────────────────────────────────────────────────
+async def _load_exchange_info():
+    client = await get_client()
+    if client is None:
+        raise Exception("Binance client not connected")
+    return logic._index_exchange_info(await client.futures_exchange_info())
+
+
+async def _exchange_info():
+    return await logic._exchange_cache.get_or_load_async("info", _load_exchange_info)
+
+
+async def get_all_exchange_symbols():
+    try:
+        symbols = (await _exchange_info())["symbols"]
+        return symbols if symbols else ["BTCUSDT", "ETHUSDT"]
+    except Exception as e:
+        logs.warning("exchange_info_failed", error=str(e))
+        cached = logic._exchange_cache.peek("info")
+        return cached["symbols"] if cached else ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT"]
+
+
+async def get_symbol_info(symbol):
+    try:
+        return (await _exchange_info())["index"].get(symbol)
+    except Exception as e:
+        logs.warning("exchange_info_failed", error=str(e))
+        cached = logic._exchange_cache.peek("info")
+        return cached["index"].get(symbol) if cached else None
+
+
+async def round_qty(symbol, qty):
+    return logic._round_qty(await get_symbol_info(symbol), qty)
+
+
+async def round_price(symbol, price):
+    return logic._round_price(await get_symbol_info(symbol), price)
+
+
+async def _fetch_balance():
+    """futures_account with retries; raises if every attempt fails"""
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            client = await get_client()
+            if client is None:
+                if attempt == 0:
+                    client = await get_client(force_refresh=True)
+                if client is None:
+                    break
+
+            acc = await client.futures_account()
+            return float(acc["totalWalletBalance"]), float(acc["totalInitialMargin"])
+
+        except BinanceAPIException as e:
+            logs.warning("balance_retry", attempt=attempt + 1, max_retries=max_retries, code=e.code, error=e.message)
+            metrics.BINANCE_RETRIES.inc(endpoint="/fapi/v2/account", reason=str(e.code))
+            if e.code == clock.TIMESTAMP_ERROR:
+                await asyncio.to_thread(clock.resync)
+            await asyncio.sleep(0.5)
+
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            logs.warning("balance_retry", attempt=attempt + 1, max_retries=max_retries, error=str(e))
+            metrics.BINANCE_RETRIES.inc(endpoint="/fapi/v2/account", reason=type(e).__name__)
+            await asyncio.sleep(0.5)
+
+        except Exception as e:
+            logs.error("balance_failed", error=str(e))
+            break
+
+    raise Exception("Balance unavailable")
+
+
+async def get_live_balance():
+    """Account store, then the shared balance cache, then last known good"""
+    state = _account_state()
+    if state is not None and state.get_balance()[0] is not None:
+        return state.get_balance()
+
+    try:
+        return await logic._balance_cache.get_or_load_async("balance", _fetch_balance)
+    except Exception:
+        pass
+
+    stale = logic._balance_cache.peek("balance")
+    if stale is not None:
+        logs.warning("balance_stale", reason="fetch failed")
+        return stale
+
+    return None, None
+
+
+async def _fetch_price(symbol):
+    client = await get_client()
+    if client is None:
+        raise Exception("Binance client not connected")
+    return float((await client.futures_symbol_ticker(symbol=symbol))["price"])
+
+
+async def get_live_price(symbol):
+    if config.USE_PRICE_STREAM:
+        market_data.start()
+        price = market_data.get_price(symbol)
+        if price is not None:
+            return price
+
+    try:
+        return await logic._price_cache.get_or_load_async(symbol, lambda: _fetch_price(symbol))
+    except Exception as e:
+        logs.warning("price_failed", symbol=symbol, error=str(e))
+        return logic._price_cache.peek(symbol)
+
+
+# ────────────────────────────────────────────────────────────────
+#      Positions and open orders
+# ────────────────────────────────────────────────────────────────
+async def get_open_algo_orders():
+    status, data = await get_async_transport().signed_request('GET', '/fapi/v1/openAlgoOrders')
+    if status != 200:
+        raise Exception(data.get('msg', str(data)) if isinstance(data, dict) else str(data))
+    return data.get('orders', []) if isinstance(data, dict) else data
+
+
+async def get_all_open_orders():
+    """Regular and algo listings fetched concurrently, grouped by symbol"""
+    grouped = {}
+    client = await get_client()
+    if client is None:
+        return grouped
+
+    regular, algo = await asyncio.gather(
+        client.futures_get_open_orders(),
+        get_open_algo_orders(),
+        return_exceptions=True
+    )
+
+    if isinstance(regular, Exception):
+        logs.warning("open_orders_failed", error=str(regular))
+    else:
+        for order in regular:
+            grouped.setdefault(order['symbol'], []).append(logic._format_open_order(order))
+
+    if isinstance(algo, Exception):
+        logs.warning("open_algo_orders_failed", error=str(algo))
+    else:
+        for order in algo:
+            grouped.setdefault(order['symbol'], []).append(logic._format_algo_order(order))
+
+    return grouped
+
+
+async def get_open_positions():
+    try:
+        client = await get_client()
+        if client is None:
+            return []
+
+        state = _account_state()
+        if state is not None:
+            positions = state.get_positions()
+            orders_by_symbol = state.get_orders_by_symbol()
+        else:
+            positions = await client.futures_position_information()
+            orders_by_symbol = None
+
+        open_positions = []
+        for pos in positions:
+            if abs(float(pos['positionAmt'])) > 0:
+                # Fetched once per poll, only if something is open
+                if orders_by_symbol is None:
+                    orders_by_symbol = await get_all_open_orders()
+                open_positions.append(logic._format_position(pos, orders_by_symbol.get(pos['symbol'], [])))
+        return open_positions
+    except Exception as e:
+        logs.error("positions_failed", exc_info=True, error=str(e))
+        return []
+
+
+async def _find_position(client, symbol):
+    state = _account_state()
+    if state is not None:
+        return state.get_position(symbol)
+    positions = await client.futures_position_information(symbol=symbol)
+    for pos in positions:
+        if abs(float(pos['positionAmt'])) > 0:
+            return pos
+    return None
+
+
+# ────────────────────────────────────────────────────────────────
+#      Trade limits
+# ────────────────────────────────────────────────────────────────
+# Same SQLite ledger as the Flask app, so both servers and every worker
+# share one set of counters. Writes may wait on another process's
+# transaction, so they run off the loop.
+def check_trade_limits(symbol):
+    return logic.check_trade_limits(symbol)
+
+
+async def reserve_trade(symbol):
+    return await asyncio.to_thread(logic.reserve_trade, symbol)
+
+
+async def release_trade(symbol):
+    await asyncio.to_thread(logic.release_trade, symbol)
+
+
+def get_today_stats():
+    return logic.get_today_stats()
+
+
+# ────────────────────────────────────────────────────────────────
+#      Order actions
+# ────────────────────────────────────────────────────────────────
+async def _batch_call(client, orders):
+    """One batchOrders call -> one entry per order (response or {"code", "msg"})"""
+    try:
+        results = await client.futures_place_batch_order(batchOrders=[dict(o) for o in orders])
+    except Exception as e:
+        code = getattr(e, "code", None)
+        return [{"code": code, "msg": getattr(e, "message", str(e))} for _ in orders]
+    if not isinstance(results, list) or len(results) != len(orders):
+        return [{"code": None, "msg": f"Unexpected batch response: {results}"} for _ in orders]
+    return results
+
+
+async def place_batch_orders(client, orders):
+    """logic.place_batch_orders on the event loop: per-order results in the order given"""
+    batches = await asyncio.gather(*[
+        _batch_call(client, chunk) for chunk in logic._chunks(orders, logic.BATCH_ORDER_LIMIT)
+    ])
+    return [r for batch in batches for r in batch]
+
+
+@order_priority()
+async def execute_trade_action(
+    balance, symbol, side, entry, order_type,
+    sl_type, sl_value, sizing_result,
+    user_units, user_lev, margin_mode,
+    tp1, tp1_pct, tp2, tp_ladder=None
+):
+    """
+    Async execute_trade_action (always the parallel bracket): leverage and
+    margin type together, entry price from avgPrice, TP legs together once
+    the SL is confirmed. Per-stage timings (ms) are returned under "timings".
+    tp_ladder replaces TP1/TP2 as in logic.execute_trade_action.
+    """
+    error = logic._validate_bracket(sl_value, tp1, tp1_pct, side, tp_ladder)
+    if error:
+        return {"success": False, "message": error}
+
+    client = await get_client()
+    if client is None:
+        return {"success": False, "message": "❌ Binance client not connected"}
+
+    can_trade, limit_msg = await reserve_trade(symbol)
+    if not can_trade:
+        return {"success": False, "message": limit_msg}
+
+    result = await _place_bracket(client, symbol, side, sl_type, sl_value, sizing_result,
+                                  user_units, user_lev, margin_mode, tp1, tp1_pct, tp2, tp_ladder)
+    metrics.observe_timings(result.get("timings"), "async")
+    if not result["success"]:
+        await release_trade(symbol)
+    return result
+
+
+async def _place_bracket(client, symbol, side, sl_type, sl_value, sizing_result,
+                         user_units, user_lev, margin_mode, tp1, tp1_pct, tp2, tp_ladder=None):
+    """Entry + SL + TP legs; no limit bookkeeping"""
+    timings = {}
+    t_start = time.perf_counter()
+
+    try:
+
+        info = await get_symbol_info(symbol)
+        units = user_units if user_units > 0 else sizing_result["suggested_units"]
+        qty = logic._round_qty(info, units)
+
+        # Liquidity check against the local book (in memory, no await)
+        guard = logic._slippage_guard(symbol, side, qty)
+        if guard:
+            logs.warning("bracket_slippage_refused", symbol=symbol, side=side, qty=qty, reason=guard)
+            return {"success": False, "message": guard, "timings": timings}
+
+        # Leverage & margin mode (both errors ignored, as in logic.py)
+        leverage = int(user_lev) if user_lev > 0 else sizing_result["max_leverage"]
+        t0 = time.perf_counter()
+        await asyncio.gather(
+            client.futures_change_leverage(symbol=symbol, leverage=leverage),
+            client.futures_change_margin_type(symbol=symbol, marginType=margin_mode),
+            return_exceptions=True
+        )
+        timings["pre_trade_ms"] = logic._ms_since(t0)
+
+        entry_side = Client.SIDE_BUY if side == "LONG" else Client.SIDE_SELL
+        exit_side = Client.SIDE_SELL if side == "LONG" else Client.SIDE_BUY
+
+        # MARKET ENTRY
+        logs.info("bracket_entry", sample=True, symbol=symbol, side=side, qty=qty)
+        t0 = time.perf_counter()
+        entry_order = await client.futures_create_order(
+            symbol=symbol,
+            side=entry_side,
+            type="MARKET",
+            quantity=qty,
+            newOrderRespType="RESULT"
+        )
+
+        actual_entry = float(entry_order.get("avgPrice") or 0)
+        if actual_entry <= 0:
+            actual_entry = await get_live_price(symbol) or float(
+                (await client.futures_mark_price(symbol=symbol))["markPrice"])
+        timings["entry_ms"] = logic._ms_since(t0)
+
+        sl_pct, sl_price = logic._stop_loss_price(info, side, actual_entry, sl_type, sl_value)
+
+        # SL (full close)
+        logs.info("bracket_sl", sample=True, symbol=symbol, price=sl_price)
+        t0 = time.perf_counter()
+        sl_result = await place_algo_order(
+            symbol=symbol,
+            side=exit_side,
+            order_type="STOP_MARKET",
+            stopPrice=sl_price,
+            closePosition=True
+        )
+        timings["sl_ms"] = logic._ms_since(t0)
+
+        if not sl_result["success"]:
+            # Emergency close attempt
+            try:
+                await client.futures_create_order(
+                    symbol=symbol,
+                    side=exit_side,
+                    type="MARKET",
+                    quantity=qty
+                )
+            except Exception:
+                pass
+            return {"success": False, "message": f"SL failed: {sl_result.get('error','?')}", "timings": timings}
+
+        # TP ladder: all legs in ceil(N / 5) concurrent batchOrders calls
+        if tp_ladder:
+            legs, runner_qty = logic._ladder_legs(info, qty, tp_ladder)
+            for name, price, leg_qty in legs:
+                logs.info("bracket_tp", sample=True, symbol=symbol, leg=name, price=price, qty=leg_qty)
+            t0 = time.perf_counter()
+            responses = await place_batch_orders(client, logic._ladder_orders(symbol, exit_side, info, legs))
+            timings["tp_ms"] = logic._ms_since(t0)
+            timings["total_ms"] = logic._ms_since(t_start)
+            return logic._ladder_result(actual_entry, qty, sl_price, sl_pct, logic._ladder_report(legs, responses),
+                                        runner_qty, timings)
+
+        # TP1 / TP2 together
+        legs, tp1_price, tp2_price = logic._take_profit_legs(info, qty, tp1, tp1_pct, tp2)
+        for name, price, leg_qty in legs:
+            logs.info("bracket_tp", sample=True, symbol=symbol, leg=name, price=price, qty=leg_qty)
+
+        t0 = time.perf_counter()
+        tp_results = await asyncio.gather(*[
+            place_algo_order(
+                symbol=symbol,
+                side=exit_side,
+                order_type="TAKE_PROFIT_MARKET",
+                stopPrice=price,
+                quantity=leg_qty,
+                closePosition=False,
+                reduceOnly=True
+            )
+            for _, price, leg_qty in legs
+        ])
+        if not tp_results[0]["success"] and len(tp_results) > 1 and tp_results[1]["success"]:
+            # TP2 went out alongside TP1: withdraw it rather than leave it alone
+            try:
+                await cancel_algo_order(tp_results[1]["algoId"])
+            except Exception as e:
+                logs.warning("tp2_cancel_failed", symbol=symbol, algo_id=tp_results[1]["algoId"], error=str(e))
+        timings["tp_ms"] = logic._ms_since(t0)
+        timings["total_ms"] = logic._ms_since(t_start)
+
+        if not tp_results[0]["success"]:
+            return logic._unprotected_tp_result(actual_entry, qty, sl_price, sl_pct,
+                                                f"TP1 failed: {tp_results[0].get('error','?')}", timings)
+
+        return {
+            "success": True,
+            "message": logic._trade_opened_message(actual_entry, sl_price, sl_pct, tp1_price, tp1_pct, tp2_price),
+            "qty": qty,
+            "entry": actual_entry,
+            "timings": timings
+        }
+
+    except Exception as e:
+        logs.error("bracket_failed", exc_info=True, symbol=symbol, side=side, error=str(e))
+        return {"success": False, "message": f"Critical error: {str(e)}", "timings": timings}
+
+
+@order_priority()
+async def partial_close_position(symbol, close_percent=None, close_qty=None):
+    try:
+        client = await get_client()
+        if client is None:
+            return {"success": False, "message": "❌ Binance client not connected"}
+
+        position = await _find_position(client, symbol)
+        if not position:
+            return {"success": False, "message": f"❌ No open position for {symbol}"}
+
+        position_amt = float(position['positionAmt'])
+
+        if close_qty:
+            qty_to_close = abs(close_qty)
+        elif close_percent:
+            qty_to_close = abs(position_amt) * (close_percent / 100)
+        else:
+            return {"success": False, "message": "❌ Must specify close_percent or close_qty"}
+
+        qty_to_close = await round_qty(symbol, qty_to_close)
+        close_side = Client.SIDE_SELL if position_amt > 0 else Client.SIDE_BUY
+
+        logs.info("partial_close", symbol=symbol, qty=qty_to_close)
+        order = await client.futures_create_order(
+            symbol=symbol,
+            side=close_side,
+            type="MARKET",
+            quantity=qty_to_close
+        )
+
+        return {
+            "success": True,
+            "message": f"✅ Partially closed {qty_to_close} {symbol}",
+            "orderId": order['orderId']
+        }
+
+    except Exception as e:
+        logs.error("partial_close_failed", exc_info=True, symbol=symbol, error=str(e))
+        return {"success": False, "message": f"❌ Error: {str(e)}"}
+
+
+@order_priority()
+async def close_position(symbol):
+    try:
+        client = await get_client()
+        if client is None:
+            return {"success": False, "message": "❌ Binance client not connected"}
+
+        position = await _find_position(client, symbol)
+        if not position:
+            return {"success": False, "message": f"❌ No open position for {symbol}"}
+
+        position_amt = float(position['positionAmt'])
+        close_side = Client.SIDE_SELL if position_amt > 0 else Client.SIDE_BUY
+
+        logs.info("close_position", symbol=symbol)
+        order = await client.futures_create_order(
+            symbol=symbol,
+            side=close_side,
+            type="MARKET",
+            quantity=abs(position_amt)
+        )
+
+        try:
+            await client.futures_cancel_all_open_orders(symbol=symbol)
+        except Exception:
+            pass
+
+        return {
+            "success": True,
+            "message": f"✅ Position closed for {symbol}",
+            "orderId": order['orderId']
+        }
+
+    except Exception as e:
+        logs.error("close_position_failed", exc_info=True, symbol=symbol, error=str(e))
+        return {"success": False, "message": f"❌ Error: {str(e)}"}
+
+
+async def cancel_algo_order(algo_id):
+    status, data = await get_async_transport().signed_request('DELETE', '/fapi/v1/algoOrder', {"algoId": algo_id})
+    if status != 200:
+        raise Exception(data.get('msg', str(data)) if isinstance(data, dict) else str(data))
+
+
+async def _cancel_closed(client, result, algo_ids):
+    """Plain and SL/TP algo orders of one closed position, all at once"""
+    outcomes = await asyncio.gather(
+        client.futures_cancel_all_open_orders(symbol=result["symbol"]),
+        *[cancel_algo_order(algo_id) for algo_id in algo_ids],
+        return_exceptions=True
+    )
+    errors = [str(o) for o in outcomes if isinstance(o, Exception)]
+    result["algo_cancelled"] = sum(1 for o in outcomes[1:] if not isinstance(o, Exception))
+    if errors:
+        result["cancel_errors"] = errors
+
+
+async def _close_batch(client, chunk, algo_listing):
+    """Close one batch, then cancel the orders of the positions it closed"""
+    responses = await _batch_call(client, chunk)
+    results = [logic._close_result(order, response) for order, response in zip(chunk, responses)]
+    orders_by_symbol = await algo_listing
+    await asyncio.gather(*[
+        _cancel_closed(client, r, [o['orderId'] for o in orders_by_symbol.get(r["symbol"], []) if o.get('algo')])
+        for r in results if r["success"]
+    ])
+    return results
+
+
+async def _algo_orders_by_symbol():
+    grouped = {}
+    try:
+        for order in await get_open_algo_orders():
+            grouped.setdefault(order['symbol'], []).append(logic._format_algo_order(order))
+    except Exception as e:
+        logs.warning("open_algo_orders_failed", error=str(e))
+    return grouped
+
+
+@order_priority()
+async def close_all_positions():
+    """logic.close_all_positions on the event loop: batches and cancels as concurrent tasks"""
+    t_start = time.perf_counter()
+    try:
+        client = await get_client()
+        if client is None:
+            return {"success": False, "message": "❌ Binance client not connected"}
+
+        state = _account_state()
+        if state is not None:
+            positions = state.get_positions()
+            orders_by_symbol = state.get_orders_by_symbol()
+        else:
+            positions = [p for p in await client.futures_position_information()
+                         if float(p['positionAmt']) != 0]
+            orders_by_symbol = None
+        if not positions:
+            return {"success": True, "message": "No positions to close", "results": [],
+                    "timings": {"total_ms": logic._ms_since(t_start)}}
+
+        orders = [logic._close_order(p) for p in positions]
+        logs.info("close_all", positions=len(orders))
+        if orders_by_symbol is None:
+            algo_listing = asyncio.ensure_future(_algo_orders_by_symbol())
+        else:
+            algo_listing = asyncio.get_running_loop().create_future()
+            algo_listing.set_result(orders_by_symbol)
+
+        batches = await asyncio.gather(*[
+            _close_batch(client, chunk, algo_listing)
+            for chunk in logic._chunks(orders, logic.BATCH_ORDER_LIMIT)
+        ])
+        results = [r for batch in batches for r in batch]
+
+        closed = sum(1 for r in results if r["success"])
+        for r in results:
+            if not r["success"]:
+                logs.warning("close_all_rejected", symbol=r["symbol"], code=r.get("code"), error=r["message"])
+        timings = {"total_ms": logic._ms_since(t_start)}
+        metrics.observe_timings(timings, "close_all_async")
+
+        icon = "✅" if closed == len(results) else "⚠️" if closed else "❌"
+        return {
+            "success": closed == len(results),
+            "message": f"{icon} Closed {closed}/{len(results)} positions",
+            "results": results,
+            "timings": timings
+        }
+
+    except Exception as e:
+        logs.error("close_all_failed", exc_info=True, error=str(e))
+        return {"success": False, "message": f"❌ Error: {str(e)}", "timings": {"total_ms": logic._ms_since(t_start)}}
+
+
+@order_priority()
+async def update_stop_loss(symbol, new_sl_percent):
+    try:
+        if new_sl_percent < config.SL_EDIT_MIN_PERCENT or new_sl_percent > config.SL_EDIT_MAX_PERCENT:
+            return {
+                "success": False,
+                "message": f"❌ SL adjustment must be between {config.SL_EDIT_MIN_PERCENT}% and {config.SL_EDIT_MAX_PERCENT}%"
+            }
+
+        client = await get_client()
+        if client is None:
+            return {"success": False, "message": "❌ Binance client not connected"}
+
+        position = await _find_position(client, symbol)
+        if not position:
+            return {"success": False, "message": f"❌ No open position for {symbol}"}
+
+        position_amt = float(position['positionAmt'])
+        entry_price = float(position['entryPrice'])
+
+        if position_amt > 0:
+            new_sl_price = entry_price * (1 + new_sl_percent / 100)
+        else:
+            new_sl_price = entry_price * (1 - new_sl_percent / 100)
+
+        new_sl_price = await round_price(symbol, new_sl_price)
+
+        # Cancel existing SL orders (concurrently)
+        state = _account_state()
+        if state is not None:
+            open_orders = [o for o in state.get_orders_by_symbol().get(symbol, []) if not o.get('algo')]
+        else:
+            open_orders = await client.futures_get_open_orders(symbol=symbol)
+        await asyncio.gather(*[
+            client.futures_cancel_order(symbol=symbol, orderId=order['orderId'])
+            for order in open_orders if order['type'] in ['STOP_MARKET', 'STOP']
+        ], return_exceptions=True)
+
+        exit_side = Client.SIDE_SELL if position_amt > 0 else Client.SIDE_BUY
+
+        sl_order = await place_algo_order(
+            symbol=symbol,
+            side=exit_side,
+            order_type="STOP_MARKET",
+            stopPrice=new_sl_price,
+            closePosition=True
+        )
+
+        if not sl_order["success"]:
+            return {"success": False, "message": f"Failed to place new SL: {sl_order['error']}"}
+
+        return {
+            "success": True,
+            "message": f"✅ SL updated to {new_sl_price} ({new_sl_percent:+.2f}%)",
+            "new_sl_price": new_sl_price,
+            "algoId": sl_order.get("algoId")
+        }
+
+    except Exception as e:
+        logs.error("update_sl_failed", exc_info=True, symbol=symbol, error=str(e))
+        return {"success": False, "message": f"❌ Error: {str(e)}"}
+
+
+# ────────────────────────────────────────────────────────────────
+#      Trade history (local SQLite store, synced on a worker thread)
+# ────────────────────────────────────────────────────────────────
+async def get_trade_history(limit=500, offset=0, symbol=None, start_ms=None, end_ms=None):
+    return await asyncio.to_thread(logic.get_trade_history, limit, offset, symbol, start_ms, end_ms)
+
+
+def _export_chunks(fmt, symbol, start_ms, end_ms):
+    batches = logic.iter_trade_batches(symbol, start_ms, end_ms)
+    return export.csv_chunks(batches) if fmt == "csv" else export.columnar_chunks(batches, fmt)
+
+
+async def iter_trade_export(fmt, symbol=None, start_ms=None, end_ms=None):
+    """
+    Encoded /download_trades chunks. The store read and the encoding run on
+    one dedicated thread: the SQLite cursor must stay on the thread that
+    opened it.
+    """
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="export") as worker:
+        chunks = await loop.run_in_executor(worker, _export_chunks, fmt, symbol, start_ms, end_ms)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(worker, next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            await loop.run_in_executor(worker, chunks.close)
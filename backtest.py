@@ -0,0 +1,474 @@
+# backtest.py
+# Replays the bracket rules of logic.execute_trade_action over stored
+# klines. Each trade is sized with calculate_position_sizing's formula
+# (sizing.py) at MAX_RISK_PERCENT of the equity and enters at market at the
+# signal bar's open. The SL is a full close at entry ∓ SL%. TP1 covers
+# tp1_pct of the quantity and TP2 the rest; without TP2 the rest runs to
+# the SL. Prices are floored to the tick and quantities to the lot step, as
+# in the live orders.
+#
+# Trigger detection is vectorized. Over a trade's holding window the running
+# high and running low are monotone, so the first bar that reaches any level
+# comes from one searchsorted over every (trade, configuration) pair.
+# Symbols and parameter chunks run on a process pool. Each worker maps the
+# candle columns itself (kline_store.Series.read), so nothing large is pickled.
+#
+#   python backtest.py --download --days 365 --symbols BTCUSDT ETHUSDT
+#   python backtest.py --sl 0.5:3:0.25 --tp1 0.5:4:0.5 --tp1-pct 25,50,75 --tp2 0,2,3,4,6
+#
+# Fills are modelled on last-price candles (the live orders trigger on the
+# mark price). When one bar reaches both the SL and a TP, the SL is assumed
+# to come first. Trades are independent and all sized on the same equity.
+
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import config
+import kline_store
+import sizing
+
+PARAM_CHUNK = 256            # configurations per worker task
+CHUNK_CELLS = 2_000_000      # trades × window bars held in memory at once
+DEFAULT_FILTERS = {"step": sizing.DEFAULT_STEP, "qty_precision": 3, "tick": 0.01, "price_precision": 2}
+
+GRID_FIELDS = ("sl", "tp1", "tp1_pct", "tp2")   # SL %, TP1 % from entry, TP1 qty %, TP2 % (0 = none)
+STAT_FIELDS = ("trades", "wins", "pnl", "gross_profit", "gross_loss", "r_sum",
+               "sl_exits", "tp1_fills", "tp2_fills", "time_exits", "bars_held")
+
+
+# ────────────────────────────────────────────────────────────────
+#      Engine
+# ────────────────────────────────────────────────────────────────
+def first_hits(rows, levels):
+    """
+    Column of the first rows[t, k] >= levels[t, p] for (T × H) rows that are
+    non-decreasing along each row and (T × P) levels; H where no column
+    reaches the level. The rows are shifted apart by a power-of-two offset,
+    so one searchsorted over the flattened matrix answers every query.
+    """
+    n_rows, width = rows.shape
+    lo = min(rows.min(), levels.min())
+    span = 2.0 ** np.ceil(np.log2(max(rows.max(), levels.max()) - lo + 1))
+    offsets = np.arange(n_rows)[:, None] * span
+    hits = np.searchsorted((rows - lo + offsets).ravel(), levels - lo + offsets)
+    return hits - np.arange(n_rows)[:, None] * width
+
+
+def bracket(entry, is_long, sl_pct, tp1_raw, tp1_pct, tp2_raw, equity, filters):
+    """
+    Order sizes and rounded prices for (T × P) brackets, as
+    calculate_position_sizing, _stop_loss_price and _take_profit_legs
+    compute them. tp2_raw <= 0 means no TP2.
+    """
+    step, qty_precision = filters["step"], filters["qty_precision"]
+    tick, price_precision = filters["tick"], filters["price_precision"]
+    shape = np.broadcast(entry, sl_pct, tp1_raw, tp1_pct, tp2_raw).shape
+    entry = np.broadcast_to(entry, shape)
+    direction = np.where(is_long, 1.0, -1.0)
+
+    sized = sizing.position_sizing(equity, entry.ravel(), np.ones(entry.size, dtype=bool),
+                                   np.broadcast_to(sl_pct, shape).ravel())
+    units = sized["units"].reshape(shape)
+    # what _validate_bracket would refuse is not traded
+    valid = (units > 0) & (sl_pct > 0) & (tp1_raw > 0) & (tp1_pct > 0) & (tp1_pct <= 100)
+    qty = np.where(valid, sizing.round_qty(units, step, qty_precision), 0.0)
+
+    sl_price = sizing.round_price(entry * (1 - direction * sl_pct / 100), tick, price_precision)
+    tp1_price = sizing.round_price(np.broadcast_to(tp1_raw, shape), tick, price_precision)
+    tp1_qty = np.where(qty > 0, sizing.round_qty(qty * (tp1_pct / 100), step, qty_precision), 0.0)
+
+    has_tp2 = np.broadcast_to(tp2_raw, shape) > 0
+    tp2_price = np.where(has_tp2, sizing.round_price(np.broadcast_to(tp2_raw, shape), tick, price_precision),
+                         tp1_price)
+    tp2_qty = np.where(has_tp2, sizing.round_qty(qty - tp1_qty, step, qty_precision), 0.0)
+    tp2_qty = np.where(tp2_qty > 0.0001, tp2_qty, 0.0)
+    return {"qty": qty, "sl": sl_price, "tp1": tp1_price, "tp1_qty": tp1_qty, "tp2": tp2_price,
+            "tp2_qty": tp2_qty, "risk": sized["risk_amount"]}
+
+
+def simulate(bars, entry_idx, is_long, orders, max_bars, fee_rate):
+    """
+    Outcome of every (trade, configuration): entry_idx/is_long are (T,),
+    orders is bracket()'s (T × P) dict. Returns per-cell pnl, R multiple,
+    fills and bars held; cells with no quantity have trades == 0.
+    """
+    open_, close = bars["open"], bars["close"]
+    n = len(open_)
+    pad_high = np.concatenate([bars["high"], np.full(max_bars, -np.inf)])
+    pad_low = np.concatenate([bars["low"], np.full(max_bars, np.inf)])
+    run_high = np.maximum.accumulate(sliding_window_view(pad_high, max_bars)[entry_idx], axis=1)
+    run_low = np.minimum.accumulate(sliding_window_view(pad_low, max_bars)[entry_idx], axis=1)
+
+    entry = open_[entry_idx][:, None]
+    long_ = is_long[:, None]
+    # adverse: toward the SL, favourable: toward the TPs; both non-decreasing
+    adverse = np.where(long_, -run_low, run_high) / entry
+    favourable = np.where(long_, run_high, -run_low) / entry
+    sign = np.where(long_, 1.0, -1.0)
+    k_sl = first_hits(adverse, -sign * orders["sl"] / entry)
+    k_tp1 = first_hits(favourable, sign * orders["tp1"] / entry)
+    k_tp2 = first_hits(favourable, sign * orders["tp2"] / entry)
+
+    qty = orders["qty"]
+    hit1 = (k_tp1 < k_sl) & (orders["tp1_qty"] > 0)
+    hit2 = (k_tp2 < k_sl) & (orders["tp2_qty"] > 0)
+    fill1 = np.where(hit1, orders["tp1_qty"], 0.0)
+    fill2 = np.where(hit2, orders["tp2_qty"], 0.0)
+    both = hit1 & hit2   # reduce-only: the later leg gets what is left
+    fill2 = np.where(both & (k_tp1 <= k_tp2), np.minimum(fill2, qty - fill1), fill2)
+    fill1 = np.where(both & (k_tp1 > k_tp2), np.minimum(fill1, qty - fill2), fill1)
+    rest = np.maximum(qty - fill1 - fill2, 0.0)
+
+    last = (np.minimum(entry_idx + max_bars, n) - 1 - entry_idx)[:, None]
+    sl_exit = (k_sl < max_bars) & (rest > 0)
+    time_exit = (rest > 0) & ~sl_exit
+    k_rest = np.where(sl_exit, k_sl, last)
+
+    def gap_fill(k, level, worse):
+        """Trigger price, or the bar's open when it gapped through the level"""
+        bar_open = open_[np.minimum(entry_idx[:, None] + k, n - 1)]
+        return np.where(long_ == worse, np.minimum(bar_open, level), np.maximum(bar_open, level))
+
+    price1 = gap_fill(k_tp1, orders["tp1"], worse=False)
+    price2 = gap_fill(k_tp2, orders["tp2"], worse=False)
+    price_rest = np.where(sl_exit, gap_fill(k_sl, orders["sl"], worse=True),
+                          close[np.minimum(entry_idx + max_bars, n) - 1][:, None])
+
+    pnl = sign * (fill1 * (price1 - entry) + fill2 * (price2 - entry) + rest * (price_rest - entry))
+    pnl -= fee_rate * (qty * entry + fill1 * price1 + fill2 * price2 + rest * price_rest)
+    held = np.maximum.reduce([np.where(fill1 > 0, k_tp1, 0), np.where(fill2 > 0, k_tp2, 0),
+                              np.where(rest > 0, k_rest, 0)]) + 1
+    traded = qty > 0
+    return {
+        "trades": traded,
+        "pnl": np.where(traded, pnl, 0.0),
+        "r": np.where(traded, pnl / orders["risk"], 0.0) if orders["risk"] else np.zeros_like(pnl),
+        "sl_exit": sl_exit & traded,
+        "tp1_fill": hit1 & traded,
+        "tp2_fill": hit2 & traded,
+        "time_exit": time_exit & traded,
+        "bars_held": np.where(traded, held, 0)
+    }
+
+
+class Stats:
+    """Per-configuration totals over trades, accumulated chunk by chunk in entry order"""
+
+    def __init__(self, n_params):
+        self.totals = {name: np.zeros(n_params) for name in STAT_FIELDS}
+        self.equity = np.zeros(n_params)
+        self.peak = np.zeros(n_params)
+        self.max_drawdown = np.zeros(n_params)
+
+    def add(self, result):
+        pnl = result["pnl"]
+        t = self.totals
+        t["trades"] += result["trades"].sum(axis=0)
+        t["wins"] += (pnl > 0).sum(axis=0)
+        t["pnl"] += pnl.sum(axis=0)
+        t["gross_profit"] += np.where(pnl > 0, pnl, 0).sum(axis=0)
+        t["gross_loss"] -= np.where(pnl < 0, pnl, 0).sum(axis=0)
+        t["r_sum"] += result["r"].sum(axis=0)
+        t["sl_exits"] += result["sl_exit"].sum(axis=0)
+        t["tp1_fills"] += result["tp1_fill"].sum(axis=0)
+        t["tp2_fills"] += result["tp2_fill"].sum(axis=0)
+        t["time_exits"] += result["time_exit"].sum(axis=0)
+        t["bars_held"] += result["bars_held"].sum(axis=0)
+
+        curve = self.equity + np.cumsum(pnl, axis=0)
+        peak = np.maximum(self.peak, np.maximum.accumulate(curve, axis=0))
+        self.max_drawdown = np.maximum(self.max_drawdown, (peak - curve).max(axis=0))
+        self.equity, self.peak = curve[-1], peak[-1]
+
+
+# ────────────────────────────────────────────────────────────────
+#      Entries and grids
+# ────────────────────────────────────────────────────────────────
+def periodic_entries(n_bars, every, side):
+    """A trade at every `every`-th bar's open; side LONG, SHORT or BOTH"""
+    idx = np.arange(0, max(n_bars - 1, 0), every)
+    if side == "BOTH":
+        return np.concatenate([idx, idx]), np.concatenate([np.ones(len(idx), bool), np.zeros(len(idx), bool)])
+    return idx, np.full(len(idx), side == "LONG")
+
+
+def load_signals(path):
+    """
+    Signals CSV: time (ms or ISO), symbol, side; optionally the bracket
+    itself as sl_pct or sl_price, tp1_price, tp1_pct, tp2_price. Returns
+    {symbol: [row dicts]}.
+    """
+    signals = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            t = row["time"].strip()
+            row["time_ms"] = int(t) if t.isdigit() else int(np.datetime64(t, "ms").astype(np.int64))
+            row["side"] = row["side"].strip().upper()
+            signals.setdefault(row["symbol"].strip().upper(), []).append(row)
+    return signals
+
+
+def parse_values(text):
+    """"0.5,1,2" or "start:stop:step" (stop included) -> list of floats"""
+    if ":" in text:
+        start, stop, step = (float(x) for x in text.split(":"))
+        return [round(v, 10) for v in np.arange(start, stop + step / 2, step)]
+    return [float(x) for x in text.split(",") if x.strip()]
+
+
+def make_grid(sl, tp1, tp1_pct, tp2):
+    """Every valid combination, as one column per GRID_FIELDS; TP2 inside TP1 is skipped"""
+    rows = [c for c in itertools.product(sl, tp1, tp1_pct, tp2)
+            if c[0] > 0 and c[1] > 0 and 0 < c[2] <= 100 and (c[3] == 0 or c[3] > c[1])]
+    columns = np.array(rows, dtype=float).reshape(-1, len(GRID_FIELDS))
+    return {name: columns[:, i] for i, name in enumerate(GRID_FIELDS)}
+
+
+# ────────────────────────────────────────────────────────────────
+#      Worker tasks
+# ────────────────────────────────────────────────────────────────
+def _load_bars(root, symbol, interval, start_ms=None):
+    series = kline_store.Series(root, symbol, interval)
+    columns = series.read(("open_time", "open", "high", "low", "close"))
+    first = int(np.searchsorted(columns["open_time"], start_ms)) if start_ms else 0
+    return {name: columns[name][first:] for name in ("open_time", "open", "high", "low", "close")}
+
+
+def _grid_orders(entry, is_long, grid, equity, filters):
+    direction = np.where(is_long, 1.0, -1.0)[:, None]
+    e = entry[:, None]
+    return bracket(e, is_long[:, None], grid["sl"][None, :],
+                   e * (1 + direction * grid["tp1"][None, :] / 100), grid["tp1_pct"][None, :],
+                   np.where(grid["tp2"][None, :] > 0, e * (1 + direction * grid["tp2"][None, :] / 100), 0.0),
+                   equity, filters)
+
+
+def _signal_orders(entry, is_long, rows, equity, filters):
+    def column(name, default=0.0):
+        return np.array([float(r.get(name) or default) for r in rows])[:, None]
+
+    e = entry[:, None]
+    sl_pct = np.where(column("sl_pct") > 0, column("sl_pct"), np.abs(e - column("sl_price")) / e * 100)
+    return bracket(e, is_long[:, None], sl_pct, column("tp1_price"), column("tp1_pct", 100), column("tp2_price"),
+                   equity, filters)
+
+
+def run_task(task):
+    """One symbol × one chunk of configurations (or that symbol's own signal brackets)"""
+    bars = _load_bars(task["root"], task["symbol"], task["interval"], task.get("start_ms"))
+    n = len(bars["open"])
+    if n < 2:
+        return task["symbol"], task["chunk"], None
+
+    signals = task.get("signals")
+    if signals:
+        idx = np.searchsorted(bars["open_time"], [r["time_ms"] for r in signals])
+        keep = idx < n
+        rows = [r for r, k in zip(signals, keep) if k]
+        entry_idx, is_long = idx[keep], np.array([r["side"] in ("LONG", "BUY") for r in rows])
+    else:
+        entry_idx, is_long = periodic_entries(n, task["every"], task["side"])
+        rows = None
+    order = np.argsort(entry_idx, kind="stable")
+    entry_idx, is_long = entry_idx[order], is_long[order]
+    if rows is not None:
+        rows = [rows[i] for i in order]
+
+    grid = task.get("grid")
+    stats = Stats(len(grid["sl"]) if grid is not None else 1)
+    per_chunk = max(1, CHUNK_CELLS // task["max_bars"])
+    for start in range(0, len(entry_idx), per_chunk):
+        part = slice(start, start + per_chunk)
+        entry = bars["open"][entry_idx[part]]
+        if task.get("replay"):
+            orders = _signal_orders(entry, is_long[part], rows[part], task["equity"], task["filters"])
+        else:
+            orders = _grid_orders(entry, is_long[part], grid, task["equity"], task["filters"])
+        stats.add(simulate(bars, entry_idx[part], is_long[part], orders, task["max_bars"], task["fee_rate"]))
+    return task["symbol"], task["chunk"], stats
+
+
+def run(symbols, interval, grid=None, signals=None, every=96, side="BOTH", start_ms=None,
+        max_bars=None, equity=None, fee_rate=None, filters=None, workers=None, root=None):
+    """
+    Backtest every symbol over the grid (or replay the brackets in the
+    signals) on a process pool. Returns (per-configuration result rows,
+    seconds). Signals without bracket columns pick their entries and
+    run the grid on them.
+    """
+    root = root or config.BACKTEST_KLINE_DIR
+    replay = bool(signals) and any(("sl_pct" in r or "sl_price" in r) for rows in signals.values() for r in rows)
+    n_params = 1 if replay else len(grid["sl"])
+    chunks = [slice(0, 1)] if replay else [slice(i, i + PARAM_CHUNK) for i in range(0, n_params, PARAM_CHUNK)]
+    base = {
+        "root": root, "interval": interval, "start_ms": start_ms, "every": every, "side": side, "replay": replay,
+        "max_bars": max_bars or config.BACKTEST_MAX_HOLD_DAYS * 86400000 // kline_store.INTERVAL_MS[interval],
+        "equity": equity or config.BACKTEST_EQUITY,
+        "fee_rate": config.BACKTEST_FEE_RATE if fee_rate is None else fee_rate
+    }
+    tasks = []
+    for symbol in symbols:
+        if signals is not None and symbol not in signals:
+            continue
+        for c, chunk in enumerate(chunks):
+            tasks.append({**base, "symbol": symbol, "chunk": c,
+                          "grid": None if replay else {k: v[chunk] for k, v in grid.items()},
+                          "signals": signals.get(symbol) if signals else None,
+                          "filters": (filters or {}).get(symbol, DEFAULT_FILTERS)})
+
+    totals = {name: np.zeros(n_params) for name in STAT_FIELDS}
+    worst_drawdown = np.zeros(n_params)
+    t0 = time.perf_counter()
+
+    def merge(result):
+        _, c, stats = result
+        if stats is None:
+            return
+        span = chunks[c]
+        for name in STAT_FIELDS:
+            totals[name][span] += stats.totals[name]
+        worst_drawdown[span] = np.maximum(worst_drawdown[span], stats.max_drawdown)
+
+    workers = workers or config.BACKTEST_WORKERS or os.cpu_count()
+    if workers == 1:
+        for task in tasks:
+            merge(run_task(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in as_completed([pool.submit(run_task, task) for task in tasks]):
+                merge(future.result())
+    return _rows(totals, worst_drawdown, None if replay else grid), time.perf_counter() - t0
+
+
+def _rows(totals, worst_drawdown, grid):
+    trades = np.maximum(totals["trades"], 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        profit_factor = np.where(totals["gross_loss"] > 0, totals["gross_profit"] / totals["gross_loss"], np.inf)
+    rows = []
+    for i in range(len(trades)):
+        row = {name: float(grid[name][i]) for name in GRID_FIELDS} if grid is not None else {"config": "signals"}
+        row.update({
+            "trades": int(totals["trades"][i]),
+            "win_rate": round(float(totals["wins"][i] / trades[i] * 100), 2),
+            "pnl": round(float(totals["pnl"][i]), 2),
+            "avg_r": round(float(totals["r_sum"][i] / trades[i]), 3),
+            "profit_factor": round(float(profit_factor[i]), 3),
+            "sl_rate": round(float(totals["sl_exits"][i] / trades[i] * 100), 2),
+            "tp1_rate": round(float(totals["tp1_fills"][i] / trades[i] * 100), 2),
+            "tp2_rate": round(float(totals["tp2_fills"][i] / trades[i] * 100), 2),
+            "time_exit_rate": round(float(totals["time_exits"][i] / trades[i] * 100), 2),
+            "avg_bars": round(float(totals["bars_held"][i] / trades[i]), 1),
+            "worst_symbol_drawdown": round(float(worst_drawdown[i]), 2)
+        })
+        rows.append(row)
+    return sorted(rows, key=lambda r: r["pnl"], reverse=True)
+
+
+# ────────────────────────────────────────────────────────────────
+#      Data
+# ────────────────────────────────────────────────────────────────
+def _exchange_info():
+    from transport import get_transport
+    response = get_transport().request('GET', '/fapi/v1/exchangeInfo')
+    response.raise_for_status()
+    return response.json()
+
+
+def symbol_filters(info):
+    """{symbol: step/tick/precisions} from an exchangeInfo payload (logic's filter index)"""
+    import logic
+    return {s: {k: f[k] for k in DEFAULT_FILTERS} for s, f in logic._build_filter_index(info).items()}
+
+
+def download(symbols, interval, since_ms, root=None, weight_per_min=None):
+    """Top up (or start at since_ms) each symbol's candles under BACKTEST_KLINE_DIR"""
+    store = kline_store.KlineStore(root=root or config.BACKTEST_KLINE_DIR, intervals=[interval],
+                                   weight_per_min=weight_per_min)
+    for i, symbol in enumerate(symbols, 1):
+        try:
+            added = store.sync_series(symbol, interval, since_ms=since_ms)
+            series = store.get_series(symbol, interval)
+            first = series.first_open_time()
+            note = " (starts after the requested start)" if first and first > since_ms + kline_store.INTERVAL_MS[interval] else ""
+            print(f"[{i}/{len(symbols)}] {symbol}: +{added} candles, {len(series)} stored{note}")
+        except Exception as e:
+            print(f"[{i}/{len(symbols)}] {symbol}: download failed: {e}")
+
+
+def stored_symbols(interval, root=None):
+    folder = os.path.join(root or config.BACKTEST_KLINE_DIR, interval)
+    return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the SL/TP1/TP2 bracket rules over stored klines")
+    parser.add_argument("--symbols", nargs="*", help="default: every stored symbol (with --download: every USDT symbol)")
+    parser.add_argument("--interval", default="15m", choices=sorted(kline_store.INTERVAL_MS))
+    parser.add_argument("--days", type=float, default=365, help="history to download / test")
+    parser.add_argument("--download", action="store_true", help="fetch missing candles first")
+    parser.add_argument("--weight-per-min", type=int, default=1200, help="request weight the download may spend")
+    parser.add_argument("--sl", default="0.5:3:0.5", help="SL %% values: list or start:stop:step")
+    parser.add_argument("--tp1", default="0.5:3:0.5", help="TP1 distance from entry, %%")
+    parser.add_argument("--tp1-pct", default="25,50,75,100", help="TP1 share of the quantity, %%")
+    parser.add_argument("--tp2", default="0,2,3,4,6", help="TP2 distance from entry, %% (0 = none)")
+    parser.add_argument("--every", type=int, default=96, help="enter every N bars (without --signals)")
+    parser.add_argument("--side", default="BOTH", choices=("LONG", "SHORT", "BOTH"))
+    parser.add_argument("--signals", help="CSV of entries (time, symbol, side[, sl_pct|sl_price, tp1_price, tp1_pct, tp2_price])")
+    parser.add_argument("--max-hold-days", type=float, default=config.BACKTEST_MAX_HOLD_DAYS)
+    parser.add_argument("--equity", type=float, default=config.BACKTEST_EQUITY)
+    parser.add_argument("--fee-rate", type=float, default=config.BACKTEST_FEE_RATE)
+    parser.add_argument("--workers", type=int, default=config.BACKTEST_WORKERS)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--out", help="write every configuration to this CSV")
+    args = parser.parse_args()
+
+    step_ms = kline_store.INTERVAL_MS[args.interval]
+    start_ms = int(time.time() * 1000 - args.days * 86400000)
+    filters, info = {}, None
+    try:
+        info = _exchange_info()
+        filters = symbol_filters(info)
+    except Exception as e:
+        print(f"exchangeInfo unavailable ({e}); using default tick/lot step")
+
+    symbols = [s.upper() for s in args.symbols] if args.symbols else None
+    if args.download:
+        if symbols is None and info is not None:
+            symbols = sorted(s["symbol"] for s in info["symbols"]
+                             if s["status"] == "TRADING" and s["quoteAsset"] == "USDT")
+        download(symbols or [], args.interval, start_ms, weight_per_min=args.weight_per_min)
+    symbols = symbols or stored_symbols(args.interval)
+    if not symbols:
+        raise SystemExit(f"no candles under {config.BACKTEST_KLINE_DIR}/{args.interval}; run with --download")
+
+    signals = load_signals(args.signals) if args.signals else None
+    grid = make_grid(parse_values(args.sl), parse_values(args.tp1), parse_values(args.tp1_pct), parse_values(args.tp2))
+    rows, seconds = run(symbols, args.interval, grid, signals, args.every, args.side, start_ms,
+                        max_bars=max(1, int(args.max_hold_days * 86400000 // step_ms)), equity=args.equity,
+                        fee_rate=args.fee_rate, filters=filters, workers=args.workers)
+
+    configs = 1 if rows and "config" in rows[0] else len(grid["sl"])
+    total_trades = sum(r["trades"] for r in rows)
+    print(f"\n{len(symbols)} symbols × {configs} configurations, {total_trades:,} simulated trades "
+          f"in {seconds:.1f} s")
+    columns = list(rows[0]) if rows else []
+    print("  ".join(f"{c:>10}" for c in columns))
+    for row in rows[:args.top]:
+        print("  ".join(f"{row[c]:>10}" for c in columns))
+    if args.out:
+        with open(args.out, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"wrote {len(rows)} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
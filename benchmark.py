@@ -0,0 +1,179 @@
+# benchmark.py
+# End-to-end latency and call-count benchmark against the local simulator.
+# Reports p50/p99 per Flask route and for the entry-to-protected trade flow
+# (parallel and sequential bracket modes), plus REST calls per operation.
+#
+#   python benchmark.py --iterations 50 --latency-ms 30 --jitter-ms 10
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from simulator import Simulator
+
+ROUTES = [
+    "/get_live_price/BTCUSDT",
+    "/get_open_positions",
+    "/get_trade_history",
+    "/get_today_stats",
+    "/",
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(name, samples_ms, calls, n):
+    return {
+        "name": name,
+        "p50": percentile(samples_ms, 50),
+        "p99": percentile(samples_ms, 99),
+        "mean": statistics.fmean(samples_ms) if samples_ms else 0.0,
+        "calls": sum(calls.values()) / n if n else 0.0,
+        "breakdown": calls,
+    }
+
+
+def print_report(rows, verbose=False):
+    print(f"\n{'operation':<34}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'calls/op':>10}")
+    print("─" * 74)
+    for r in rows:
+        print(f"{r['name']:<34}{r['p50']:>10.1f}{r['p99']:>10.1f}{r['mean']:>10.1f}{r['calls']:>10.2f}")
+        if verbose:
+            for endpoint, count in r["breakdown"].most_common():
+                print(f"    {endpoint:<50}{count:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app against the local Binance simulator")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--trades", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--err-1021", type=float, default=0)
+    parser.add_argument("--clock-skew-ms", type=int, default=0, help="simulated exchange clock minus local clock")
+    parser.add_argument("--err-4120", type=float, default=0)
+    parser.add_argument("--err-429", type=float, default=0)
+    parser.add_argument("--fanout", type=int, default=0, help="also time a bracket fanned out to N sub-accounts")
+    parser.add_argument("--no-streams", action="store_true", help="disable the websocket-backed stores")
+    parser.add_argument("--verbose", action="store_true", help="print per-endpoint call counts")
+    args = parser.parse_args()
+
+    sim = Simulator(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rates={-1021: args.err_1021, -4120: args.err_4120, 429: args.err_429},
+        clock_skew_ms=args.clock_skew_ms
+    ).start()
+
+    # Point the app at the simulator before config is imported
+    os.environ["BINANCE_FAPI_URL"] = sim.rest_url
+    os.environ["BINANCE_FSTREAM_URL"] = sim.ws_url
+    os.environ["TRADE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_trades.db")
+    os.environ["KLINE_DIR"] = os.path.join(tempfile.mkdtemp(), "klines")
+    os.environ.setdefault("BINANCE_API_KEY", "simulator")
+    os.environ.setdefault("BINANCE_API_SECRET", "simulator")
+
+    import config
+    config.USE_PRICE_STREAM = config.USE_USER_STREAM = not args.no_streams
+    sim.api_secret = config.BINANCE_SECRET   # every signed call is verified
+    # Daily limits are enforced by the shared ledger; lift them for the run
+    config.MAX_TRADES_PER_DAY = config.MAX_TRADES_PER_SYMBOL_PER_DAY = 10 ** 6
+    config.KLINE_SYNC_WEIGHT_PER_MIN = 10 ** 6   # no pacing against the simulator
+
+    import accounts
+    import governor
+    import kline_store
+    import logic
+    import warmup
+    from app import app   # starts the warm-up
+
+    if not warmup.wait(timeout=30):
+        raise SystemExit(f"warm-up did not finish: {warmup.snapshot()}")
+    warmed = warmup.snapshot()
+    logic.get_live_price("BTCUSDT")
+    if not args.no_streams:
+        deadline = time.time() + 5
+        while logic.get_account_state() is None and time.time() < deadline:
+            time.sleep(0.1)
+        time.sleep(1.2)  # first mark price push
+    deadline = time.time() + 30   # first candle round, so its downloads are not counted below
+    while config.USE_KLINE_STORE and not (kline_store.snapshot() or {}).get("rounds") and time.time() < deadline:
+        time.sleep(0.1)
+
+    rows = []
+
+    def run(name, fn, n):
+        before = Counter(sim.calls)
+        samples = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        calls = Counter(sim.calls)
+        calls.subtract(before)
+        rows.append(summarize(name, samples, +calls, n))
+
+    def trade(parallel):
+        price = logic.get_live_price("BTCUSDT")
+        balance, margin = logic.get_live_balance()
+        sizing = logic.calculate_position_sizing(balance - margin, price, "SL % Movement", 1.0)
+        with app.test_request_context():
+            result = logic.execute_trade_action(
+                balance, "BTCUSDT", "LONG", price, "MARKET", "SL % Movement", 1.0, sizing,
+                0.01, 10, "ISOLATED", price * 1.01, 50, price * 1.02, parallel=parallel
+            )
+        if not result["success"]:
+            print(f"  trade failed: {result['message']}")
+
+    run("trade flow (parallel)", lambda: trade(True), args.trades)
+    run("trade flow (sequential)", lambda: trade(False), args.trades)
+
+    if args.fanout:
+        # Every sub-account signs with the simulator's key; clients are
+        # connected up front so the timing covers placement only
+        sub_ids = [f"sub{i}" for i in range(args.fanout)]
+        for account_id in sub_ids:
+            accounts.register(account_id, config.BINANCE_KEY, config.BINANCE_SECRET)
+        with ThreadPoolExecutor(max_workers=args.fanout) as pool:
+            list(pool.map(logic.get_account_client, sub_ids))
+
+        def fanout():
+            price = logic.get_live_price("BTCUSDT")
+            with app.test_request_context():
+                result = logic.execute_fanout_trade(
+                    sub_ids, "BTCUSDT", "LONG", price, "MARKET", "SL % Movement", 1.0,
+                    0.01, 10, "ISOLATED", price * 1.01, 50, price * 1.02
+                )
+            if not result["success"]:
+                print(f"  fan-out: {result['message']}")
+
+        run(f"trade fan-out ({args.fanout} accounts)", fanout, args.trades)
+
+    client = app.test_client()
+    for route in ROUTES:
+        run(f"GET {route}", lambda: client.get(route), args.iterations)
+
+    print(f"simulator: {sim.rest_url}  latency {args.latency_ms}±{args.jitter_ms} ms  "
+          f"streams {'off' if args.no_streams else 'on'}")
+    print(f"warm-up: {warmed['state']} in {warmed['elapsed_ms']:.0f} ms  "
+          + "  ".join(f"{name} {step['ms']:.0f}" for name, step in warmed["steps"].items()))
+    print_report(rows, args.verbose)
+    limits = governor.snapshot()
+    print(f"\nrate-limit governor: queued {limits['queued']}  rejected {limits['rejected']}  "
+          f"throttled {limits['throttled']}")
+    for name, usage in limits["limits"].items():
+        print(f"    {name:<22}{usage['exchange_used']:>6} / {usage['limit']:<6} used (exchange)")
+    sim.stop()
+
+
+if __name__ == "__main__":
+    main()
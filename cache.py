@@ -0,0 +1,235 @@
+# cache.py
+# Thread-safe TTL cache shared by the logic.py / async_logic.py getters:
+# per-key TTL, LRU bound, single-flight loads (concurrent misses make one
+# Binance call), stale-while-revalidate, and hit/miss counters.
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+_registry = {}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    ttl        seconds an entry is fresh
+    maxsize    LRU bound on the number of keys
+    stale_ttl  extra seconds a stale entry may still be served while one
+               background reload runs (0 disables stale-while-revalidate)
+    """
+
+    def __init__(self, name, ttl, maxsize=1024, stale_ttl=0):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()   # key -> (value, stored_at, ttl)
+        self._inflight = {}          # key -> _Flight
+        self._tasks = {}             # key -> asyncio.Task (coroutine loaders)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stale_hits = 0
+        self.loads = self.errors = self.evictions = 0
+        self.coalesced = 0           # misses that waited on another caller's load
+        _registry[name] = self
+
+    # ── plain access ─────────────────────────────────────────────
+    def _age(self, entry):
+        return time.time() - entry[1]
+
+    def get(self, key):
+        """Fresh value or None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._age(entry) < entry[2]:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def peek(self, key):
+        """Last stored value regardless of age (last-known-good fallback)"""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[0] if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key, value, ttl):
+        self._data[key] = (value, time.time(), self.ttl if ttl is None else ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    # ── loading ──────────────────────────────────────────────────
+    def _load(self, key, loader, ttl, flight):
+        try:
+            value = loader()
+            with self._lock:
+                self._store(key, value, ttl)
+                self.loads += 1
+            flight.value = value
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            flight.error = e
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Fresh hit -> cached value. Stale but inside stale_ttl -> cached
+        value, plus one background reload. Miss -> one caller runs loader,
+        concurrent callers wait for its result. Loader errors are raised.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                age = self._age(entry)
+                if age < entry[2]:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                if age < entry[2] + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._inflight:
+                        flight = self._inflight[key] = _Flight()
+                        threading.Thread(
+                            target=self._load, args=(key, loader, ttl, flight),
+                            name=f"cache-{self.name}", daemon=True
+                        ).start()
+                    return entry[0]
+
+            self.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            self._load(key, loader, ttl, flight)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    async def _load_async(self, key, loader, ttl):
+        try:
+            value = await loader()
+            with self._lock:
+                self._store(key, value, ttl)
+                self.loads += 1
+            return value
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._tasks.pop(key, None)
+
+    def _start_task(self, key, loader, ttl):
+        task = self._tasks[key] = asyncio.ensure_future(self._load_async(key, loader, ttl))
+        # Background refreshes may fail with nobody awaiting them
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def get_or_load_async(self, key, loader, ttl=None):
+        """
+        get_or_load() for coroutine loaders (one event loop): concurrent
+        misses await the same task, stale entries refresh in a task.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                age = self._age(entry)
+                if age < entry[2]:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                if age < entry[2] + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._tasks:
+                        self._start_task(key, loader, ttl)
+                    return entry[0]
+
+            self.misses += 1
+            task = self._tasks.get(key)
+            if task is None:
+                task = self._start_task(key, loader, ttl)
+            else:
+                self.coalesced += 1
+
+        # shield: a cancelled caller must not cancel the shared load
+        return await asyncio.shield(task)
+
+    # ── metrics ──────────────────────────────────────────────────
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "loads": self.loads,
+                "errors": self.errors,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            }
+
+
+def all_stats():
+    return {name: c.stats() for name, c in _registry.items()}
+
+
+def _collect():
+    """/metrics families: lookups by result, loads, evictions and hit rate per cache"""
+    stats = all_stats()
+    lookups = []
+    for name, st in stats.items():
+        for result in ("hits", "stale_hits", "misses", "coalesced"):
+            lookups.append(({"cache": name, "result": result}, st[result]))
+    return [
+        ("cache_lookups_total", "counter", "Cache lookups by result", lookups),
+        ("cache_loads_total", "counter", "Loads (Binance calls) made on a miss",
+         [({"cache": n}, st["loads"]) for n, st in stats.items()]),
+        ("cache_load_errors_total", "counter", "Loads that raised",
+         [({"cache": n}, st["errors"]) for n, st in stats.items()]),
+        ("cache_evictions_total", "counter", "Entries evicted by the size bound",
+         [({"cache": n}, st["evictions"]) for n, st in stats.items()]),
+        ("cache_entries", "gauge", "Entries held",
+         [({"cache": n}, st["size"]) for n, st in stats.items()]),
+        ("cache_hit_ratio", "gauge", "(hits + stale hits) / lookups since start",
+         [({"cache": n}, st["hit_rate"]) for n, st in stats.items()]),
+    ]
+
+
+metrics.REGISTRY.add_collector(_collect)
@@ -0,0 +1,236 @@
+# clock.py
+# Server-clock tracker shared by every signer in the process. Binance
+# rejects a signed call (-1021) stamped more than 1 s ahead of its clock or
+# older than recvWindow. A background thread samples /fapi/v1/time in short
+# bursts; each sample's offset is taken at the midpoint of its round trip
+# (NTP-style), the lowest-RTT sample of a burst wins, and bursts are
+# smoothed with an EWMA. Clients and transports read the estimate when they
+# sign, so one tracker serves every account (the offset is between this
+# host's clock and the exchange's, not per key).
+
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+from binance.exceptions import BinanceAPIException
+
+import config
+import logs
+import metrics
+
+TIMESTAMP_ERROR = -1021
+
+
+class ClockTracker:
+    def __init__(self, transport):
+        self.transport = transport
+        self.offset = 0.0        # server - local, ms
+        self.rtt = None          # ms, of the sample the last burst kept
+        self.synced_at = 0.0
+        self.syncs = 0
+        self.steps = 0
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._resync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def offset_ms(self):
+        return int(round(self.offset))
+
+    def timestamp_ms(self):
+        """Local time expressed on the exchange clock"""
+        return int(time.time() * 1000 + self.offset)
+
+    # ── sampling ─────────────────────────────────────────────────
+    def _sample(self):
+        """(offset ms, rtt ms) of one /fapi/v1/time round trip"""
+        t0 = time.time()
+        server_time = self.transport.request('GET', '/fapi/v1/time').json()['serverTime']
+        t1 = time.time()
+        return server_time - (t0 + t1) * 500, (t1 - t0) * 1000
+
+    def sync(self):
+        """One burst of CLOCK_SYNC_BURST samples; True if the estimate was updated"""
+        samples, error = [], None
+        for _ in range(config.CLOCK_SYNC_BURST):
+            try:
+                samples.append(self._sample())
+            except Exception as e:
+                error = e
+        if not samples:
+            self.errors += 1
+            self.last_error = str(error)
+            logs.warning("time_sync_failed", error=str(error))
+            return False
+
+        offset, rtt = min(samples, key=lambda s: s[1])
+        with self._lock:
+            step = self.syncs == 0 or abs(offset - self.offset) > config.CLOCK_STEP_MS
+            if step:
+                self.offset = offset
+                self.steps += 1
+            else:
+                self.offset += config.CLOCK_SMOOTHING * (offset - self.offset)
+            self.rtt = rtt
+            self.synced_at = time.time()
+            self.syncs += 1
+        metrics.CLOCK_OFFSET.set(self.offset / 1000)
+        metrics.CLOCK_RTT.observe(rtt / 1000)
+        if step and self.syncs > 1:
+            logs.warning("clock_step", offset_ms=round(offset, 1), rtt_ms=round(rtt, 1))
+        return True
+
+    def resync(self, signed_at=None):
+        """
+        Immediate burst after a -1021. signed_at is when the rejected call
+        was stamped: if a burst has finished since then (another caller's),
+        the estimate is already fresh and no new burst is made.
+        """
+        with self._resync_lock:
+            if signed_at is not None and self.synced_at > signed_at:
+                return
+            metrics.CLOCK_RESYNCS.inc()
+            self.sync()
+
+    # ── lifecycle ────────────────────────────────────────────────
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="clock-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(config.CLOCK_SYNC_INTERVAL):
+            self.sync()
+
+    def snapshot(self):
+        return {
+            "offset_ms": round(self.offset, 1),
+            "rtt_ms": round(self.rtt, 1) if self.rtt is not None else None,
+            "age_seconds": round(time.time() - self.synced_at, 1) if self.synced_at else None,
+            "syncs": self.syncs,
+            "steps": self.steps,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "recv_window_ms": config.RECV_WINDOW
+        }
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def start(transport):
+    """
+    Start the process-wide tracker once. Until a burst has succeeded, each
+    call runs one before it returns; check synced() for the outcome.
+    """
+    global _tracker
+    if _tracker is not None and _tracker.syncs:
+        return _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            tracker = ClockTracker(transport)
+            tracker.sync()
+            tracker.start()
+            _tracker = tracker
+        elif not _tracker.syncs:
+            _tracker.sync()
+    return _tracker
+
+
+def synced():
+    """True once the tracker has an estimate from a successful burst"""
+    return _tracker is not None and _tracker.syncs > 0
+
+
+def offset_ms():
+    return _tracker.offset_ms() if _tracker is not None else 0
+
+
+def timestamp_ms():
+    return _tracker.timestamp_ms() if _tracker is not None else int(time.time() * 1000)
+
+
+def resync(signed_at=None):
+    if _tracker is not None:
+        _tracker.resync(signed_at)
+
+
+def snapshot():
+    return _tracker.snapshot() if _tracker is not None else None
+
+
+# ────────────────────────────────────────────────────────────────
+#      python-binance clients
+# ────────────────────────────────────────────────────────────────
+class ClockedClientMixin:
+    """
+    python-binance stamps signed calls with time.time() + timestamp_offset;
+    the offset comes from the tracker and every signed call carries
+    recvWindow = config.RECV_WINDOW, set here rather than through
+    REQUEST_RECVWINDOW, which older python-binance releases lack. A -1021
+    (rejected before it reached the matching engine) re-syncs the tracker
+    and is sent once more.
+    """
+
+    REQUEST_RECVWINDOW = config.RECV_WINDOW
+
+    @property
+    def timestamp_offset(self):
+        return offset_ms()
+
+    @timestamp_offset.setter
+    def timestamp_offset(self, value):
+        pass   # owned by the tracker
+
+    def _request(self, method, uri, signed, force_params=False, **kwargs):
+        if not signed:
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        kwargs["data"] = {**(kwargs.get("data") or {}), "recvWindow": config.RECV_WINDOW}
+        data = dict(kwargs["data"])   # python-binance signs the dict in place
+        signed_at = time.time()
+        try:
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        except BinanceAPIException as e:
+            if e.code != TIMESTAMP_ERROR:
+                raise
+            resync(signed_at)
+            metrics.BINANCE_RETRIES.inc(endpoint=urlsplit(uri).path, reason=str(TIMESTAMP_ERROR))
+            return super()._request(method, uri, signed, force_params, **{**kwargs, "data": data})
+
+
+class AsyncClockedClientMixin:
+    """ClockedClientMixin for AsyncClient; the re-sync burst runs on a worker thread"""
+
+    REQUEST_RECVWINDOW = config.RECV_WINDOW
+
+    @property
+    def timestamp_offset(self):
+        return offset_ms()
+
+    @timestamp_offset.setter
+    def timestamp_offset(self, value):
+        pass
+
+    async def _request(self, method, uri, signed, force_params=False, **kwargs):
+        if not signed:
+            return await super()._request(method, uri, signed, force_params, **kwargs)
+        kwargs["data"] = {**(kwargs.get("data") or {}), "recvWindow": config.RECV_WINDOW}
+        data = dict(kwargs["data"])
+        signed_at = time.time()
+        try:
+            return await super()._request(method, uri, signed, force_params, **kwargs)
+        except BinanceAPIException as e:
+            if e.code != TIMESTAMP_ERROR:
+                raise
+            await asyncio.to_thread(resync, signed_at)
+            metrics.BINANCE_RETRIES.inc(endpoint=urlsplit(uri).path, reason=str(TIMESTAMP_ERROR))
+            return await super()._request(method, uri, signed, force_params, **{**kwargs, "data": data})
@@ -58,13 +58,17 @@ API_SECRET = os.getenv('BINANCE_API_SECRET')
 # ────────────────────────────────────────────────────────────────
 #              Safety check - very important!
 # ────────────────────────────────────────────────────────────────
+# Missing keys no longer stop the import: the app starts, serves the
+# dashboard without account data and /ready reports "not_configured";
+# no client is ever connected.
+CREDENTIALS_ERROR = None
 if not API_KEY or not API_SECRET:
-    raise ValueError(
-        "!!! CRITICAL ERROR !!!\n"
-        "Binance API key or secret is missing!\n"
-        "Please set BINANCE_API_KEY and BINANCE_API_SECRET environment variables\n"
+    CREDENTIALS_ERROR = (
+        "Binance API key or secret is missing! "
+        "Please set BINANCE_API_KEY and BINANCE_API_SECRET environment variables "
         "or uncomment and fill the hardcoded values (but only for testing!)"
     )
+    print(f"!!! CRITICAL ERROR !!! {CREDENTIALS_ERROR}")
 
 # ────────────────────────────────────────────────────────────────
 #                   Trading Configuration
@@ -85,15 +89,124 @@ PRICE_UPDATE_INTERVAL = 5
 PRICE_CACHE_DURATION = 5        # seconds
 SYMBOL_CACHE_DURATION = 3600    # 1 hour
 
+# Bracket placement: parallel leverage/margin calls, entry price from
+# avgPrice (no sleep), TP legs placed together once the SL is confirmed
+PARALLEL_BRACKET = True
+
+# Local trade history store (SQLite); new fills are fetched at most
+# every TRADE_SYNC_INTERVAL seconds
+TRADE_DB_PATH = os.getenv('TRADE_DB_PATH', 'trades.db')
+TRADE_SYNC_INTERVAL = 5
+
+# Daily trade counters (trade_limits.py) live in the same database and are
+# kept for this many days
+TRADE_LIMIT_RETENTION_DAYS = 7
+
+# Portfolio risk scenarios: a market-wide move (fraction) applied to each
+# base asset scaled by its beta (RISK_BETAS, else RISK_DEFAULT_BETA)
+RISK_SHOCKS = [-0.20, -0.10, -0.05, 0.05, 0.10, 0.20]
+RISK_BETAS = {"BTC": 1.0, "ETH": 1.2}
+RISK_DEFAULT_BETA = 1.5
+
+# Sub-accounts for fan-out trading (same bracket in every account). JSON
+# list of {"id", "api_key", "api_secret"}; "api_key_env"/"api_secret_env"
+# name environment variables instead of holding the keys in the file.
+ACCOUNTS_FILE = os.getenv('ACCOUNTS_FILE', 'accounts.json')
+FANOUT_MAX_WORKERS = 64         # accounts placed concurrently
+
+# /close_all: batched market closes and per-symbol cancels run on up to
+# this many threads
+CLOSE_ALL_MAX_WORKERS = 32
+
+# Structured logs (logs.py): "json" or "text"; routine per-call events
+# (order legs, algo requests) are sampled, warnings/errors never are
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+
+# Server-clock tracker (clock.py): bursts of CLOCK_SYNC_BURST
+# /fapi/v1/time samples every CLOCK_SYNC_INTERVAL seconds, lowest round
+# trip kept, EWMA-smoothed; jumps over CLOCK_STEP_MS are applied at once.
+# Signed calls are valid for RECV_WINDOW ms (Binance default 5000).
+CLOCK_SYNC_INTERVAL = 30
+CLOCK_SYNC_BURST = 3
+CLOCK_SMOOTHING = 0.3
+CLOCK_STEP_MS = 250
+RECV_WINDOW = 5000
+
+# Take-profit ladders: up to this many reduce-only LIMIT legs, sent
+# through batchOrders (5 legs per call, the calls concurrently)
+TP_LADDER_MAX_LEVELS = 10
+
+# Local order books (order_book.py): REST snapshot + <symbol>@depth@100ms
+# diffs on one combined stream. Market entries are refused when the book
+# says the fill would slip more than MAX_ENTRY_SLIPPAGE_PCT from the mid
+# (None = no check); a book older than ORDER_BOOK_STALE_AFTER seconds is
+# not used.
+USE_ORDER_BOOK = True
+ORDER_BOOK_SNAPSHOT_LIMIT = 1000
+ORDER_BOOK_STALE_AFTER = 5
+MAX_ENTRY_SLIPPAGE_PCT = 0.5
+
+# Candle store (kline_store.py): closed klines of every USDT symbol as
+# append-only column files under KLINE_DIR, read on demand (no file stays
+# open), topped up every KLINE_SYNC_INTERVAL seconds. New series start KLINE_HISTORY candles back;
+# the sync spends at most KLINE_SYNC_WEIGHT_PER_MIN request weight a minute
+# so dashboard reads keep their budget.
+USE_KLINE_STORE = True
+KLINE_DIR = os.getenv('KLINE_DIR', 'klines')
+KLINE_INTERVALS = ["15m", "1h", "4h"]
+KLINE_HISTORY = 200
+KLINE_SYNC_INTERVAL = 60
+KLINE_SYNC_WEIGHT_PER_MIN = 600
+
+# ATR stop-loss suggestions: ATR_PERIOD-bar ATR of each KLINE_INTERVALS
+# timeframe, times each multiplier
+ATR_PERIOD = 14
+ATR_MULTIPLIERS = [1.0, 1.5, 2.0]
+
+# Backtests (backtest.py): candles under BACKTEST_KLINE_DIR, apart from
+# the live store (whose series start only KLINE_HISTORY candles back). Each
+# trade is sized on BACKTEST_EQUITY and pays BACKTEST_FEE_RATE (taker) per
+# fill; trades still open after BACKTEST_MAX_HOLD_DAYS are closed at market.
+BACKTEST_KLINE_DIR = os.getenv('BACKTEST_KLINE_DIR', 'klines_history')
+BACKTEST_EQUITY = 10000.0
+BACKTEST_FEE_RATE = 0.0004
+BACKTEST_MAX_HOLD_DAYS = 30
+BACKTEST_WORKERS = None         # processes; None = one per CPU
+
 # API Retry settings
 MAX_RETRIES = 3
 RETRY_DELAY = 1                 # seconds between retries
 
+# Rate-limit governor. Limits are replaced by exchangeInfo rateLimits
+# once it loads; usage is re-synced from the X-MBX-* response headers.
+RATE_LIMIT_WEIGHT_1M = 2400
+RATE_LIMIT_ORDERS_1M = 1200
+RATE_LIMIT_ORDERS_10S = 300
+RATE_LIMIT_HEADROOM = 0.9       # share of each exchange limit we allow ourselves
+RATE_LIMIT_ORDER_RESERVE = 0.2  # share of the budget dashboard reads may not touch
+RATE_LIMIT_MAX_WAIT = 5         # seconds a call may queue before it is refused
+
 # ────────────────────────────────────────────────────────────────
 #                   Optional - Testnet support
 # ────────────────────────────────────────────────────────────────
 USE_TESTNET = False  # Change to True when testing!!!
 
+# Base URL for the raw fapi endpoints (algo orders, server time).
+# Point at a local stub server for benchmarking.
+FAPI_BASE_URL = os.getenv('BINANCE_FAPI_URL', 'https://fapi.binance.com')
+FSTREAM_URL = os.getenv('BINANCE_FSTREAM_URL', 'wss://fstream.binance.com')
+
+# Live prices come from the mark-price websocket; REST is used only when
+# the streamed price is older than this (seconds)
+USE_PRICE_STREAM = True
+PRICE_STREAM_STALE_AFTER = 3
+
+# Positions, open orders and balance come from the user-data stream once
+# it is seeded; REST is used while it is down
+USE_USER_STREAM = True
+
 if USE_TESTNET:
     print("!!! USING BINANCE FUTURES TESTNET !!!")
     # Testnet base URLs (add to Client initialization if needed)
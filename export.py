@@ -0,0 +1,109 @@
+# export.py
+# Streaming trade history export. Rows are read from the trade store in
+# batches and encoded chunk by chunk, so memory stays flat whatever the
+# history size and the first bytes go out immediately.
+
+import csv
+import io
+from datetime import datetime
+
+CSV_HEADER = ['Time (UTC)', 'Symbol', 'Side', 'Quantity', 'Price', 'Realized PnL', 'Commission']
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def csv_chunks(batches):
+    """batches of raw store rows -> CSV text chunks (one per batch)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue()
+
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for r in rows:
+            writer.writerow([
+                datetime.utcfromtimestamp(r[2] / 1000).strftime("%Y-%m-%d %H:%M:%S"),
+                r[1], r[3], r[4], r[5], r[6], r[7]
+            ])
+        yield buffer.getvalue()
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def columnar_chunks(batches, fmt):
+    """
+    batches of raw store rows -> Arrow IPC stream or Parquet bytes.
+    Each batch becomes one record batch / row group. Needs pyarrow.
+    """
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ('time', pa.timestamp('ms', tz='UTC')),
+        ('symbol', pa.string()),
+        ('trade_id', pa.int64()),
+        ('side', pa.string()),
+        ('qty', pa.float64()),
+        ('price', pa.float64()),
+        ('realized_pnl', pa.float64()),
+        ('commission', pa.float64()),
+    ])
+
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    for rows in batches:
+        columns = list(zip(*rows))
+        batch = pa.record_batch([
+            pa.array(columns[2], type=pa.int64()).cast(schema.field('time').type),
+            pa.array(columns[1], type=pa.string()),
+            pa.array(columns[0], type=pa.int64()),
+            pa.array(columns[3], type=pa.string()),
+            pa.array(columns[4], type=pa.float64()),
+            pa.array(columns[5], type=pa.float64()),
+            pa.array(columns[6], type=pa.float64()),
+            pa.array(columns[7], type=pa.float64()),
+        ], schema=schema)
+        writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+
+    writer.close()
+    yield sink.drain()
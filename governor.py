@@ -0,0 +1,514 @@
+# governor.py
+# Client-side rate-limit governor. Every fapi REST call (python-binance
+# client and the raw transport) asks for its request weight / order count
+# before it is sent. There is one token bucket per Binance limit, re-synced
+# from the X-MBX-USED-WEIGHT-* / X-MBX-ORDER-COUNT-* headers of each
+# response. Order calls may spend the whole budget; dashboard reads stop
+# at a reserve and queue behind any waiting order call. Request weight is
+# per IP and shared; order counts are kept per account.
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import re
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+
+import config
+import logs
+import metrics
+
+ORDER = 0
+READ = 1
+PRIORITY_NAMES = {ORDER: "order", READ: "read"}
+
+INTERVAL_SECONDS = {
+    "S": 1, "M": 60, "H": 3600, "D": 86400,
+    "SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400
+}
+HEADER_RE = re.compile(r"x-mbx-(used-weight|order-count)-(\d+)([smhd])$", re.IGNORECASE)
+DEFAULT_BACKOFF = 5   # seconds, when a 429/418 carries no Retry-After
+ASYNC_POLL = 0.05     # seconds between budget checks of a waiting coroutine
+
+# IP weight per USDT-M endpoint (everything else costs 1).
+# A tuple is (weight with symbol, weight without symbol).
+ENDPOINT_WEIGHTS = {
+    "/fapi/v2/account": 5,
+    "/fapi/v3/account": 5,
+    "/fapi/v2/balance": 5,
+    "/fapi/v3/balance": 5,
+    "/fapi/v2/positionRisk": 5,
+    "/fapi/v3/positionRisk": 5,
+    "/fapi/v1/userTrades": 5,
+    "/fapi/v1/income": 30,
+    "/fapi/v1/openOrders": (1, 40),
+    "/fapi/v1/openAlgoOrders": (1, 40),
+    "/fapi/v1/ticker/price": (1, 2),
+    "/fapi/v2/ticker/price": (1, 2),
+    "/fapi/v1/premiumIndex": (1, 10),
+}
+
+# Placement endpoints count against the ORDERS limits, not IP weight
+ORDER_ENDPOINTS = {"/fapi/v1/order", "/fapi/v1/algoOrder", "/fapi/v1/batchOrders"}
+
+
+class RateLimitExceeded(Exception):
+    """No budget within RATE_LIMIT_MAX_WAIT (or the IP is backing off)"""
+
+
+def _depth_weight(params):
+    limit = int(params.get("limit", 500))
+    if limit <= 50:
+        return 2
+    if limit <= 100:
+        return 5
+    if limit <= 500:
+        return 10
+    return 20
+
+
+def _klines_weight(params):
+    limit = int(params.get("limit", 500))
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def _batch_size(params):
+    orders = params.get("batchOrders", [])
+    if isinstance(orders, str):
+        try:
+            orders = json.loads(unquote(orders))
+        except ValueError:
+            return 1
+    return max(1, len(orders))
+
+
+def request_cost(method, path, params=None):
+    """(ip_weight, order_count) of one call"""
+    params = params or {}
+    if method.upper() == "POST" and path in ORDER_ENDPOINTS:
+        if path == "/fapi/v1/batchOrders":
+            return 5, _batch_size(params)
+        return 0, 1
+    if path == "/fapi/v1/depth":
+        return _depth_weight(params), 0
+    if path == "/fapi/v1/klines":
+        return _klines_weight(params), 0
+    weight = ENDPOINT_WEIGHTS.get(path, 1)
+    if isinstance(weight, tuple):
+        weight = weight[0] if params.get("symbol") else weight[1]
+    return weight, 0
+
+
+def _label(seconds):
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+class TokenBucket:
+    """Refills continuously at capacity/seconds; capacity = limit x headroom"""
+
+    def __init__(self, seconds, limit):
+        self.seconds = seconds
+        self.updated = time.monotonic()
+        self.exchange_used = 0
+        self.tokens = float(limit)
+        self.set_limit(limit)
+
+    def set_limit(self, limit):
+        self.limit = limit
+        self.capacity = max(1.0, limit * config.RATE_LIMIT_HEADROOM)
+        self.rate = self.capacity / self.seconds
+        self.tokens = min(self.tokens, self.capacity)
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost, floor):
+        """Seconds until cost can be taken while leaving floor tokens"""
+        short = cost + floor - self.tokens
+        return 0.0 if short <= 0 else short / self.rate
+
+    def observe(self, used, now):
+        # The exchange count is authoritative (and drops when its window rolls over)
+        self.updated = now
+        self.exchange_used = used
+        self.tokens = min(self.capacity, max(0.0, self.capacity - used))
+
+
+_urgent = contextvars.ContextVar("order_priority", default=False)
+
+
+class order_priority:
+    """
+    Context manager / decorator (plain or async functions): calls made
+    inside (e.g. the position lookup of a close) queue as order calls.
+    A context variable: asyncio tasks and asyncio.to_thread inherit it,
+    but new threads and executor workers start from an empty context, so
+    fan-out pools submit through submit_in_context().
+    """
+
+    def __enter__(self):
+        self._token = _urgent.set(True)
+        return self
+
+    def __exit__(self, *exc):
+        _urgent.reset(self._token)
+        return False
+
+    def __call__(self, func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with order_priority():
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with order_priority():
+                    return func(*args, **kwargs)
+        return wrapper
+
+
+def submit_in_context(pool, fn, *args, **kwargs):
+    """pool.submit(fn, ...) run in a copy of the caller's context (keeps order_priority)"""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class Governor:
+    def __init__(self):
+        self.buckets = {
+            ("REQUEST_WEIGHT", 60): TokenBucket(60, config.RATE_LIMIT_WEIGHT_1M),
+            ("ORDERS", 60): TokenBucket(60, config.RATE_LIMIT_ORDERS_1M),
+            ("ORDERS", 10): TokenBucket(10, config.RATE_LIMIT_ORDERS_10S),
+        }
+        self.account_buckets = {}   # sub-account -> bucket set (own ORDERS, shared weight)
+        self.backoff_until = 0.0
+        self._cond = threading.Condition()
+        self._orders_waiting = 0
+        self.granted = {ORDER: 0, READ: 0}
+        self.queued = {ORDER: 0, READ: 0}
+        self.queued_seconds = {ORDER: 0.0, READ: 0.0}
+        self.rejected = {ORDER: 0, READ: 0}
+        self.throttled = 0   # 429/418 responses seen
+
+    def configure(self, rate_limits):
+        """Adopt the limits from exchangeInfo['rateLimits']"""
+        with self._cond:
+            for rl in rate_limits:
+                seconds = INTERVAL_SECONDS.get(rl.get("interval"), 60) * int(rl.get("intervalNum", 1))
+                key = (rl.get("rateLimitType"), seconds)
+                limit = int(rl["limit"])
+                for buckets in [self.buckets] + list(self.account_buckets.values()):
+                    if key[0] != "ORDERS" and buckets is not self.buckets:
+                        buckets[key] = self.buckets[key]
+                    elif key in buckets:
+                        buckets[key].set_limit(limit)
+                    else:
+                        buckets[key] = TokenBucket(seconds, limit)
+            self._cond.notify_all()
+
+    def _bucket_set(self, account):
+        """Buckets a call is charged to: IP weight is shared, order counts are per account"""
+        if account is None:
+            return self.buckets
+        buckets = self.account_buckets.get(account)
+        if buckets is None:
+            buckets = self.account_buckets[account] = {
+                key: TokenBucket(key[1], bucket.limit) if key[0] == "ORDERS" else bucket
+                for key, bucket in self.buckets.items()
+            }
+        return buckets
+
+    # ── granting ─────────────────────────────────────────────────
+    def _request(self, method, path, params, priority, account):
+        """(costs, priority) for one call; caller holds the lock"""
+        weight, orders = request_cost(method, path, params)
+        if priority is None:
+            urgent = orders or method.upper() != "GET" or _urgent.get()
+            priority = ORDER if urgent else READ
+        costs = []
+        for (kind, _), bucket in self._bucket_set(account).items():
+            cost = weight if kind == "REQUEST_WEIGHT" else orders if kind == "ORDERS" else 0
+            if cost:
+                costs.append((bucket, min(cost, bucket.capacity)))
+        return costs, priority
+
+    def _take(self, costs, priority, now):
+        """
+        Take the tokens and return 0, or return the seconds to wait
+        (None: a read waiting for queued order calls). Caller holds the lock.
+        """
+        wait = self.backoff_until - now
+        if wait > 0:
+            return wait
+        if priority == READ and self._orders_waiting:
+            return None
+        for bucket, _ in costs:
+            bucket.refill(now)
+        wait = max([0.0] + [
+            bucket.wait_time(cost, 0 if priority == ORDER else bucket.capacity * config.RATE_LIMIT_ORDER_RESERVE)
+            for bucket, cost in costs
+        ])
+        if wait > 0:
+            return wait
+        for bucket, cost in costs:
+            bucket.tokens -= cost
+        return 0
+
+    def _granted(self, priority, queued_for):
+        self.granted[priority] += 1
+        if queued_for is not None:
+            self.queued[priority] += 1
+            self.queued_seconds[priority] += queued_for
+
+    def _check_deadline(self, method, path, priority, now, wait, deadline):
+        if now >= deadline or now + wait > deadline:
+            self.rejected[priority] += 1
+            raise RateLimitExceeded(
+                f"{method.upper()} {path}: no rate-limit budget within {config.RATE_LIMIT_MAX_WAIT}s")
+
+    def acquire(self, method, path, params=None, priority=None, account=None):
+        """Block until the call fits the budget; RateLimitExceeded after RATE_LIMIT_MAX_WAIT"""
+        start = time.monotonic()
+        deadline = start + config.RATE_LIMIT_MAX_WAIT
+        queued = False
+        with self._cond:
+            costs, priority = self._request(method, path, params, priority, account)
+            if priority == ORDER:
+                self._orders_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._take(costs, priority, now)
+                    if wait == 0:
+                        self._granted(priority, now - start if queued else None)
+                        return
+                    if wait is None:
+                        wait = deadline - now   # notified once the order calls are through
+                    self._check_deadline(method, path, priority, now, wait, deadline)
+                    queued = True
+                    self._cond.wait(wait)
+            finally:
+                if priority == ORDER:
+                    self._orders_waiting -= 1
+                    self._cond.notify_all()
+
+    async def acquire_async(self, method, path, params=None, priority=None, account=None):
+        """acquire() for the event loop: waits with asyncio.sleep instead of blocking"""
+        start = time.monotonic()
+        deadline = start + config.RATE_LIMIT_MAX_WAIT
+        queued = False
+        with self._cond:
+            costs, priority = self._request(method, path, params, priority, account)
+            if priority == ORDER:
+                self._orders_waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = self._take(costs, priority, now)
+                    if wait == 0:
+                        self._granted(priority, now - start if queued else None)
+                        return
+                    if wait is None:
+                        wait = deadline - now
+                    self._check_deadline(method, path, priority, now, wait, deadline)
+                queued = True
+                await asyncio.sleep(min(wait, ASYNC_POLL))
+        finally:
+            if priority == ORDER:
+                with self._cond:
+                    self._orders_waiting -= 1
+                    self._cond.notify_all()
+
+    # ── response headers ─────────────────────────────────────────
+    def record_headers(self, status, headers, account=None):
+        """Re-sync the buckets from the X-MBX-* headers; a 429/418 starts a back-off"""
+        now = time.monotonic()
+        with self._cond:
+            buckets = self._bucket_set(account)
+            for name, value in headers.items():
+                match = HEADER_RE.match(name)
+                if not match:
+                    continue
+                kind = "REQUEST_WEIGHT" if match.group(1).lower() == "used-weight" else "ORDERS"
+                seconds = int(match.group(2)) * INTERVAL_SECONDS[match.group(3).upper()]
+                bucket = buckets.get((kind, seconds))
+                if bucket is not None:
+                    bucket.observe(int(value), now)
+
+            if status in (418, 429):
+                retry_after = float(headers.get("Retry-After") or DEFAULT_BACKOFF)
+                self.backoff_until = max(self.backoff_until, now + retry_after)
+                self.throttled += 1
+                logs.warning("rate_limit_hit", status=status, backoff_seconds=retry_after)
+            self._cond.notify_all()
+
+    def record(self, response, account=None):
+        """record_headers() for a requests.Response"""
+        self.record_headers(response.status_code, response.headers, account)
+
+    def snapshot(self):
+        """Current budget usage per limit plus queueing counters"""
+        now = time.monotonic()
+        with self._cond:
+            limits = {}
+            for (kind, seconds), bucket in self.buckets.items():
+                bucket.refill(now)
+                limits[f"{kind}_{_label(seconds)}"] = {
+                    "limit": bucket.limit,
+                    "budget": int(bucket.capacity),
+                    "available": round(bucket.tokens, 1),
+                    "used_pct": round(100 * (1 - bucket.tokens / bucket.capacity), 1),
+                    "exchange_used": bucket.exchange_used
+                }
+            accounts = {}
+            for account, buckets in self.account_buckets.items():
+                accounts[account] = {}
+                for (kind, seconds), bucket in buckets.items():
+                    if kind == "ORDERS":
+                        bucket.refill(now)
+                        accounts[account][f"{kind}_{_label(seconds)}"] = {
+                            "available": round(bucket.tokens, 1),
+                            "used_pct": round(100 * (1 - bucket.tokens / bucket.capacity), 1)
+                        }
+            return {
+                "limits": limits,
+                "accounts": accounts,
+                "backoff_seconds": round(max(0.0, self.backoff_until - now), 1),
+                "orders_waiting": self._orders_waiting,
+                "granted": {PRIORITY_NAMES[p]: n for p, n in self.granted.items()},
+                "queued": {PRIORITY_NAMES[p]: n for p, n in self.queued.items()},
+                "queued_seconds": {PRIORITY_NAMES[p]: round(s, 3) for p, s in self.queued_seconds.items()},
+                "rejected": {PRIORITY_NAMES[p]: n for p, n in self.rejected.items()},
+                "throttled": self.throttled
+            }
+
+
+def _failure(exc):
+    """(status, error code) metric labels of a failed call"""
+    status = getattr(exc, "status_code", None)
+    code = getattr(exc, "code", None)
+    if status is None and code is None:
+        return "error", type(exc).__name__
+    return str(status or "error"), str(code if code is not None else type(exc).__name__)
+
+
+class GovernedClientMixin:
+    """Mixed into python-binance's Client: every fapi call goes through the governor"""
+
+    governor_account = None   # sub-account id; None = main account
+
+    def _request(self, method, uri, signed, force_params=False, **kwargs):
+        path = urlsplit(uri).path
+        if not path.startswith("/fapi/"):
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        params = kwargs.get("data") or kwargs.get("params")
+        params = params if isinstance(params, dict) else None
+        get_governor().acquire(method, path, params, account=self.governor_account)
+        start = time.perf_counter()
+        status, code = "200", None
+        try:
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        except Exception as e:
+            status, code = _failure(e)
+            raise
+        finally:
+            metrics.observe_binance(method.upper(), path, time.perf_counter() - start, status,
+                                    request_cost(method, path, params)[0], code)
+
+    def _handle_response(self, response):
+        if urlsplit(response.url or "").path.startswith("/fapi/"):
+            get_governor().record(response, self.governor_account)
+        return super()._handle_response(response)
+
+
+class AsyncGovernedClientMixin:
+    """Mixed into python-binance's AsyncClient: same metering, awaited"""
+
+    governor_account = None
+
+    async def _request(self, method, uri, signed, force_params=False, **kwargs):
+        path = urlsplit(uri).path
+        if not path.startswith("/fapi/"):
+            return await super()._request(method, uri, signed, force_params, **kwargs)
+        params = kwargs.get("data") or kwargs.get("params")
+        params = params if isinstance(params, dict) else None
+        await get_governor().acquire_async(method, path, params, account=self.governor_account)
+        start = time.perf_counter()
+        status, code = "200", None
+        try:
+            return await super()._request(method, uri, signed, force_params, **kwargs)
+        except Exception as e:
+            status, code = _failure(e)
+            raise
+        finally:
+            metrics.observe_binance(method.upper(), path, time.perf_counter() - start, status,
+                                    request_cost(method, path, params)[0], code)
+
+    async def _handle_response(self, response):
+        if response.url.path.startswith("/fapi/"):
+            get_governor().record_headers(response.status, response.headers, self.governor_account)
+        return await super()._handle_response(response)
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor():
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                _governor = Governor()
+    return _governor
+
+
+def snapshot():
+    return get_governor().snapshot()
+
+
+def _collect():
+    """/metrics families from snapshot(): budget per limit and queueing counters"""
+    snap = snapshot()
+
+    def by_priority(key):
+        return [({"priority": p}, n) for p, n in snap[key].items()]
+
+    families = [
+        ("governor_budget_available", "gauge", "Tokens left in each client-side budget",
+         [({"limit": name}, lim["available"]) for name, lim in snap["limits"].items()]),
+        ("governor_budget_used_ratio", "gauge", "Share of each client-side budget in use",
+         [({"limit": name}, lim["used_pct"] / 100) for name, lim in snap["limits"].items()]),
+        ("governor_exchange_used", "gauge", "Usage last reported by the X-MBX-* headers",
+         [({"limit": name}, lim["exchange_used"]) for name, lim in snap["limits"].items()]),
+        ("governor_granted_total", "counter", "Calls let through", by_priority("granted")),
+        ("governor_queued_total", "counter", "Calls that had to wait for budget", by_priority("queued")),
+        ("governor_queued_seconds_total", "counter", "Time spent waiting for budget", by_priority("queued_seconds")),
+        ("governor_rejected_total", "counter", "Calls refused (RateLimitExceeded)", by_priority("rejected")),
+        ("governor_throttled_total", "counter", "429/418 responses", [({}, snap["throttled"])]),
+        ("governor_backoff_seconds", "gauge", "Remaining exchange-imposed backoff", [({}, snap["backoff_seconds"])]),
+        ("governor_orders_waiting", "gauge", "Order calls queued right now", [({}, snap["orders_waiting"])]),
+    ]
+    account_orders = [({"account": account, "limit": name}, lim["available"])
+                      for account, limits in snap["accounts"].items() for name, lim in limits.items()]
+    if account_orders:
+        families.append(("governor_account_orders_available", "gauge",
+                         "Order-count tokens left per sub-account", account_orders))
+    return families
+
+
+metrics.REGISTRY.add_collector(_collect)
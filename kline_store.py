@@ -0,0 +1,426 @@
+# kline_store.py
+# Local candle store. Closed klines of every USDT symbol are kept per
+# (interval, symbol) as append-only column files (open_time, open, high,
+# low, close, volume) under KLINE_DIR; a restart costs no download and
+# readers load only the rows they need (the ATR window). A
+# background thread tops each series up from its last candle at a paced
+# request weight; the ATR of every symbol is then recomputed in one NumPy
+# pass per interval, and a stop suggestion is a table lookup with no REST
+# call.
+
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import clock
+import config
+import logs
+import metrics
+from governor import request_cost
+from transport import get_transport
+
+INTERVAL_MS = {
+    "1m": 60000, "3m": 180000, "5m": 300000, "15m": 900000, "30m": 1800000,
+    "1h": 3600000, "2h": 7200000, "4h": 14400000, "6h": 21600000, "8h": 28800000,
+    "12h": 43200000, "1d": 86400000, "3d": 259200000, "1w": 604800000,
+}
+
+# (column, index in a kline row, dtype); open_time is written last, so a row
+# only exists once its open_time is on disk
+COLUMNS = (
+    ("open", 1, np.float64),
+    ("high", 2, np.float64),
+    ("low", 3, np.float64),
+    ("close", 4, np.float64),
+    ("volume", 5, np.float64),
+    ("open_time", 0, np.int64),
+)
+DTYPES = {name: np.dtype(dtype) for name, _, dtype in COLUMNS}
+PAGE_LIMIT = 1000            # max klines per call (weight 5)
+ATR_WINDOW_PERIODS = 10      # bars per ATR period kept in the smoothing window
+REBUILD_EVERY = 5            # seconds between ATR table rebuilds during a long round
+
+
+class Series:
+    """
+    One (symbol, interval) as column files; appended by the sync thread
+    only. No file stays open between calls: reads open, read and close
+    the columns they need, so thousands of series cost no descriptors.
+    """
+
+    def __init__(self, root, symbol, interval):
+        self.symbol = symbol
+        self.interval = interval
+        self.path = os.path.join(root, interval, symbol)
+        self.rows = 0
+        self._last_open_time = None
+        self._repair()
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _repair(self):
+        sizes = [os.path.getsize(self._file(name)) // DTYPES[name].itemsize
+                 if os.path.exists(self._file(name)) else 0 for name, _, _ in COLUMNS]
+        rows = min(sizes)
+        for (name, _, _), size in zip(COLUMNS, sizes):
+            if size > rows:   # torn append: the row never got its open_time
+                os.truncate(self._file(name), rows * DTYPES[name].itemsize)
+        self.rows = rows
+        self._last_open_time = int(self._read("open_time", rows - 1, 1)[0]) if rows else None
+
+    def _read(self, name, start, count):
+        dtype = DTYPES[name]
+        with open(self._file(name), "rb") as f:
+            return np.fromfile(f, dtype=dtype, count=count, offset=start * dtype.itemsize)
+
+    def __len__(self):
+        return self.rows
+
+    def first_open_time(self):
+        return int(self._read("open_time", 0, 1)[0]) if self.rows else None
+
+    def last_open_time(self):
+        return self._last_open_time
+
+    def append(self, klines):
+        """Append kline rows ([open_time, "open", "high", ...], oldest first)"""
+        if not klines:
+            return
+        data = np.array([k[:6] for k in klines], dtype=np.float64)
+        os.makedirs(self.path, exist_ok=True)
+        for name, index, dtype in COLUMNS:
+            with open(self._file(name), "ab") as f:
+                f.write(data[:, index].astype(dtype).tobytes())
+        self.rows += len(data)
+        self._last_open_time = int(data[-1, 0])
+
+    def tail(self, n, names=None):
+        """The last n rows of each column (all columns by default), read into memory"""
+        rows = self.rows
+        n = min(n, rows)
+        return {name: self._read(name, rows - n, n) if n else np.empty(0, dtype=DTYPES[name])
+                for name in (names or DTYPES)}
+
+    def read(self, names=None):
+        """
+        Whole columns as read-only np.memmap (empty arrays for an empty
+        series); each map holds a descriptor until the caller drops it
+        """
+        rows = self.rows
+        return {name: np.memmap(self._file(name), dtype=DTYPES[name], mode="r", shape=(rows,))
+                if rows else np.empty(0, dtype=DTYPES[name]) for name in (names or DTYPES)}
+
+
+def atr(high, low, close, period):
+    """
+    ATR of each row of 2-D (symbols × bars, oldest first, NaN-padded on the
+    left) arrays: Wilder smoothing (alpha = 1/period) evaluated as one
+    weighted sum of the true ranges in the window. NaN with fewer than
+    period true ranges.
+    """
+    prev_close = close[:, :-1]
+    high, low = high[:, 1:], low[:, 1:]
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    valid = ~np.isnan(true_range)
+    alpha = 1.0 / period
+    weights = alpha * (1 - alpha) ** np.arange(true_range.shape[1])[::-1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        value = np.where(valid, true_range, 0.0) @ weights / (valid @ weights)
+    return np.where(valid.sum(axis=1) >= period, value, np.nan)
+
+
+class KlineStore:
+    def __init__(self, root=None, intervals=None, history=None, weight_per_min=None):
+        self.root = root or config.KLINE_DIR
+        self.intervals = list(intervals or config.KLINE_INTERVALS)
+        self.history = history or config.KLINE_HISTORY
+        self.weight_per_min = weight_per_min or config.KLINE_SYNC_WEIGHT_PER_MIN
+        self.series = {}       # (symbol, interval) -> Series
+        self.tables = {}       # interval -> {"index": {symbol: row}, "atr", "close", "time"}
+        self.rounds = 0
+        self.synced_at = 0.0
+        self._wanted = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._symbols = None
+
+    def get_series(self, symbol, interval):
+        key = (symbol, interval)
+        series = self.series.get(key)
+        if series is None:
+            with self._lock:
+                series = self.series.get(key)
+                if series is None:
+                    series = self.series[key] = Series(self.root, symbol, interval)
+        return series
+
+    def load(self):
+        """Map every series already on disk and build the ATR tables from them"""
+        for interval in self.intervals:
+            folder = os.path.join(self.root, interval)
+            if os.path.isdir(folder):
+                for symbol in sorted(os.listdir(folder)):
+                    self.get_series(symbol, interval)
+            self.rebuild(interval)
+
+    # ── download ─────────────────────────────────────────────────
+    def _pace(self, params):
+        """Keep the sync under weight_per_min, whatever the governor would allow"""
+        self._stop.wait(request_cost('GET', '/fapi/v1/klines', params)[0] * 60 / self.weight_per_min)
+
+    def sync_series(self, symbol, interval, since_ms=None):
+        """
+        Download the closed candles after the series' last one (a new series
+        starts at since_ms, default `history` candles back); returns the
+        number of rows added
+        """
+        series = self.get_series(symbol, interval)
+        step = INTERVAL_MS[interval]
+        now = clock.timestamp_ms()
+        last = series.last_open_time()
+        if last is not None:
+            start = last + step
+        else:
+            start = since_ms if since_ms is not None else now - (self.history + 1) * step
+        added = 0
+        while start + step <= now and not self._stop.is_set():
+            missing = (now - start) // step + 1   # weight grows with limit: ask for what is missing
+            params = {"symbol": symbol, "interval": interval, "startTime": start,
+                      "limit": int(min(missing, PAGE_LIMIT))}
+            response = get_transport().request('GET', '/fapi/v1/klines', params)
+            response.raise_for_status()
+            page = response.json()
+            rows = [k for k in page if k[6] < now]   # the last candle may still be open
+            series.append(rows)
+            added += len(rows)
+            self._pace(params)
+            if len(page) < params["limit"] or not rows:
+                break
+            start = rows[-1][0] + step
+        if added:
+            metrics.KLINE_ROWS.inc(added, interval=interval)
+        return added
+
+    def _due(self, series, now):
+        """True once a candle after the last stored one has closed"""
+        last = series.last_open_time()
+        return last is None or last + 2 * INTERVAL_MS[series.interval] <= now
+
+    def _sync_symbol(self, symbol, now, updated):
+        for interval in self.intervals:
+            series = self.get_series(symbol, interval)
+            if not self._due(series, now):
+                continue
+            try:
+                if self.sync_series(symbol, interval):
+                    updated.add(interval)
+            except Exception as e:
+                metrics.KLINE_SYNC_ERRORS.inc(interval=interval)
+                logs.warning("kline_sync_failed", symbol=symbol, interval=interval, error=str(e))
+
+    def _serve_wanted(self):
+        """Symbols a suggestion was asked for jump the queue"""
+        updated = set()
+        while self._wanted:
+            self._sync_symbol(self._wanted.popleft(), clock.timestamp_ms(), updated)
+        for interval in updated:
+            self.rebuild(interval)
+
+    def sync(self, symbols):
+        """One round over every symbol and interval; the ATR tables are rebuilt as it goes"""
+        updated, rebuilt_at = set(), time.time()
+        for symbol in symbols:
+            if self._stop.is_set():
+                break
+            self._serve_wanted()
+            self._sync_symbol(symbol, clock.timestamp_ms(), updated)
+            if updated and time.time() - rebuilt_at > REBUILD_EVERY:
+                for interval in updated:
+                    self.rebuild(interval)
+                updated, rebuilt_at = set(), time.time()
+        for interval in updated:
+            self.rebuild(interval)
+        self.rounds += 1
+        self.synced_at = time.time()
+
+    def want(self, symbol):
+        if symbol not in self._wanted:
+            self._wanted.append(symbol)
+            self._wake.set()
+
+    # ── indicators ───────────────────────────────────────────────
+    def rebuild(self, interval):
+        """ATR of every stored symbol on this interval, in one vectorized pass"""
+        period = config.ATR_PERIOD
+        window = period * ATR_WINDOW_PERIODS + 1
+        rows = [(symbol, series) for (symbol, iv), series in list(self.series.items())
+                if iv == interval and len(series) > period]
+        high = np.full((len(rows), window), np.nan)
+        low = np.full_like(high, np.nan)
+        close = np.full_like(high, np.nan)
+        times = np.zeros(len(rows), dtype=np.int64)
+        for i, (_, series) in enumerate(rows):
+            tail = series.tail(window, ("open_time", "high", "low", "close"))
+            n = len(tail["open_time"])
+            high[i, -n:], low[i, -n:], close[i, -n:] = tail["high"], tail["low"], tail["close"]
+            times[i] = tail["open_time"][-1]
+        self.tables[interval] = {
+            "index": {symbol: i for i, (symbol, _) in enumerate(rows)},
+            "atr": atr(high, low, close, period) if rows else np.empty(0),
+            "close": close[:, -1],
+            "time": times
+        }
+
+    def suggest_stops(self, symbol, side="LONG", entry=None):
+        """
+        Stop-loss suggestions at ATR_MULTIPLIERS × the ATR of each interval:
+        [{"interval", "multiplier", "atr", "sl_percent", "sl_price", "as_of"}].
+        Empty while the symbol has no candles; it is then synced first.
+        """
+        found = []
+        for interval in self.intervals:
+            table = self.tables.get(interval)
+            row = table["index"].get(symbol) if table else None
+            if row is not None and not np.isnan(table["atr"][row]):
+                found.append((interval, table["atr"][row], table["close"][row], table["time"][row]))
+        if not found:
+            self.want(symbol)
+            return []
+
+        multipliers = np.asarray(config.ATR_MULTIPLIERS, dtype=float)
+        atrs = np.array([f[1] for f in found])
+        reference = np.array([entry if entry and entry > 0 else f[2] for f in found])
+        distance = np.outer(atrs, multipliers)
+        direction = -1.0 if side == "LONG" else 1.0
+        sl_percent = distance / reference[:, None] * 100
+        sl_price = reference[:, None] + direction * distance
+        return [
+            {
+                "interval": interval,
+                "multiplier": float(multiplier),
+                "atr": float(atrs[i]),
+                "sl_percent": round(float(sl_percent[i, j]), 3),
+                "sl_price": float(sl_price[i, j]),
+                "as_of": int(as_of)
+            }
+            for i, (interval, _, _, as_of) in enumerate(found)
+            for j, multiplier in enumerate(multipliers)
+        ]
+
+    # ── lifecycle ────────────────────────────────────────────────
+    def start(self, symbols):
+        """Sync in the background; symbols() returns the symbols to keep (USDT pairs are used)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._symbols = symbols
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kline-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        self.load()
+        while not self._stop.is_set():
+            try:
+                self.sync([s for s in self._symbols() if s.endswith("USDT")])
+                logs.info("kline_sync_round", round=self.rounds,
+                          series=sum(1 for s in list(self.series.values()) if len(s)))
+            except Exception as e:
+                logs.warning("kline_sync_round_failed", error=str(e))
+            self._wake.wait(config.KLINE_SYNC_INTERVAL)
+            self._wake.clear()
+            self._serve_wanted()
+
+    def snapshot(self):
+        return {
+            "rounds": self.rounds,
+            "age_seconds": round(time.time() - self.synced_at, 1) if self.synced_at else None,
+            "series": {interval: len(table["index"]) for interval, table in self.tables.items()},
+            "queued": list(self._wanted)
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = KlineStore()
+    return _store
+
+
+def start(symbols):
+    """Start the process-wide background sync once; returns immediately"""
+    get_store().start(symbols)
+
+
+def suggest_stops(symbol, side="LONG", entry=None):
+    return get_store().suggest_stops(symbol.upper(), side, entry)
+
+
+def get_series(symbol, interval):
+    return get_store().get_series(symbol.upper(), interval)
+
+
+def snapshot():
+    return get_store().snapshot() if _store is not None else None
+
+
+def _collect():
+    if _store is None:
+        return []
+    return [("kline_series", "gauge", "Symbols with enough candles for an ATR, per interval",
+             [({"interval": interval}, len(table["index"])) for interval, table in list(_store.tables.items())])]
+
+
+metrics.REGISTRY.add_collector(_collect)
+
+
+# ────────────────────────────────────────────────────────────────
+#      Micro-benchmark: python kline_store.py [symbols]
+# ────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = np.random.default_rng(7)
+    store = KlineStore(root=tempfile.mkdtemp(), intervals=["15m", "1h", "4h"], history=500)
+    t0 = time.perf_counter()
+    for k in range(n):
+        for interval in store.intervals:
+            step = INTERVAL_MS[interval]
+            close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, 500)))
+            spread = close * rng.uniform(0.001, 0.01, 500)
+            store.get_series(f"S{k}USDT", interval).append(
+                [[i * step, c, c + s, c - s, c, 1.0] for i, (c, s) in enumerate(zip(close, spread))])
+    write_s = time.perf_counter() - t0
+
+    fresh = KlineStore(root=store.root, intervals=store.intervals)
+    t0 = time.perf_counter()
+    fresh.load()
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    rounds = 20000
+    t0 = time.perf_counter()
+    for i in range(rounds):
+        suggestions = fresh.suggest_stops(f"S{i % n}USDT", "LONG", 100.0)
+    suggest_us = (time.perf_counter() - t0) / rounds * 1e6
+
+    print(suggestions[0])
+    print(f"{n} symbols × {len(store.intervals)} intervals × 500 candles written in {write_s:.1f} s")
+    print(f"  load + ATR tables  {load_ms:8.1f} ms (start-up; per interval after each sync round)")
+    print(f"  suggest_stops      {suggest_us:8.1f} µs ({len(suggestions)} suggestions)")
@@ -0,0 +1,165 @@
+# live_feed.py
+# One shared server-side snapshot of positions, fills and prices, fanned
+# out to every connected dashboard as Server-Sent Events diffs. Binance
+# load depends on this loop only, not on how many tabs are open.
+
+import asyncio
+import json
+import queue
+import threading
+import time
+
+import logic
+import logs
+
+POSITION_INTERVAL = 1.0   # seconds between position snapshots
+PRICE_INTERVAL = 0.5      # seconds between price checks
+TRADES_INTERVAL = 5.0     # seconds between trade history checks
+TRADES_KEPT = 50          # rows shown by the dashboard
+QUEUE_SIZE = 200
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class LoopQueue:
+    """Subscriber queue for an asyncio consumer, filled from the feed thread"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put_nowait(self, item):
+        if self.queue.qsize() >= QUEUE_SIZE:
+            raise queue.Full
+        self.loop.call_soon_threadsafe(self._put, item)
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+def _position_key(pos):
+    return {k: v for k, v in pos.items() if k != 'timestamp'}
+
+
+class LiveFeed:
+    def __init__(self):
+        self.subscribers = {}   # queue -> watched symbol
+        self.positions = {}     # symbol -> position dict
+        self.trades = []        # newest first
+        self.prices = {}        # symbol -> price
+        self._seen_trade_ids = set()   # ids in the last polled window only
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    # ── subscribers ──────────────────────────────────────────────
+    def subscribe(self, symbol, loop=None):
+        """queue.Queue for a thread, LoopQueue when an event loop is given"""
+        q = queue.Queue(maxsize=QUEUE_SIZE) if loop is None else LoopQueue(loop)
+        with self._lock:
+            q.put_nowait(("positions", {"changed": list(self.positions.values()), "removed": [], "reset": True}))
+            q.put_nowait(("trades", {"new": self.trades, "reset": True}))
+            if symbol in self.prices:
+                q.put_nowait(("price", {"symbol": symbol, "price": self.prices[symbol]}))
+            self.subscribers[q] = symbol
+        self._ensure_running()
+        self._wake.set()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self.subscribers.pop(q, None)
+
+    def is_subscribed(self, q):
+        return q in self.subscribers
+
+    def _publish(self, event, data, symbol=None):
+        with self._lock:
+            for q, watched in list(self.subscribers.items()):
+                if symbol is not None and watched != symbol:
+                    continue
+                try:
+                    q.put_nowait((event, data))
+                except queue.Full:
+                    # Slow client: drop it; EventSource reconnects and gets a fresh snapshot
+                    self.subscribers.pop(q, None)
+
+    # ── polling loop ─────────────────────────────────────────────
+    def _ensure_running(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+                self._thread.start()
+
+    def _poll_positions(self):
+        current = {p['symbol']: p for p in logic.get_open_positions()}
+        changed = [p for s, p in current.items()
+                   if s not in self.positions or _position_key(self.positions[s]) != _position_key(p)]
+        removed = [s for s in self.positions if s not in current]
+        self.positions = current
+        if changed or removed:
+            self._publish("positions", {"changed": changed, "removed": removed})
+
+    def _poll_prices(self):
+        with self._lock:   # /stream threads subscribe and leave concurrently
+            symbols = set(self.subscribers.values())
+        for symbol in symbols:
+            price = logic.get_live_price(symbol)
+            if price and price != self.prices.get(symbol):
+                self.prices[symbol] = price
+                self._publish("price", {"symbol": symbol, "price": price}, symbol=symbol)
+
+    def _poll_trades(self):
+        rows = logic.get_trade_history(limit=TRADES_KEPT)
+        new = [t for t in rows if (t['symbol'], t['id']) not in self._seen_trade_ids]
+        if not new:
+            return
+        # Only the newest TRADES_KEPT rows are polled, so an id that has left
+        # the window can never come back as new: keep just the window
+        self._seen_trade_ids = {(t['symbol'], t['id']) for t in rows}
+        self.trades = rows[:TRADES_KEPT]
+        self._publish("trades", {"new": new[:TRADES_KEPT]})
+
+    def _run(self):
+        last_positions = last_trades = 0
+        while True:
+            if not self.subscribers:
+                self._wake.clear()
+                if not self.subscribers:
+                    self._wake.wait()
+                last_positions = last_trades = 0
+            now = time.time()
+            try:
+                self._poll_prices()
+                if now - last_positions >= POSITION_INTERVAL:
+                    self._poll_positions()
+                    last_positions = now
+                if now - last_trades >= TRADES_INTERVAL:
+                    self._poll_trades()
+                    last_trades = now
+            except Exception as e:
+                logs.warning("live_feed_error", error=str(e))
+            time.sleep(PRICE_INTERVAL)
+
+
+_feed = LiveFeed()
+
+
+def subscribe(symbol, loop=None):
+    return _feed.subscribe(symbol, loop)
+
+
+def unsubscribe(q):
+    _feed.unsubscribe(q)
+
+
+def is_subscribed(q):
+    return _feed.is_subscribed(q)
@@ -2,24 +2,61 @@ from flask import session
 from datetime import datetime, date
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
+from requests.exceptions import ReadTimeout, ConnectionError
+import clock
 import config
+import logs
+import metrics
 import math
-import traceback
+import numpy as np
+import threading
 import time
-import hmac
-import hashlib
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from transport import get_transport
+from governor import GovernedClientMixin, get_governor, order_priority, submit_in_context
+import market_data
+import order_book
+import kline_store
+import account_state
+import trade_store
+import trade_limits
+from cache import TTLCache
+import accounts
+import risk
+import sizing
 
 _client = None
-_symbol_cache = None
-_symbol_cache_time = 0
-_price_cache = {}
-_price_cache_time = {}
-CACHE_DURATION = 5  # Cache duration in seconds
+_client_lock = threading.Lock()
+_background_connect = threading.Event()   # set while warmup.py owns the first connect
+
+# Shared caches (thread-safe, single-flight on misses)
+_price_cache = TTLCache("price", ttl=config.PRICE_CACHE_DURATION, maxsize=1000)
+# exchangeInfo: served stale while one background reload runs, so rounding
+# never waits on the network after the first load
+_exchange_cache = TTLCache("exchange_info", ttl=config.SYMBOL_CACHE_DURATION, maxsize=1, stale_ttl=7 * 86400)
 
 # ────────────────────────────────────────────────────────────────
 #      NEW - Proper Algo Order placement (fixes -4120 error)
 # ────────────────────────────────────────────────────────────────
+def _algo_order_params(symbol, side, order_type, stopPrice, quantity, closePosition,
+                       reduceOnly, workingType, priceProtect):
+    params = {
+        'symbol': symbol,
+        'side': side,
+        'type': order_type,
+        'stopPrice': f"{float(stopPrice):.8f}",
+        'workingType': workingType,
+        'priceProtect': "TRUE" if priceProtect else "FALSE",
+        'reduceOnly': "TRUE" if reduceOnly else "FALSE"
+    }
+
+    if closePosition:
+        params['closePosition'] = 'true'
+    elif quantity is not None and float(quantity) > 0:
+        params['quantity'] = f"{float(quantity):.6f}"
+    return params
+
+
 def place_algo_order(
     symbol,
     side,
@@ -29,157 +66,246 @@ def place_algo_order(
     closePosition=False,
     reduceOnly=True,
     workingType="MARK_PRICE",
-    priceProtect=True
+    priceProtect=True,
+    transport=None
 ):
     try:
-        client = get_client()
-        if client is None:
-            return {"success": False, "error": "Client not connected"}
-
-        api_key    = client.API_KEY
-        api_secret = client.API_SECRET
-
-        if not api_key or not api_secret:
-            return {"success": False, "error": "API key or secret not set in Client"}
-
-        timestamp = int(time.time() * 1000)
-
-        params = {
-            'symbol': symbol,
-            'side': side,
-            'type': order_type,
-            'stopPrice': f"{float(stopPrice):.8f}",
-            'workingType': workingType,
-            'priceProtect': "TRUE" if priceProtect else "FALSE",
-            'reduceOnly': "TRUE" if reduceOnly else "FALSE",
-            'timestamp': timestamp,
-            'recvWindow': 10000
-        }
-
-        if closePosition:
-            params['closePosition'] = 'true'
-        elif quantity is not None and float(quantity) > 0:
-            params['quantity'] = f"{float(quantity):.6f}"
-
-        query_string = '&'.join([f"{k}={v}" for k, v in sorted(params.items())])
-        signature = hmac.new(
-            api_secret.encode('utf-8'),
-            query_string.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        if transport is None:
+            if get_client() is None:
+                return {"success": False, "error": "Client not connected"}
+            transport = get_transport()
 
-        params['signature'] = signature
+        params = _algo_order_params(symbol, side, order_type, stopPrice, quantity, closePosition,
+                                    reduceOnly, workingType, priceProtect)
 
-        url = "https://fapi.binance.com/fapi/v1/algoOrder"
-        headers = {'X-MBX-APIKEY': api_key}
+        logs.info("algo_order_sent", sample=True, **params)
 
-        print("→ Sending algo order:", params)
-
-        response = requests.post(url, headers=headers, params=params)
+        response = transport.signed_request('POST', '/fapi/v1/algoOrder', params)
         data = response.json()
 
         if response.status_code == 200 and 'algoId' in data:
-            print("→ SUCCESS:", data)
+            logs.info("algo_order_placed", sample=True, symbol=symbol, type=order_type, algo_id=data['algoId'])
             return {"success": True, "algoId": data['algoId'], "status": data.get('status', 'NEW')}
         else:
             error_msg = data.get('msg', response.text)
-            print("→ FAILED:", error_msg)
+            logs.warning("algo_order_rejected", symbol=symbol, type=order_type, code=data.get('code'), error=error_msg)
             return {"success": False, "error": error_msg}
 
     except Exception as e:
-        print("Algo order error:", str(e))
+        logs.error("algo_order_error", symbol=symbol, type=order_type, error=str(e))
         return {"success": False, "error": str(e)}
 
 
 def sync_time_with_binance():
-    """Sync local time with Binance server time"""
-    try:
-        response = requests.get('https://fapi.binance.com/fapi/v1/time')
-        server_time = response.json()['serverTime']
-        local_time = int(time.time() * 1000)
-        time_offset = server_time - local_time
-        return time_offset
-    except Exception as e:
-        print(f"⚠️ Could not sync time: {e}")
-        return 0
+    """
+    Server-clock offset (ms). The drift tracker (clock.py) is started on
+    first use and keeps re-sampling in the background; every client and
+    transport reads its estimate when signing.
+    """
+    return clock.start(get_transport()).offset_ms()
 
-_balance_cache = {"data": (None, None), "time": 0}
 BALANCE_CACHE_DURATION = 3  # Keep balance cached for 3 seconds
+_balance_cache = TTLCache("balance", ttl=BALANCE_CACHE_DURATION, maxsize=1)
+
+def _client_class(account=None):
+    """
+    python-binance Client metered by the rate-limit governor (order counts
+    charged to `account`), re-pointed when FAPI_BASE_URL is a local
+    simulator/stub
+    """
+    base = config.FAPI_BASE_URL.rstrip('/')
+    attrs = {"governor_account": account}
+    if base != "https://fapi.binance.com":
+        attrs.update({"API_URL": f"{base}/api", "FUTURES_URL": f"{base}/fapi"})
+    return type("GovernedClient", (clock.ClockedClientMixin, GovernedClientMixin, Client), attrs)
+
 
 def get_client(force_refresh=False):
-    """Get Binance client with auto-refresh capability"""
-    global _client
-    
-    # If we need to force a new connection (e.g. after a timeout)
-    if force_refresh:
-        _client = None
+    """
+    Get Binance client with auto-refresh capability. Never waits on a
+    connect already in progress (start-up warm-up or another request):
+    returns None at once so the caller serves cached/degraded data.
+    """
+    if _client is not None and not force_refresh:
+        return _client
+    if config.CREDENTIALS_ERROR or _background_connect.is_set() or _client_lock.locked():
+        return None
+    return connect_client(force_refresh)
 
-    if _client is None:
-        try:
-            # 1. Sync time first (Crucial for recvWindow errors)
-            time_offset = sync_time_with_binance()
-            
-            _client = Client(
-                config.BINANCE_KEY, 
-                config.BINANCE_SECRET,
-                {'timeout': 20}
-            )
-            
-            # 2. Apply offset manually if needed
-            if abs(time_offset) > 0:
-                _client.timestamp_offset = time_offset
-                
-            # 3. Test connection
-            _client.futures_account(recvWindow=60000)
-            print("✅ Binance Client Connected Successfully")
-            
-        except Exception as e:
-            print(f"❌ Error initializing Binance client: {e}")
+
+def connect_client(force_refresh=False):
+    """Connect now (blocking); used directly by the warm-up thread"""
+    global _client
+    with _client_lock:
+        # If we need to force a new connection (e.g. after a timeout)
+        if force_refresh:
             _client = None
-            
+        if _client is None:
+            _client = _connect_client()
     return _client
 
+
+def defer_connect(deferred=True):
+    """While deferred, get_client() leaves the first connect to the warm-up thread"""
+    if deferred:
+        _background_connect.set()
+    else:
+        _background_connect.clear()
+
+
+def _connect_client():
+    try:
+        # 1. Clock tracker first (crucial for recvWindow errors)
+        sync_time_with_binance()
+
+        client = _client_class()(
+            config.BINANCE_KEY,
+            config.BINANCE_SECRET,
+            {'timeout': 20}
+        )
+
+        # 2. Test connection
+        client.futures_account()
+        logs.info("client_connected", account=accounts.MAIN_ACCOUNT)
+        return client
+
+    except Exception as e:
+        logs.error("client_init_failed", account=accounts.MAIN_ACCOUNT, error=str(e))
+        return None
+
+def get_account_client(account_id, force_refresh=False):
+    """
+    Client for a registered sub-account: its own HTTP pool, stamped from
+    the shared clock tracker. MAIN_ACCOUNT maps to get_client().
+    """
+    if account_id == accounts.MAIN_ACCOUNT:
+        return get_client(force_refresh)
+
+    account = accounts.get(account_id)
+    if account is None:
+        return None
+
+    with account.lock:
+        if force_refresh:
+            account.client = None
+
+        if account.client is None:
+            try:
+                sync_time_with_binance()
+                client = _client_class(account_id)(account.api_key, account.api_secret, {'timeout': 20})
+                client.futures_account()
+                account.client = client
+                logs.info("client_connected", account=account_id)
+            except Exception as e:
+                logs.error("client_init_failed", account=account_id, error=str(e))
+                account.client = None
+
+        return account.client
+
+
+def _account_transport(account_id):
+    if account_id == accounts.MAIN_ACCOUNT:
+        return get_transport()
+    return accounts.get(account_id).transport
+
+
 def initialize_session():
     if "trades" not in session:
         session["trades"] = []
-    if "stats" not in session:
-        session["stats"] = {}
+    # Daily counters moved to the trade-limit ledger; drop the old cookie copy
+    session.pop("stats", None)
     session.modified = True
 
 
 def get_all_exchange_symbols():
-    global _symbol_cache, _symbol_cache_time
-    
-    current_time = time.time()
-    if _symbol_cache and (current_time - _symbol_cache_time) < 3600:
-        return _symbol_cache
-    
     try:
-        client = get_client()
-        if client is None: 
-            return ["BTCUSDT", "ETHUSDT"]
-        info = client.futures_exchange_info()
-        symbols = sorted([s["symbol"] for s in info["symbols"] if s["status"] == "TRADING" and s["quoteAsset"] == "USDT"])
-        _symbol_cache = symbols
-        _symbol_cache_time = current_time
-        return symbols
+        symbols = _exchange_info()["symbols"]
+        return symbols if symbols else ["BTCUSDT", "ETHUSDT"]
     except Exception as e:
-        print(f"Error getting symbols: {e}")
-        return _symbol_cache if _symbol_cache else ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT"]
+        logs.warning("exchange_info_failed", error=str(e))
+        cached = _exchange_cache.peek("info")
+        return cached["symbols"] if cached else ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT"]
 
 
-def get_live_balance():
-    """
-    Robust balance fetcher with Retries + Caching + Error Handling
-    """
-    global _balance_cache, _client
-    
-    # 1. Return Cache if valid (Prevents API spamming)
-    if time.time() - _balance_cache["time"] < BALANCE_CACHE_DURATION:
-        if _balance_cache["data"][0] is not None:
-            return _balance_cache["data"]
+# ────────────────────────────────────────────────────────────────
+#      Symbol filter index (built from the same exchangeInfo
+#      payload as the symbol list, read in O(1) by round_*)
+# ────────────────────────────────────────────────────────────────
+def _step_precision(step):
+    if step <= 0 or step >= 1:
+        return 0
+    return abs(int(round(-math.log10(step))))
+
+
+def _floor_to(value, step, precision):
+    """Floor to a whole number of steps; 0.023 / 0.001 is 22.999999999999996 in floats"""
+    return round(math.floor(value / step + sizing.STEP_EPSILON) * step, precision)
+
+
+def _build_filter_index(info):
+    """Index exchangeInfo filters by symbol: step, tick, min notional, precisions"""
+    index = {}
+    for s in info["symbols"]:
+        step, tick, min_notional = 0.001, None, 0.0   # no PRICE_FILTER: prices round to 2 decimals
+        for f in s["filters"]:
+            if f["filterType"] == "LOT_SIZE":
+                step = float(f["stepSize"])
+            elif f["filterType"] == "PRICE_FILTER":
+                tick = float(f["tickSize"])
+            elif f["filterType"] == "MIN_NOTIONAL":
+                min_notional = float(f.get("notional", f.get("minNotional", 0)))
+        index[s["symbol"]] = {
+            "step": step,
+            "tick": tick,
+            "min_notional": min_notional,
+            "qty_precision": _step_precision(step),
+            "price_precision": _step_precision(tick) if tick is not None else 2,
+            "base_asset": s.get("baseAsset") or risk.base_asset(s["symbol"]),
+            "filters": s["filters"]
+        }
+    return index
+
+
+def _load_exchange_info():
+    """Download exchangeInfo once and build both the symbol list and the filter index"""
+    client = get_client()
+    if client is None:
+        raise Exception("Binance client not connected")
+
+    return _index_exchange_info(client.futures_exchange_info())
+
+
+def _index_exchange_info(info):
+    """Symbol list + filter index from one exchangeInfo payload; adopts its rate limits"""
+    get_governor().configure(info.get("rateLimits", []))
+    return {
+        "symbols": sorted([s["symbol"] for s in info["symbols"] if s["status"] == "TRADING" and s["quoteAsset"] == "USDT"]),
+        "index": _build_filter_index(info)
+    }
 
-    # 2. Retry Loop (Handles network hiccups)
+
+def _exchange_info():
+    return _exchange_cache.get_or_load("info", _load_exchange_info)
+
+
+def _filter_index():
+    """{symbol: filters}, loading exchangeInfo only on first use"""
+    try:
+        return _exchange_info()["index"]
+    except Exception as e:
+        logs.warning("exchange_info_failed", error=str(e))
+        cached = _exchange_cache.peek("info")
+        return cached["index"] if cached else {}
+
+
+def get_symbol_info(symbol):
+    """Return the indexed filters for a symbol, loading exchangeInfo only on first use"""
+    return _filter_index().get(symbol)
+
+
+def _fetch_balance():
+    """futures_account with retries; raises if every attempt fails"""
+    # Retry Loop (Handles network hiccups)
     max_retries = 3
     for attempt in range(max_retries):
         try:
@@ -191,111 +317,165 @@ def get_live_balance():
                 if client is None:
                     break
 
-            # 3. The API Call
-            # Increased recvWindow to 60000 (60s) to allow for higher latency
-            acc = client.futures_account(recvWindow=60000)
+            # The API Call (recvWindow = config.RECV_WINDOW, clock from clock.py)
+            acc = client.futures_account()
             
-            bal = float(acc["totalWalletBalance"])
-            margin = float(acc["totalInitialMargin"])
-            
-            # 4. Success? Update Cache
-            _balance_cache["data"] = (bal, margin)
-            _balance_cache["time"] = time.time()
-            return bal, margin
+            return float(acc["totalWalletBalance"]), float(acc["totalInitialMargin"])
 
         except BinanceAPIException as e:
-            print(f"⚠️ Binance API Error (Attempt {attempt+1}/{max_retries}): {e}")
+            logs.warning("balance_retry", attempt=attempt + 1, max_retries=max_retries, code=e.code, error=e.message)
+            metrics.BINANCE_RETRIES.inc(endpoint="/fapi/v2/account", reason=str(e.code))
             
             # Error -1021 is "Timestamp for this request is outside of the recvWindow"
             # If this happens, we MUST re-sync time
-            if e.code == -1021:
-                print("⏳ Timestamp out of sync. Re-syncing...")
-                sync_time_with_binance()
-                # Force client refresh next loop
-                _client = None 
+            if e.code == clock.TIMESTAMP_ERROR:
+                clock.resync()
             
             time.sleep(0.5) # Wait slightly before retry
 
         except (ReadTimeout, ConnectionError) as e:
-            print(f"⚠️ Network Error (Attempt {attempt+1}/{max_retries}): {e}")
+            logs.warning("balance_retry", attempt=attempt + 1, max_retries=max_retries, error=str(e))
+            metrics.BINANCE_RETRIES.inc(endpoint="/fapi/v2/account", reason=type(e).__name__)
             time.sleep(0.5)
             
         except Exception as e:
-            print(f"❌ Critical Error getting balance: {e}")
+            logs.error("balance_failed", error=str(e))
             break
 
-    # 5. Fallback: If all retries failed, return the LAST KNOWN good balance
+    raise Exception("Balance unavailable")
+
+
+def get_live_balance():
+    """
+    Robust balance fetcher with Retries + Caching + Error Handling
+    """
+    # 0. Live account store (user-data stream) answers without a round trip
+    state = get_account_state()
+    if state is not None and state.get_balance()[0] is not None:
+        return state.get_balance()
+
+    # 1. Cached for BALANCE_CACHE_DURATION; concurrent misses share one fetch
+    try:
+        return _balance_cache.get_or_load("balance", _fetch_balance)
+    except Exception:
+        pass
+
+    # 2. Fallback: If all retries failed, return the LAST KNOWN good balance
     # instead of returning None (which shows 0.0)
-    if _balance_cache["data"][0] is not None:
-        print("⚠️ Returning stale balance data due to connection failure")
-        return _balance_cache["data"]
+    stale = _balance_cache.peek("balance")
+    if stale is not None:
+        logs.warning("balance_stale", reason="fetch failed")
+        return stale
 
     return None, None
 
 
+def _fetch_price(symbol):
+    client = get_client()
+    if client is None:
+        raise Exception("Binance client not connected")
+    return float(client.futures_symbol_ticker(symbol=symbol)["price"])
+
+
 def get_live_price(symbol):
-    global _price_cache, _price_cache_time
-    
-    current_time = time.time()
-    if symbol in _price_cache and (current_time - _price_cache_time.get(symbol, 0)) < CACHE_DURATION:
-        return _price_cache[symbol]
-    
+    if config.USE_PRICE_STREAM:
+        market_data.start()
+        price = market_data.get_price(symbol)
+        if price is not None:
+            return price
+
     try:
-        client = get_client()
-        if client is None: return None
-        price = float(client.futures_symbol_ticker(symbol=symbol)["price"])
-        _price_cache[symbol] = price
-        _price_cache_time[symbol] = current_time
-        return price
+        return _price_cache.get_or_load(symbol, lambda: _fetch_price(symbol))
     except Exception as e:
-        print(f"Error getting price for {symbol}: {e}")
-        return _price_cache.get(symbol, None)
+        logs.warning("price_failed", symbol=symbol, error=str(e))
+        return _price_cache.peek(symbol)
+
+
+def get_live_prices(symbols):
+    """
+    {symbol: price} for many symbols: streamed/cached prices first, then one
+    all-symbol ticker call for whatever is left (not one call per symbol)
+    """
+    prices = {}
+    if config.USE_PRICE_STREAM:
+        market_data.start()
+        for symbol in symbols:
+            price = market_data.get_price(symbol)
+            if price is not None:
+                prices[symbol] = price
+
+    missing = []
+    for symbol in symbols:
+        if symbol not in prices:
+            cached = _price_cache.get(symbol)
+            if cached is not None:
+                prices[symbol] = cached
+            else:
+                missing.append(symbol)
+
+    if missing:
+        try:
+            client = get_client()
+            if client is None:
+                raise Exception("Binance client not connected")
+            wanted = set(missing)
+            for t in client.futures_symbol_ticker():
+                if t["symbol"] in wanted:
+                    prices[t["symbol"]] = float(t["price"])
+                    _price_cache.set(t["symbol"], prices[t["symbol"]])
+        except Exception as e:
+            logs.warning("prices_failed", symbols=len(missing), error=str(e))
+            for symbol in missing:
+                if _price_cache.peek(symbol) is not None:
+                    prices[symbol] = _price_cache.peek(symbol)
+    return prices
 
 
 def get_symbol_filters(symbol):
-    try:
-        client = get_client()
-        if client is None: return []
-        info = client.futures_exchange_info()
-        for s in info["symbols"]:
-            if s["symbol"] == symbol: return s["filters"]
-    except:
-        pass
-    return []
+    info = get_symbol_info(symbol)
+    return info["filters"] if info else []
 
 
 def get_lot_step(symbol):
-    for f in get_symbol_filters(symbol):
-        if f["filterType"] == "LOT_SIZE": 
-            return float(f["stepSize"])
-    return 0.001
+    info = get_symbol_info(symbol)
+    return info["step"] if info else 0.001
 
 
-def round_qty(symbol, qty):
-    step = get_lot_step(symbol)
+def _round_qty(info, qty):
+    step = info["step"] if info else 0.001
     if step == 0:
         step = 0.001
     if step >= 1:
         return max(1, int(qty))
-    precision = abs(int(round(-math.log10(step))))
-    rounded = round(qty - (qty % step), precision)
+    precision = info["qty_precision"] if info else _step_precision(step)
+    rounded = _floor_to(qty, step, precision)
     return rounded if rounded > 0 else step
 
 
+def _round_price(info, price):
+    tick = info["tick"] if info else None
+    if tick is None:
+        return round(price, 2)
+    if tick == 0:
+        return price
+    if tick >= 1:
+        return int(price)
+    return _floor_to(price, tick, info["price_precision"])
+
+
+def round_qty(symbol, qty):
+    return _round_qty(get_symbol_info(symbol), qty)
+
+
 def round_price(symbol, price):
-    for f in get_symbol_filters(symbol):
-        if f["filterType"] == "PRICE_FILTER":
-            tick = float(f["tickSize"])
-            if tick == 0:
-                return price
-            if tick >= 1:
-                return int(price)
-            precision = abs(int(round(-math.log10(tick))))
-            return round(price - (price % tick), precision)
-    return round(price, 2)
-
-
-def calculate_position_sizing(unutilized_margin, entry, sl_type, sl_value):
+    return _round_price(get_symbol_info(symbol), price)
+
+
+def calculate_position_sizing(unutilized_margin, entry, sl_type, sl_value, symbol=None, side="LONG"):
+    """
+    Risk-based size and leverage. With a symbol, "sl_suggestions" lists
+    ATR-based stops from the local candle store (kline_store.py).
+    """
     if entry <= 0: 
         return {"error": "Invalid Entry"}
     
@@ -326,203 +506,728 @@ def calculate_position_sizing(unutilized_margin, entry, sl_type, sl_value):
         "suggested_leverage": max_leverage,
         "max_leverage": max_leverage,
         "risk_amount": round(risk_amount, 2),
+        "sl_suggestions": suggest_stop_losses(symbol, side, entry) if symbol else [],
         "error": None
     }
 
 
+def suggest_stop_losses(symbol, side, entry):
+    """ATR multiples per timeframe as SL % and tick-rounded SL price; [] until the candles are stored"""
+    if not config.USE_KLINE_STORE:
+        return []
+    suggestions = kline_store.suggest_stops(symbol, side, entry)
+    info = get_symbol_info(symbol) if suggestions else None
+    for s in suggestions:
+        s["sl_price"] = _round_price(info, s["sl_price"])
+    return suggestions
+
+
+def calculate_position_sizing_batch(unutilized_margin, symbols, entries, sl_types, sl_values, sides=None):
+    """
+    calculate_position_sizing for a whole watchlist in one NumPy pass
+    (sizing.py). Quantities are lot-step rounded and entry/SL prices
+    tick-rounded per symbol. Returns one dict per row, in input order;
+    slippage_pct is set for symbols whose order book is mirrored.
+    """
+    n = len(symbols)
+    index = _filter_index()
+    infos = [index.get(s) for s in symbols]
+    sides = sides or ["LONG"] * n
+
+    step = np.array([i["step"] if i else sizing.DEFAULT_STEP for i in infos])
+    qty_precision = np.array([i["qty_precision"] if i else _step_precision(sizing.DEFAULT_STEP) for i in infos])
+    tick = np.array([i["tick"] if i else None for i in infos], dtype=float)   # None -> NaN
+    price_precision = np.array([i["price_precision"] if i else 2 for i in infos])
+    min_notional = np.array([i["min_notional"] if i else 0.0 for i in infos])
+
+    entry = np.array(entries, dtype=float)
+    sl_value = np.array(sl_values, dtype=float)
+    sl_is_percent = np.array([t == sizing.SL_PERCENT for t in sl_types])
+    is_long = np.array([side == "LONG" for side in sides])
+
+    result = sizing.position_sizing(unutilized_margin, entry, sl_is_percent, sl_value)
+    ok = result["error"] == 0
+    qty = np.where(ok, sizing.round_qty(result["units"], step, qty_precision), 0.0)
+    entry_rounded = sizing.round_price(entry, tick, price_precision)
+    sl_price = np.where(ok & (sl_value > 0),
+                        sizing.round_price(sizing.stop_prices(entry, sl_is_percent, sl_value, is_long), tick, price_precision),
+                        0.0)
+    qty_notional = qty * entry
+
+    errors = {1: "Invalid Entry", 2: "Invalid SL distance"}
+    columns = zip(
+        symbols, sides, result["error"].tolist(), result["units"].tolist(), result["leverage"].tolist(),
+        qty.tolist(), entry_rounded.tolist(), sl_price.tolist(), np.round(result["sl_percent"], 4).tolist(),
+        np.round(qty_notional, 2).tolist(), (ok & (qty_notional < min_notional)).tolist()
+    )
+    rows = [
+        {
+            "symbol": symbol,
+            "side": side,
+            "suggested_units": units,
+            "suggested_leverage": leverage,
+            "max_leverage": leverage,
+            "risk_amount": result["risk_amount"],
+            "qty": qty_,
+            "entry": entry_,
+            "sl_price": sl_price_,
+            "sl_percent": sl_pct,
+            "notional": notional,
+            "below_min_notional": below,
+            "error": errors.get(error)
+        }
+        for symbol, side, error, units, leverage, qty_, entry_, sl_price_, sl_pct, notional, below in columns
+    ]
+    # Slippage only where a book is already mirrored; a watchlist call does
+    # not subscribe every symbol
+    if config.USE_ORDER_BOOK:
+        for row in rows:
+            estimate = order_book.estimate_fill(row["symbol"], row["side"], row["qty"])
+            row["slippage_pct"] = estimate["slippage_pct"] if estimate else None
+    return rows
+
+
+def estimate_entry_fill(symbol, side, qty):
+    """
+    Estimated market fill for qty from the local order book (order_book.py),
+    or None. The first call for a symbol starts mirroring its book, so the
+    estimate is available from the next request on.
+    """
+    if not config.USE_ORDER_BOOK or not qty or qty <= 0:
+        return None
+    order_book.track(symbol)
+    return order_book.estimate_fill(symbol, side, qty)
+
+
+def _slippage_guard(symbol, side, qty):
+    """Error message if the book says a market entry of qty would slip too far; None to go ahead"""
+    if config.MAX_ENTRY_SLIPPAGE_PCT is None:
+        return None
+    estimate = estimate_entry_fill(symbol, side, qty)
+    if estimate is None:
+        return None   # no live book: not a reason to refuse the trade
+    if not estimate["complete"]:
+        return (f"❌ Order book too thin: only {estimate['filled_qty']:g} of {qty:g} {symbol} "
+                f"within {estimate['levels']} levels")
+    if estimate["slippage_pct"] > config.MAX_ENTRY_SLIPPAGE_PCT:
+        return (f"❌ Estimated slippage {estimate['slippage_pct']:.3f}% "
+                f"(avg {estimate['avg_price']:g}) exceeds {config.MAX_ENTRY_SLIPPAGE_PCT}%")
+    return None
+
+
+def _format_position(pos, open_orders):
+    """positionRisk / store row -> the dashboard position dict"""
+    position_amt = float(pos['positionAmt'])
+    entry_price = float(pos['entryPrice'])
+    mark_price = float(pos['markPrice'])
+    unrealized_pnl = float(pos['unRealizedProfit'])
+    liquidation_price = float(pos['liquidationPrice'])
+    leverage = int(pos['leverage'])
+    notional = float(pos['notional'])
+    initial_margin = abs(notional) / leverage if leverage > 0 else abs(notional)
+    roi_percent = (unrealized_pnl / initial_margin * 100) if initial_margin > 0 else 0
+    
+    if mark_price > 0 and liquidation_price > 0:
+        if position_amt > 0:
+            margin_ratio = ((mark_price - liquidation_price) / mark_price) * 100
+        else:
+            margin_ratio = ((liquidation_price - mark_price) / mark_price) * 100
+    else:
+        margin_ratio = 0
+    
+    return {
+        'symbol': pos['symbol'],
+        'side': 'LONG' if position_amt > 0 else 'SHORT',
+        'amount': abs(position_amt),
+        'size_usdt': abs(notional),
+        'margin_usdt': initial_margin,
+        'margin_ratio': abs(margin_ratio),
+        'entry_price': entry_price,
+        'mark_price': mark_price,
+        'unrealized_pnl': unrealized_pnl,
+        'roi_percent': roi_percent,
+        'leverage': leverage,
+        'liquidation_price': liquidation_price,
+        'open_orders': open_orders,
+        'timestamp': datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
 def get_open_positions():
     try:
         client = get_client()
         if client is None:
             return []
         
-        positions = client.futures_position_information(recvWindow=10000)
+        state = get_account_state()
+        if state is not None:
+            positions = state.get_positions()
+            orders_by_symbol = state.get_orders_by_symbol()
+        else:
+            positions = client.futures_position_information()
+            orders_by_symbol = None
         open_positions = []
         
         for pos in positions:
-            position_amt = float(pos['positionAmt'])
-            if abs(position_amt) > 0:
-                entry_price = float(pos['entryPrice'])
-                mark_price = float(pos['markPrice'])
-                unrealized_pnl = float(pos['unRealizedProfit'])
-                liquidation_price = float(pos['liquidationPrice'])
-                leverage = int(pos['leverage'])
-                notional = float(pos['notional'])
-                initial_margin = abs(notional) / leverage if leverage > 0 else abs(notional)
-                roi_percent = (unrealized_pnl / initial_margin * 100) if initial_margin > 0 else 0
-                
-                if mark_price > 0 and liquidation_price > 0:
-                    if position_amt > 0:
-                        margin_ratio = ((mark_price - liquidation_price) / mark_price) * 100
-                    else:
-                        margin_ratio = ((liquidation_price - mark_price) / mark_price) * 100
-                else:
-                    margin_ratio = 0
-                
-                open_orders = get_open_orders_for_symbol(pos['symbol'])
-                
-                open_positions.append({
-                    'symbol': pos['symbol'],
-                    'side': 'LONG' if position_amt > 0 else 'SHORT',
-                    'amount': abs(position_amt),
-                    'size_usdt': abs(notional),
-                    'margin_usdt': initial_margin,
-                    'margin_ratio': abs(margin_ratio),
-                    'entry_price': entry_price,
-                    'mark_price': mark_price,
-                    'unrealized_pnl': unrealized_pnl,
-                    'roi_percent': roi_percent,
-                    'leverage': leverage,
-                    'liquidation_price': liquidation_price,
-                    'open_orders': open_orders,
-                    'timestamp': datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-                })
+            if abs(float(pos['positionAmt'])) > 0:
+                # Fetched once per poll, only if something is open
+                if orders_by_symbol is None:
+                    orders_by_symbol = get_all_open_orders()
+                open_positions.append(_format_position(pos, orders_by_symbol.get(pos['symbol'], [])))
         
         return open_positions
     except Exception as e:
-        print(f"Error getting open positions: {e}")
-        traceback.print_exc()
+        logs.error("positions_failed", exc_info=True, error=str(e))
         return []
 
 
+def _base_asset(symbol):
+    info = get_symbol_info(symbol)
+    return info["base_asset"] if info else risk.base_asset(symbol)
+
+
+def get_portfolio_risk():
+    """
+    Portfolio-wide risk (risk.py): exposure per asset, distance to
+    liquidation, P&L if every SL fills, shock scenarios. With the account
+    store live the columns are rebuilt only when positions/orders change;
+    marks arrive from the price stream.
+    """
+    engine = risk.get_engine()
+    try:
+        state = get_account_state()
+        if state is not None:
+            version = state.version
+            if engine.version != version:
+                engine.load(state.get_positions(), state.get_orders_by_symbol(), _base_asset, version)
+        else:
+            client = get_client()
+            if client is None:
+                return {"success": False, "message": "❌ Binance client not connected"}
+            positions = [p for p in client.futures_position_information()
+                         if float(p['positionAmt']) != 0]
+            engine.load(positions, get_all_open_orders() if positions else {}, _base_asset)
+        return {"success": True, **engine.evaluate()}
+    except Exception as e:
+        logs.error("portfolio_risk_failed", exc_info=True, error=str(e))
+        return {"success": False, "message": str(e)}
+
+
+def _format_open_order(order):
+    return {
+        'orderId': order['orderId'],
+        'type': order['type'],
+        'side': order['side'],
+        'price': float(order.get('stopPrice') or 0) or float(order.get('price') or 0),
+        'origQty': float(order['origQty']),
+        'status': order['status'],
+        'reduceOnly': bool(order.get('reduceOnly', False))
+    }
+
+
+def _format_algo_order(order):
+    return {
+        'orderId': order['algoId'],
+        'type': order.get('orderType', order.get('type')),
+        'side': order['side'],
+        'price': float(order.get('triggerPrice', order.get('stopPrice', 0)) or 0),
+        'origQty': float(order.get('quantity', 0) or 0),
+        'status': order.get('algoStatus', order.get('status', 'NEW')),
+        'algo': True
+    }
+
+
+def get_open_algo_orders():
+    """All open SL/TP algo orders for the account (one signed call)"""
+    client = get_client()
+    if client is None:
+        return []
+
+    response = get_transport().signed_request('GET', '/fapi/v1/openAlgoOrders')
+    data = response.json()
+    if response.status_code != 200:
+        raise Exception(data.get('msg', response.text) if isinstance(data, dict) else response.text)
+    return data.get('orders', []) if isinstance(data, dict) else data
+
+
+def get_all_open_orders():
+    """
+    Account-wide open orders grouped by symbol.
+    One futures_get_open_orders call plus one algo listing, regardless of
+    how many positions are open.
+    """
+    grouped = {}
+    client = get_client()
+    if client is None:
+        return grouped
+
+    try:
+        for order in client.futures_get_open_orders():
+            grouped.setdefault(order['symbol'], []).append(_format_open_order(order))
+    except Exception as e:
+        logs.warning("open_orders_failed", error=str(e))
+
+    try:
+        for order in get_open_algo_orders():
+            grouped.setdefault(order['symbol'], []).append(_format_algo_order(order))
+    except Exception as e:
+        logs.warning("open_algo_orders_failed", error=str(e))
+
+    return grouped
+
+
 def get_open_orders_for_symbol(symbol):
     try:
         client = get_client()
         if client is None:
             return []
         
-        orders = client.futures_get_open_orders(symbol=symbol, recvWindow=10000)
-        order_list = []
-        
-        for order in orders:
-            order_list.append({
-                'orderId': order['orderId'],
-                'type': order['type'],
-                'side': order['side'],
-                'price': float(order.get('stopPrice', order.get('price', 0))),
-                'origQty': float(order['origQty']),
-                'status': order['status']
-            })
-        
-        return order_list
+        orders = client.futures_get_open_orders(symbol=symbol)
+        return [_format_open_order(order) for order in orders]
     except Exception as e:
-        print(f"Error getting open orders for {symbol}: {e}")
+        logs.warning("open_orders_failed", symbol=symbol, error=str(e))
         return []
 
 
+# ────────────────────────────────────────────────────────────────
+#      Account state store (user-data stream)
+# ────────────────────────────────────────────────────────────────
+def _seed_account_state(client):
+    acc = client.futures_account()
+    return {
+        "positions": client.futures_position_information(),
+        "orders": get_all_open_orders(),
+        "balance": (float(acc["totalWalletBalance"]), float(acc["totalInitialMargin"]))
+    }
+
+
+def _refresh_algo_orders():
+    grouped = {}
+    for order in get_open_algo_orders():
+        grouped.setdefault(order['symbol'], []).append(_format_algo_order(order))
+    return grouped
+
+
+def get_account_state():
+    """Live account store; started on first use, None until it is seeded and streaming"""
+    if not config.USE_USER_STREAM:
+        return None
+    state = account_state.get_state()
+    if state is None:
+        client = get_client()
+        if client is not None:
+            account_state.start(client, _seed_account_state, _refresh_algo_orders)
+    return state
+
+
+def _find_position(client, symbol):
+    state = get_account_state()
+    if state is not None:
+        return state.get_position(symbol)
+    positions = client.futures_position_information(symbol=symbol)
+    for pos in positions:
+        if abs(float(pos['positionAmt'])) > 0:
+            return pos
+    return None
+
+
 def check_trade_limits(symbol):
-    today = datetime.utcnow().date().isoformat()
-    stats = session.get("stats", {}).get(today, {"total": 0, "symbols": {}})
-    
-    if stats["total"] >= config.MAX_TRADES_PER_DAY:
-        return False, f"❌ Daily limit reached ({config.MAX_TRADES_PER_DAY} trades)"
-    
-    symbol_count = stats.get("symbols", {}).get(symbol, 0)
-    if symbol_count >= config.MAX_TRADES_PER_SYMBOL_PER_DAY:
-        return False, f"❌ Symbol limit reached ({config.MAX_TRADES_PER_SYMBOL_PER_DAY} trades for {symbol} today)"
-    
-    return True, "OK"
+    """(allowed, message) from the shared ledger; read-only"""
+    return trade_limits.get_ledger().check(symbol)
+
+
+def reserve_trade(symbol):
+    """
+    Check and count one trade in a single ledger transaction, so two
+    concurrent submissions cannot both take the last slot. Pair with
+    release_trade() if the trade does not open.
+    """
+    return trade_limits.get_ledger().reserve(symbol)
+
+
+def release_trade(symbol):
+    trade_limits.get_ledger().release(symbol)
 
 
 def update_trade_stats(symbol):
-    today = datetime.utcnow().date().isoformat()
-    if "stats" not in session:
-        session["stats"] = {}
-    if today not in session["stats"]:
-        session["stats"][today] = {"total": 0, "symbols": {}}
-    
-    session["stats"][today]["total"] += 1
-    
-    if symbol not in session["stats"][today]["symbols"]:
-        session["stats"][today]["symbols"][symbol] = 0
-    session["stats"][today]["symbols"][symbol] += 1
-    
-    session.modified = True
+    """Count a trade that was not reserved beforehand"""
+    trade_limits.get_ledger().record(symbol)
+
+
+# ────────────────────────────────────────────────────────────────
+#      Bracket placement helpers (parallel mode)
+# ────────────────────────────────────────────────────────────────
+_order_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="orders")
+
+
+BATCH_ORDER_LIMIT = 5   # orders per /fapi/v1/batchOrders call (exchange limit)
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _batch_call(client, orders):
+    """One batchOrders call -> one entry per order (response or {"code", "msg"})"""
+    with order_priority():
+        try:
+            results = client.futures_place_batch_order(batchOrders=[dict(o) for o in orders])
+        except Exception as e:
+            code = getattr(e, "code", None)
+            return [{"code": code, "msg": getattr(e, "message", str(e))} for _ in orders]
+        if not isinstance(results, list) or len(results) != len(orders):
+            return [{"code": None, "msg": f"Unexpected batch response: {results}"} for _ in orders]
+        return results
+
+
+def place_batch_orders(client, orders, pool=None):
+    """
+    Plain (non-algo) orders through /fapi/v1/batchOrders, BATCH_ORDER_LIMIT
+    per call and the calls sent concurrently. Values must be strings.
+    Returns futures, one per batch, each resolving to a list of per-order
+    results (the order, or {"code", "msg"} for a rejected one) in the order
+    given.
+    """
+    pool = pool or _order_pool
+    return [submit_in_context(pool, _batch_call, client, chunk) for chunk in _chunks(orders, BATCH_ORDER_LIMIT)]
+
 
+def _ms_since(t0):
+    return round((time.perf_counter() - t0) * 1000, 1)
+
+
+def _apply_leverage_and_margin(client, symbol, leverage, margin_mode, parallel, pool=None):
+    """Leverage and margin type are independent settings; both errors are ignored"""
+    def change_leverage():
+        try:
+            client.futures_change_leverage(symbol=symbol, leverage=leverage)
+        except:
+            pass
+
+    def change_margin_type():
+        try:
+            client.futures_change_margin_type(symbol=symbol, marginType=margin_mode)
+        except:
+            pass
+
+    if parallel:
+        pool = pool or _order_pool
+        for f in [submit_in_context(pool, change_leverage), submit_in_context(pool, change_margin_type)]:
+            f.result()
+    else:
+        change_leverage()
+        change_margin_type()
+
+
+def _entry_fill_price(client, symbol, entry_order, parallel):
+    """Fill price from the order response (avgPrice); falls back to the live price"""
+    if parallel:
+        avg_price = float(entry_order.get("avgPrice") or 0)
+        if avg_price > 0:
+            return avg_price
+    else:
+        time.sleep(0.6)
+    return get_live_price(symbol) or float(client.futures_mark_price(symbol=symbol)["markPrice"])
+
+
+def _validate_bracket(sl_value, tp1, tp1_pct, side=None, tp_ladder=None):
+    """Error message for a bracket missing its mandatory legs, else None"""
+    if sl_value <= 0:
+        return "❌ Stop Loss is MANDATORY!"
+    if tp_ladder:
+        return _validate_ladder(side, tp_ladder)
+    if tp1 <= 0:
+        return "❌ Take Profit 1 is MANDATORY!"
+    if tp1_pct <= 0 or tp1_pct > 100:
+        return "❌ TP1 Qty % must be between 1-100!"
+    return None
+
+
+def _stop_loss_price(info, side, actual_entry, sl_type, sl_value):
+    """(sl_pct, rounded SL price) from the fill price"""
+    if sl_type == "SL % Movement":
+        sl_pct = sl_value
+    else:
+        sl_pct = abs((actual_entry - sl_value) / actual_entry * 100)
 
+    if side == "LONG":
+        sl_price = actual_entry * (1 - sl_pct/100)
+    else:
+        sl_price = actual_entry * (1 + sl_pct/100)
+
+    return sl_pct, _round_price(info, sl_price)
+
+
+def _take_profit_legs(info, qty, tp1, tp1_pct, tp2):
+    """([(name, price, qty)], tp1_price, tp2_price); TP2 takes the remainder"""
+    tp1_price = _round_price(info, tp1)
+    tp1_qty = _round_qty(info, qty * (tp1_pct / 100))
+
+    legs = [("TP1", tp1_price, tp1_qty)]
+    tp2_price = None
+    if tp2 > 0:
+        tp2_price = _round_price(info, tp2)
+        tp2_qty = _round_qty(info, qty - tp1_qty)
+        if tp2_qty > 0.0001:  # minimal size check
+            legs.append(("TP2", tp2_price, tp2_qty))
+    return legs, tp1_price, tp2_price
+
+
+def parse_tp_ladder(value):
+    """
+    [(price, pct)] from a list of {"price", "pct"} or [price, pct] levels,
+    or the form text "price:pct, price:pct, ..."; [] if empty.
+    Raises ValueError on a malformed level.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [level.split(":") for level in value.replace(";", ",").split(",") if level.strip()]
+    levels = []
+    for level in value:
+        try:
+            price, pct = (level["price"], level["pct"]) if isinstance(level, dict) else level
+            levels.append((float(price), float(pct)))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Invalid TP ladder level: {level!r} (expected price:pct)")
+    return levels
+
+
+def _validate_ladder(side, levels):
+    if len(levels) > config.TP_LADDER_MAX_LEVELS:
+        return f"❌ TP ladder allows at most {config.TP_LADDER_MAX_LEVELS} levels"
+    if any(price <= 0 or pct <= 0 for price, pct in levels):
+        return "❌ TP ladder prices and Qty % must be positive"
+    if sum(pct for _, pct in levels) > 100 + 1e-9:
+        return "❌ TP ladder Qty % adds up to more than 100"
+    prices = [price for price, _ in levels]
+    if side == "SHORT":
+        prices = prices[::-1]
+    if any(a >= b for a, b in zip(prices, prices[1:])):
+        return "❌ TP ladder prices must move away from the entry, one level after another"
+    return None
+
+
+def _ladder_legs(info, qty, levels):
+    """
+    ([(name, price, qty)], runner qty) for a TP ladder. Quantities are
+    split in whole lot steps; when the levels add up to 100% the last leg
+    takes the exact remainder, otherwise the remainder runs on the SL.
+    """
+    step = (info["step"] if info else 0) or 0.001
+    precision = info["qty_precision"] if info else _step_precision(step)
+    total = int(round(qty / step))
+    full = sum(pct for _, pct in levels) >= 100 - 1e-9
+    legs, used = [], 0
+    for i, (price, pct) in enumerate(levels):
+        if full and i == len(levels) - 1:
+            units = total - used
+        else:
+            units = int(total * pct / 100 + 1e-9)
+        used += units
+        legs.append((f"TP{i + 1}", _round_price(info, price), round(units * step, precision)))
+    return legs, round((total - used) * step, precision)
+
+
+def _ladder_orders(symbol, exit_side, info, legs):
+    """Reduce-only LIMIT orders (batchOrders values are strings); legs under one step are left out"""
+    price_precision = info["price_precision"] if info else 2
+    qty_precision = info["qty_precision"] if info else 3
+    return [{
+        "symbol": symbol,
+        "side": exit_side,
+        "type": "LIMIT",
+        "timeInForce": "GTC",
+        "price": f"{price:.{price_precision}f}",
+        "quantity": f"{leg_qty:.{qty_precision}f}",
+        "reduceOnly": "true"
+    } for _, price, leg_qty in legs if leg_qty > 0]
+
+
+def _ladder_report(legs, responses):
+    """Per-leg outcome in ladder order"""
+    responses = iter(responses)
+    report = []
+    for name, price, leg_qty in legs:
+        leg = {"leg": name, "price": price, "qty": leg_qty}
+        if leg_qty <= 0:
+            leg.update(success=False, message="Below one lot step, not sent")
+        else:
+            response = next(responses)
+            if "orderId" in response:
+                leg.update(success=True, orderId=response["orderId"])
+            else:
+                leg.update(success=False, code=response.get("code"), message=response.get("msg"))
+        report.append(leg)
+    return report
+
+
+def _unprotected_tp_result(actual_entry, qty, sl_price, sl_pct, warning, timings, **extra):
+    """
+    The entry filled and the SL is on, but no take-profit landed: the
+    position is open, so this is a partial success (the trade keeps its
+    daily-limit slot) with the failure under "warning"
+    """
+    return {
+        "success": True,
+        "partial": True,
+        "warning": warning,
+        "message": (
+            f"⚠️ Trade opened without take-profit\n"
+            f"Entry: {actual_entry:.2f}\n"
+            f"SL:    {sl_price:.2f}  ({-sl_pct:.2f}%)\n"
+            f"{warning}"
+        ),
+        "qty": qty,
+        "entry": actual_entry,
+        "timings": timings,
+        **extra
+    }
+
+
+def _ladder_result(actual_entry, qty, sl_price, sl_pct, report, runner_qty, timings):
+    landed = sum(1 for leg in report if leg["success"])
+    if not landed:
+        return _unprotected_tp_result(actual_entry, qty, sl_price, sl_pct,
+                                      f"TP ladder failed: {report[0].get('message', '?')}", timings,
+                                      tp_legs=report, tp_landed=0, runner_qty=qty)
+    lines = [
+        "Trade opened successfully",
+        f"Entry: {actual_entry:.2f}",
+        f"SL:    {sl_price:.2f}  ({-sl_pct:.2f}%)",
+        f"TP ladder: {landed}/{len(report)} legs placed"
+    ] + [f"{leg['leg']}:{' ' * max(1, 5 - len(leg['leg']))}{leg['price']:.2f} x {leg['qty']}"
+         f"  {'✅' if leg['success'] else '❌ ' + str(leg.get('message'))}" for leg in report]
+    if runner_qty > 0:
+        lines.append(f"Runner: {runner_qty} (closed by the SL)")
+    return {
+        "success": True,
+        "message": "\n".join(lines),
+        "qty": qty,
+        "entry": actual_entry,
+        "tp_legs": report,
+        "tp_landed": landed,
+        "runner_qty": runner_qty,
+        "timings": timings
+    }
+
+
+def _trade_opened_message(actual_entry, sl_price, sl_pct, tp1_price, tp1_pct, tp2_price):
+    tp2_text = f"{tp2_price:.2f}" if tp2_price is not None else "—"
+    return (
+        f"Trade opened successfully\n"
+        f"Entry: {actual_entry:.2f}\n"
+        f"SL:    {sl_price:.2f}  ({-sl_pct:.2f}%)\n"
+        f"TP1:   {tp1_price:.2f}  ({tp1_pct}%)\n"
+        f"TP2:   {tp2_text}"
+    )
+
+
+@order_priority()
 def execute_trade_action(
     balance, symbol, side, entry, order_type,
-    sl_type, sl_value, sizing,
+    sl_type, sl_value, sizing_result,
     user_units, user_lev, margin_mode,
-    tp1, tp1_pct, tp2
+    tp1, tp1_pct, tp2, parallel=None, tp_ladder=None
 ):
     """
     2026 FIXED VERSION - uses ONLY algo orders for TP/SL
+
+    parallel=True (default: config.PARALLEL_BRACKET) runs leverage/margin
+    changes concurrently, takes the entry price from avgPrice instead of
+    sleeping, and places TP1/TP2 together once the SL is confirmed.
+    Per-stage timings (ms) are returned under "timings".
+
+    tp_ladder ([(price, pct)], see parse_tp_ladder) replaces TP1/TP2 with
+    up to TP_LADDER_MAX_LEVELS reduce-only LIMIT legs sent through
+    batchOrders; the result lists each leg under "tp_legs".
     """
+    if parallel is None:
+        parallel = config.PARALLEL_BRACKET
+
     # 1. Basic validation
-    if sl_value <= 0:
-        return {"success": False, "message": "❌ Stop Loss is MANDATORY!"}
-    
-    if tp1 <= 0:
-        return {"success": False, "message": "❌ Take Profit 1 is MANDATORY!"}
-    
-    if tp1_pct <= 0 or tp1_pct > 100:
-        return {"success": False, "message": "❌ TP1 Qty % must be between 1-100!"}
+    error = _validate_bracket(sl_value, tp1, tp1_pct, side, tp_ladder)
+    if error:
+        return {"success": False, "message": error}
 
-    # Trade limits check
-    can_trade, limit_msg = check_trade_limits(symbol)
+    client = get_client()
+    if client is None:
+        return {"success": False, "message": "❌ Binance client not connected"}
+
+    # Trade limits: the slot is taken before the entry and given back on failure
+    can_trade, limit_msg = reserve_trade(symbol)
     if not can_trade:
         return {"success": False, "message": limit_msg}
 
-    try:
-        client = get_client()
-        if client is None:
-            return {"success": False, "message": "❌ Binance client not connected"}
+    result = _place_bracket(client, get_transport(), symbol, side, sl_type, sl_value, sizing_result,
+                            user_units, user_lev, margin_mode, tp1, tp1_pct, tp2, parallel,
+                            tp_ladder=tp_ladder)
+    metrics.observe_timings(result.get("timings"), "parallel" if parallel else "sequential")
+    if not result["success"]:
+        release_trade(symbol)
+    return result
+
 
+def _place_bracket(
+    client, transport, symbol, side, sl_type, sl_value, sizing_result,
+    user_units, user_lev, margin_mode, tp1, tp1_pct, tp2, parallel, pool=None, tp_ladder=None
+):
+    """Entry + SL + TP legs on one account (client/transport); no limit bookkeeping"""
+    timings = {}
+    t_start = time.perf_counter()
+    pool = pool or _order_pool
+
+    try:
         # Position sizing
-        units = user_units if user_units > 0 else sizing["suggested_units"]
+        units = user_units if user_units > 0 else sizing_result["suggested_units"]
         qty = round_qty(symbol, units)
 
-        # Leverage & margin mode
-        leverage = int(user_lev) if user_lev > 0 else sizing["max_leverage"]
-        try:
-            client.futures_change_leverage(symbol=symbol, leverage=leverage)
-        except:
-            pass
+        # Liquidity check against the local book (no REST call)
+        guard = _slippage_guard(symbol, side, qty)
+        if guard:
+            logs.warning("bracket_slippage_refused", symbol=symbol, side=side, qty=qty, reason=guard)
+            return {"success": False, "message": guard, "timings": timings}
 
-        try:
-            client.futures_change_margin_type(symbol=symbol, marginType=margin_mode)
-        except:
-            pass
+        # Leverage & margin mode
+        leverage = int(user_lev) if user_lev > 0 else sizing_result["max_leverage"]
+        t0 = time.perf_counter()
+        _apply_leverage_and_margin(client, symbol, leverage, margin_mode, parallel, pool)
+        timings["pre_trade_ms"] = _ms_since(t0)
 
         entry_side = Client.SIDE_BUY if side == "LONG" else Client.SIDE_SELL
         exit_side  = Client.SIDE_SELL if side == "LONG" else Client.SIDE_BUY
 
         # 2. MARKET ENTRY
-        print(f"ENTRY → {side} {qty} {symbol}")
+        logs.info("bracket_entry", sample=True, symbol=symbol, side=side, qty=qty)
+        t0 = time.perf_counter()
         entry_order = client.futures_create_order(
             symbol=symbol,
             side=entry_side,
             type="MARKET",
-            quantity=qty
+            quantity=qty,
+            newOrderRespType="RESULT"
         )
 
         # Get real entry price
-        time.sleep(0.6)
-        actual_entry = get_live_price(symbol) or float(client.futures_mark_price(symbol=symbol)["markPrice"])
+        actual_entry = _entry_fill_price(client, symbol, entry_order, parallel)
+        timings["entry_ms"] = _ms_since(t0)
 
         # 3. Calculate SL price
-        if sl_type == "SL % Movement":
-            sl_pct = sl_value
-        else:
-            sl_pct = abs((actual_entry - sl_value) / actual_entry * 100)
-
-        if side == "LONG":
-            sl_price = actual_entry * (1 - sl_pct/100)
-        else:
-            sl_price = actual_entry * (1 + sl_pct/100)
-
-        sl_price = round_price(symbol, sl_price)
+        info = get_symbol_info(symbol)
+        sl_pct, sl_price = _stop_loss_price(info, side, actual_entry, sl_type, sl_value)
 
         # 4. SL (full close)
-        print(f"SL   → {sl_price:.2f}")
+        logs.info("bracket_sl", sample=True, symbol=symbol, price=sl_price)
+        t0 = time.perf_counter()
         sl_result = place_algo_order(
             symbol=symbol,
             side=exit_side,
             order_type="STOP_MARKET",
             stopPrice=sl_price,
-            closePosition=True
+            closePosition=True,
+            transport=transport
         )
+        timings["sl_ms"] = _ms_since(t0)
 
         if not sl_result["success"]:
             # Emergency close attempt
@@ -535,80 +1240,211 @@ def execute_trade_action(
                 )
             except:
                 pass
-            return {"success": False, "message": f"SL failed: {sl_result.get('error','?')}"}
-
-        # 5. TP1
-        tp1_price = round_price(symbol, tp1)
-        tp1_qty = round_qty(symbol, qty * (tp1_pct / 100))
+            return {"success": False, "message": f"SL failed: {sl_result.get('error','?')}", "timings": timings}
+
+        # 5. TP ladder: all legs in ceil(N / 5) batchOrders calls
+        if tp_ladder:
+            legs, runner_qty = _ladder_legs(info, qty, tp_ladder)
+            for name, price, leg_qty in legs:
+                logs.info("bracket_tp", sample=True, symbol=symbol, leg=name, price=price, qty=leg_qty)
+            orders = _ladder_orders(symbol, exit_side, info, legs)
+            t0 = time.perf_counter()
+            if parallel:
+                responses = [r for f in place_batch_orders(client, orders, pool) for r in f.result()]
+            else:
+                responses = [r for chunk in _chunks(orders, BATCH_ORDER_LIMIT) for r in _batch_call(client, chunk)]
+            timings["tp_ms"] = _ms_since(t0)
+            timings["total_ms"] = _ms_since(t_start)
+            return _ladder_result(actual_entry, qty, sl_price, sl_pct, _ladder_report(legs, responses),
+                                  runner_qty, timings)
+
+        # 5. TP1 / 6. TP2 (optional)
+        legs, tp1_price, tp2_price = _take_profit_legs(info, qty, tp1, tp1_pct, tp2)
+
+        def place_tp(price, leg_qty):
+            return place_algo_order(
+                symbol=symbol,
+                side=exit_side,
+                order_type="TAKE_PROFIT_MARKET",
+                stopPrice=price,
+                quantity=leg_qty,
+                closePosition=False,
+                reduceOnly=True,
+                transport=transport
+            )
 
-        print(f"TP1  → {tp1_price:.2f}  ({tp1_qty})")
-        tp1_result = place_algo_order(
-            symbol=symbol,
-            side=exit_side,
-            order_type="TAKE_PROFIT_MARKET",
-            stopPrice=tp1_price,
-            quantity=tp1_qty,
-            closePosition=False,
-            reduceOnly=True
-        )
+        for name, price, leg_qty in legs:
+            logs.info("bracket_tp", sample=True, symbol=symbol, leg=name, price=price, qty=leg_qty)
 
-        if not tp1_result["success"]:
-            return {"success": False, "message": f"TP1 failed: {tp1_result.get('error','?')}"}
+        t0 = time.perf_counter()
+        if parallel:
+            futures = [submit_in_context(pool, place_tp, price, leg_qty) for _, price, leg_qty in legs]
+            tp_results = [f.result() for f in futures]
+        else:
+            tp_results = []
+            for _, price, leg_qty in legs:
+                tp_results.append(place_tp(price, leg_qty))
+                if not tp_results[0]["success"]:
+                    break
+        if not tp_results[0]["success"] and len(tp_results) > 1 and tp_results[1]["success"]:
+            # TP2 went out alongside TP1 (parallel mode): withdraw it, as the
+            # sequential path never sends it
+            try:
+                cancel_algo_order(tp_results[1]["algoId"], transport=transport)
+            except Exception as e:
+                logs.warning("tp2_cancel_failed", symbol=symbol, algo_id=tp_results[1]["algoId"], error=str(e))
+        timings["tp_ms"] = _ms_since(t0)
+        timings["total_ms"] = _ms_since(t_start)
 
-        # 6. TP2 (optional)
-        tp2_id = None
-        if tp2 > 0:
-            tp2_price = round_price(symbol, tp2)
-            tp2_qty = round_qty(symbol, qty - tp1_qty)
-            
-            if tp2_qty > 0.0001:  # minimal size check
-                print(f"TP2  → {tp2_price:.2f}  ({tp2_qty})")
-                tp2_result = place_algo_order(
-                    symbol=symbol,
-                    side=exit_side,
-                    order_type="TAKE_PROFIT_MARKET",
-                    stopPrice=tp2_price,
-                    quantity=tp2_qty,
-                    closePosition=False,
-                    reduceOnly=True
-                )
-                if tp2_result["success"]:
-                    tp2_id = tp2_result.get("algoId")
+        if not tp_results[0]["success"]:
+            return _unprotected_tp_result(actual_entry, qty, sl_price, sl_pct,
+                                          f"TP1 failed: {tp_results[0].get('error','?')}", timings)
 
         # 7. Success
-        update_trade_stats(symbol)
-
         return {
             "success": True,
-            "message": (
-                f"Trade opened successfully\n"
-                f"Entry: {actual_entry:.2f}\n"
-                f"SL:    {sl_price:.2f}  ({-sl_pct:.2f}%)\n"
-                f"TP1:   {tp1_price:.2f}  ({tp1_pct}%)\n"
-                f"TP2:   {tp2_price:.2f if tp2 > 0 else '—'}"
-            )
+            "message": _trade_opened_message(actual_entry, sl_price, sl_pct, tp1_price, tp1_pct, tp2_price),
+            "qty": qty,
+            "entry": actual_entry,
+            "timings": timings
         }
 
     except Exception as e:
-        traceback.print_exc()
-        return {"success": False, "message": f"Critical error: {str(e)}"}
+        logs.error("bracket_failed", exc_info=True, symbol=symbol, side=side, error=str(e))
+        return {"success": False, "message": f"Critical error: {str(e)}", "timings": timings}
+
+
+# ────────────────────────────────────────────────────────────────
+#      Multi-account fan-out (same bracket in every account)
+# ────────────────────────────────────────────────────────────────
+def _account_free_margin(account_id, client):
+    """Unutilized margin of one account; the main account uses the live store/cache"""
+    if account_id == accounts.MAIN_ACCOUNT:
+        balance, margin = get_live_balance()
+    else:
+        acc = client.futures_account()
+        balance, margin = float(acc["totalWalletBalance"]), float(acc["totalInitialMargin"])
+    if balance is None:
+        return None
+    return max(balance - (margin or 0.0), 0.0)
+
+
+def _fanout_one(account_id, symbol, side, entry, sl_type, sl_value,
+                user_units, user_lev, margin_mode, tp1, tp1_pct, tp2, pool, tp_ladder=None):
+    """Size and place the bracket for one account; never raises"""
+    t_start = time.perf_counter()
+    result = {"account": account_id}
+    # Worker threads do not inherit the caller's context: re-mark as urgent
+    with order_priority():
+        try:
+            client = get_account_client(account_id)
+            if client is None:
+                result.update(success=False, message="❌ Binance client not connected")
+                return result
+
+            t0 = time.perf_counter()
+            unutilized = _account_free_margin(account_id, client)
+            balance_ms = _ms_since(t0)
+            if unutilized is None:
+                result.update(success=False, message="❌ Balance unavailable")
+                return result
+
+            sizing_result = calculate_position_sizing(unutilized, entry, sl_type, sl_value)
+            result["unutilized"] = round(unutilized, 2)
+            if sizing_result.get("error"):
+                result.update(success=False, message=f"❌ {sizing_result['error']}")
+                return result
+
+            result.update(_place_bracket(client, _account_transport(account_id), symbol, side, sl_type,
+                                         sl_value, sizing_result, user_units, user_lev, margin_mode,
+                                         tp1, tp1_pct, tp2, parallel=True, pool=pool,
+                                         tp_ladder=tp_ladder))
+            result.setdefault("timings", {})["balance_ms"] = balance_ms
+        except Exception as e:
+            logs.error("fanout_account_failed", exc_info=True, account=account_id, error=str(e))
+            result.update(success=False, message=f"Critical error: {str(e)}")
+        finally:
+            result.setdefault("timings", {})["account_ms"] = _ms_since(t_start)
+    return result
+
+
+@order_priority()
+def execute_fanout_trade(
+    account_ids, symbol, side, entry, order_type,
+    sl_type, sl_value, user_units, user_lev, margin_mode,
+    tp1, tp1_pct, tp2, tp_ladder=None
+):
+    """
+    Same bracket in every account (default: all registered sub-accounts).
+    Each account is sized with calculate_position_sizing against its own
+    unutilized margin, and all accounts are placed concurrently, so the
+    wall time stays close to one account's. The daily trade limit counts
+    the signal once.
+
+    Returns {"success", "message", "results": [per-account result],
+    "timings": {"total_ms", "slowest_account_ms"}}.
+    """
+    error = _validate_bracket(sl_value, tp1, tp1_pct, side, tp_ladder)
+    if error:
+        return {"success": False, "message": error}
+
+    account_ids = list(dict.fromkeys(account_ids or accounts.ids()))
+    unknown = [a for a in account_ids if a != accounts.MAIN_ACCOUNT and accounts.get(a) is None]
+    if unknown:
+        return {"success": False, "message": f"❌ Unknown account(s): {', '.join(unknown)}"}
+    if not account_ids:
+        return {"success": False, "message": "❌ No accounts registered"}
+
+    can_trade, limit_msg = reserve_trade(symbol)
+    if not can_trade:
+        return {"success": False, "message": limit_msg}
+
+    # The symbol filters are shared: load them once before the threads start
+    get_symbol_info(symbol)
+
+    t_start = time.perf_counter()
+    workers = min(len(account_ids), config.FANOUT_MAX_WORKERS)
+    # Accounts and their leverage/TP legs get separate pools so an account
+    # thread never waits on work queued behind other account threads
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout") as account_pool, \
+            ThreadPoolExecutor(max_workers=2 * workers, thread_name_prefix="fanout-legs") as leg_pool:
+        futures = [
+            submit_in_context(account_pool, _fanout_one, account_id, symbol, side, entry, sl_type, sl_value,
+                              user_units, user_lev, margin_mode, tp1, tp1_pct, tp2, leg_pool, tp_ladder)
+            for account_id in account_ids
+        ]
+        results = [f.result() for f in futures]
+
+    for r in results:
+        metrics.observe_timings(r.get("timings"), "fanout")
+
+    placed = sum(1 for r in results if r["success"])
+    if not placed:
+        release_trade(symbol)
+
+    icon = "✅" if placed == len(results) else "⚠️" if placed else "❌"
+    return {
+        "success": placed == len(results),
+        "message": f"{icon} Bracket placed in {placed}/{len(results)} accounts",
+        "results": results,
+        "timings": {
+            "total_ms": _ms_since(t_start),
+            "slowest_account_ms": max(r["timings"]["account_ms"] for r in results)
+        }
+    }
 
 
 # The rest of the file remains unchanged...
 # (partial_close_position, close_position, update_stop_loss, get_trade_history, get_today_stats)
 
+@order_priority()
 def partial_close_position(symbol, close_percent=None, close_qty=None):
     try:
         client = get_client()
         if client is None:
             return {"success": False, "message": "❌ Binance client not connected"}
         
-        positions = client.futures_position_information(symbol=symbol, recvWindow=10000)
-        position = None
-        for pos in positions:
-            if abs(float(pos['positionAmt'])) > 0:
-                position = pos
-                break
+        position = _find_position(client, symbol)
         
         if not position:
             return {"success": False, "message": f"❌ No open position for {symbol}"}
@@ -625,13 +1461,12 @@ def partial_close_position(symbol, close_percent=None, close_qty=None):
         qty_to_close = round_qty(symbol, qty_to_close)
         close_side = Client.SIDE_SELL if position_amt > 0 else Client.SIDE_BUY
         
-        print(f"\n📉 Partial close: {qty_to_close} {symbol}")
+        logs.info("partial_close", symbol=symbol, qty=qty_to_close)
         order = client.futures_create_order(
             symbol=symbol,
             side=close_side,
             type="MARKET",
-            quantity=qty_to_close,
-            recvWindow=10000
+            quantity=qty_to_close
         )
         
         return {
@@ -641,23 +1476,18 @@ def partial_close_position(symbol, close_percent=None, close_qty=None):
         }
         
     except Exception as e:
-        print(f"❌ Partial close error: {e}")
-        traceback.print_exc()
+        logs.error("partial_close_failed", exc_info=True, symbol=symbol, error=str(e))
         return {"success": False, "message": f"❌ Error: {str(e)}"}
 
 
+@order_priority()
 def close_position(symbol):
     try:
         client = get_client()
         if client is None:
             return {"success": False, "message": "❌ Binance client not connected"}
         
-        positions = client.futures_position_information(symbol=symbol, recvWindow=10000)
-        position = None
-        for pos in positions:
-            if abs(float(pos['positionAmt'])) > 0:
-                position = pos
-                break
+        position = _find_position(client, symbol)
         
         if not position:
             return {"success": False, "message": f"❌ No open position for {symbol}"}
@@ -665,17 +1495,16 @@ def close_position(symbol):
         position_amt = float(position['positionAmt'])
         close_side = Client.SIDE_SELL if position_amt > 0 else Client.SIDE_BUY
         
-        print(f"\n🛑 Closing position: {symbol}")
+        logs.info("close_position", symbol=symbol)
         order = client.futures_create_order(
             symbol=symbol,
             side=close_side,
             type="MARKET",
-            quantity=abs(position_amt),
-            recvWindow=10000
+            quantity=abs(position_amt)
         )
         
         try:
-            client.futures_cancel_all_open_orders(symbol=symbol, recvWindow=10000)
+            client.futures_cancel_all_open_orders(symbol=symbol)
         except:
             pass
         
@@ -686,11 +1515,154 @@ def close_position(symbol):
         }
         
     except Exception as e:
-        print(f"❌ Close position error: {e}")
-        traceback.print_exc()
+        logs.error("close_position_failed", exc_info=True, symbol=symbol, error=str(e))
         return {"success": False, "message": f"❌ Error: {str(e)}"}
 
 
+# ────────────────────────────────────────────────────────────────
+#      Close all positions (batched closes, parallel cancels)
+# ────────────────────────────────────────────────────────────────
+def cancel_algo_order(algo_id, transport=None):
+    response = (transport or get_transport()).signed_request('DELETE', '/fapi/v1/algoOrder', {"algoId": algo_id})
+    if response.status_code != 200:
+        data = response.json()
+        raise Exception(data.get('msg', response.text) if isinstance(data, dict) else response.text)
+
+
+def _cancel_symbol_orders(client, symbol):
+    """Plain open orders of a closed position (one call); list of errors"""
+    with order_priority():
+        try:
+            client.futures_cancel_all_open_orders(symbol=symbol)
+            return []
+        except Exception as e:
+            return [str(e)]
+
+
+def _cancel_algo(algo_id):
+    """Error message, or None once the algo order is cancelled"""
+    with order_priority():
+        try:
+            cancel_algo_order(algo_id)
+            return None
+        except Exception as e:
+            return str(e)
+
+
+def _close_order(pos):
+    amt = str(pos['positionAmt'])
+    return {
+        "symbol": pos['symbol'],
+        "side": Client.SIDE_SELL if float(amt) > 0 else Client.SIDE_BUY,
+        "type": "MARKET",
+        "quantity": amt.lstrip('-'),
+        "reduceOnly": "true",
+        "newOrderRespType": "RESULT"
+    }
+
+
+def _close_result(order, response):
+    result = {"symbol": order["symbol"], "side": order["side"], "qty": float(order["quantity"])}
+    if "orderId" not in response:
+        result.update(success=False, code=response.get("code"), message=f"❌ {response.get('msg')}")
+        return result
+    result.update(
+        success=True,
+        orderId=response["orderId"],
+        status=response.get("status"),
+        executed_qty=float(response.get("executedQty") or 0),
+        avg_price=float(response.get("avgPrice") or 0),
+        message=f"✅ Position closed for {order['symbol']}"
+    )
+    return result
+
+
+@order_priority()
+def close_all_positions():
+    """
+    Flatten the account: positions are read once (live store or one
+    positionRisk call), the reduce-only market closes go out through
+    batchOrders concurrently, and as each batch returns, the plain and
+    SL/TP algo orders of the positions it closed are cancelled in
+    parallel. A position whose close was rejected keeps its orders.
+
+    Returns {"success", "message", "results": [per-symbol result],
+    "timings": {"close_ms", "cancel_ms", "total_ms"}}.
+    """
+    t_start = time.perf_counter()
+    try:
+        client = get_client()
+        if client is None:
+            return {"success": False, "message": "❌ Binance client not connected"}
+
+        state = get_account_state()
+        if state is not None:
+            positions = state.get_positions()
+            orders_by_symbol = state.get_orders_by_symbol()
+        else:
+            positions = [p for p in client.futures_position_information()
+                         if float(p['positionAmt']) != 0]
+            orders_by_symbol = None
+        if not positions:
+            return {"success": True, "message": "No positions to close", "results": [],
+                    "timings": {"total_ms": _ms_since(t_start)}}
+
+        orders = [_close_order(p) for p in positions]
+        logs.info("close_all", positions=len(orders))
+        workers = min(len(orders) * 3, config.CLOSE_ALL_MAX_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="close-all") as pool:
+            # Algo orders are listed while the closes are in flight
+            if orders_by_symbol is None:
+                algo_listing = submit_in_context(pool, _refresh_algo_orders)
+            batches = place_batch_orders(client, orders, pool)
+
+            if orders_by_symbol is None:
+                try:
+                    orders_by_symbol = algo_listing.result()
+                except Exception as e:
+                    logs.warning("open_algo_orders_failed", error=str(e))
+                    orders_by_symbol = {}
+
+            results, cancels = [], []
+            for chunk, batch in zip(_chunks(orders, BATCH_ORDER_LIMIT), batches):
+                for order, response in zip(chunk, batch.result()):
+                    result = _close_result(order, response)
+                    results.append(result)
+                    if not result["success"]:
+                        continue
+                    algo_ids = [o['orderId'] for o in orders_by_symbol.get(order["symbol"], []) if o.get('algo')]
+                    cancels.append((result, submit_in_context(pool, _cancel_symbol_orders, client, order["symbol"]),
+                                    [submit_in_context(pool, _cancel_algo, algo_id) for algo_id in algo_ids]))
+            close_ms = _ms_since(t_start)
+
+            for result, plain, algos in cancels:
+                errors = plain.result() + [e for e in (f.result() for f in algos) if e]
+                result["algo_cancelled"] = len(algos) - sum(1 for f in algos if f.result())
+                if errors:
+                    result["cancel_errors"] = errors
+
+        closed = sum(1 for r in results if r["success"])
+        for r in results:
+            if not r["success"]:
+                logs.warning("close_all_rejected", symbol=r["symbol"], code=r.get("code"), error=r["message"])
+        timings = {"close_ms": close_ms, "cancel_ms": round(_ms_since(t_start) - close_ms, 1),
+                   "total_ms": _ms_since(t_start)}
+        metrics.observe_timings(timings, "close_all")
+
+        icon = "✅" if closed == len(results) else "⚠️" if closed else "❌"
+        return {
+            "success": closed == len(results),
+            "message": f"{icon} Closed {closed}/{len(results)} positions",
+            "results": results,
+            "timings": timings
+        }
+
+    except Exception as e:
+        logs.error("close_all_failed", exc_info=True, error=str(e))
+        return {"success": False, "message": f"❌ Error: {str(e)}", "timings": {"total_ms": _ms_since(t_start)}}
+
+
+@order_priority()
 def update_stop_loss(symbol, new_sl_percent):
     try:
         if new_sl_percent < config.SL_EDIT_MIN_PERCENT or new_sl_percent > config.SL_EDIT_MAX_PERCENT:
@@ -703,12 +1675,7 @@ def update_stop_loss(symbol, new_sl_percent):
         if client is None:
             return {"success": False, "message": "❌ Binance client not connected"}
         
-        positions = client.futures_position_information(symbol=symbol, recvWindow=10000)
-        position = None
-        for pos in positions:
-            if abs(float(pos['positionAmt'])) > 0:
-                position = pos
-                break
+        position = _find_position(client, symbol)
         
         if not position:
             return {"success": False, "message": f"❌ No open position for {symbol}"}
@@ -724,11 +1691,15 @@ def update_stop_loss(symbol, new_sl_percent):
         new_sl_price = round_price(symbol, new_sl_price)
         
         # Cancel existing SL orders
-        open_orders = client.futures_get_open_orders(symbol=symbol, recvWindow=10000)
+        state = get_account_state()
+        if state is not None:
+            open_orders = [o for o in state.get_orders_by_symbol().get(symbol, []) if not o.get('algo')]
+        else:
+            open_orders = client.futures_get_open_orders(symbol=symbol)
         for order in open_orders:
             if order['type'] in ['STOP_MARKET', 'STOP']:
                 try:
-                    client.futures_cancel_order(symbol=symbol, orderId=order['orderId'], recvWindow=10000)
+                    client.futures_cancel_order(symbol=symbol, orderId=order['orderId'])
                 except:
                     pass
         
@@ -754,46 +1725,44 @@ def update_stop_loss(symbol, new_sl_percent):
         }
         
     except Exception as e:
-        print(f"❌ Update SL error: {e}")
-        traceback.print_exc()
+        logs.error("update_sl_failed", exc_info=True, symbol=symbol, error=str(e))
         return {"success": False, "message": f"❌ Error: {str(e)}"}
 
 
-def get_trade_history():
+def _sync_trade_store():
+    store = trade_store.get_store()
     try:
         client = get_client()
-        if client is None:
-            return []
-        
-        trades = client.futures_account_trades(limit=500, recvWindow=10000)
-        
-        trade_list = []
-        for trade in trades:
-            trade_list.append({
-                'time': datetime.fromtimestamp(trade['time'] / 1000).strftime("%Y-%m-%d %H:%M:%S"),
-                'symbol': trade['symbol'],
-                'side': 'LONG' if trade['side'] == 'BUY' else 'SHORT',
-                'qty': float(trade['qty']),
-                'price': float(trade['price']),
-                'realized_pnl': float(trade['realizedPnl']),
-                'commission': float(trade['commission'])
-            })
-        
-        trade_list.sort(key=lambda x: x['time'], reverse=True)
-        return trade_list
-        
+        if client is not None:
+            store.sync(client)
+    except Exception as e:
+        logs.error("trade_sync_failed", exc_info=True, error=str(e))
+    return store
+
+
+def get_trade_history(limit=500, offset=0, symbol=None, start_ms=None, end_ms=None):
+    """
+    Fills from the local trade store, newest first. The store is topped up
+    from per-symbol fromId cursors, so only new fills cost API calls.
+    """
+    store = _sync_trade_store()
+    try:
+        return store.query(symbol=symbol, start_ms=start_ms, end_ms=end_ms, limit=limit, offset=offset)
     except Exception as e:
-        print(f"Error getting trade history: {e}")
-        traceback.print_exc()
+        logs.error("trade_history_failed", exc_info=True, error=str(e))
         return []
 
 
+def iter_trade_batches(symbol=None, start_ms=None, end_ms=None, batch_size=1000):
+    """Raw trade store rows in batches for streaming exports (newest first)"""
+    return _sync_trade_store().iter_batches(symbol, start_ms, end_ms, batch_size)
+
+
 def get_today_stats():
-    today = datetime.utcnow().date().isoformat()
-    stats = session.get("stats", {}).get(today, {"total": 0, "symbols": {}})
+    total, symbols = trade_limits.get_ledger().today_counts()
     return {
-        "total_trades": stats.get("total", 0),
+        "total_trades": total,
         "max_trades": config.MAX_TRADES_PER_DAY,
-        "symbol_trades": stats.get("symbols", {}),
+        "symbol_trades": symbols,
         "max_per_symbol": config.MAX_TRADES_PER_SYMBOL_PER_DAY
     }
\ No newline at end of file
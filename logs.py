@@ -0,0 +1,59 @@
+# logs.py
+# Structured logging for the runtime modules: one JSON object per line
+# (LOG_FORMAT = "json") or "level event key=value ..." (LOG_FORMAT = "text").
+# Routine per-call events (order legs, algo order requests) pass sample=True
+# and are written at LOG_SAMPLE_RATE; warnings and errors always go out.
+
+import json
+import logging
+import random
+import sys
+import time
+
+import config
+
+_logger = logging.getLogger("tradebot")
+
+if not _logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(_handler)
+    _logger.setLevel(config.LOG_LEVEL)
+    _logger.propagate = False
+
+
+def _render(record):
+    if config.LOG_FORMAT == "json":
+        return json.dumps(record, default=str, ensure_ascii=False)
+    head = f"{record.pop('level'):<7} {record.pop('event')}"
+    record.pop("ts")
+    return " ".join([head] + [f"{k}={v}" for k, v in record.items()])
+
+
+def log(level, event, sample=False, exc_info=False, **fields):
+    """Write one event; fields must be JSON-serialisable (str() otherwise)"""
+    if not _logger.isEnabledFor(level):
+        return
+    if sample and config.LOG_SAMPLE_RATE < 1:
+        if random.random() >= config.LOG_SAMPLE_RATE:
+            return
+        fields["sample_rate"] = config.LOG_SAMPLE_RATE
+    record = {"ts": round(time.time(), 3), "level": logging.getLevelName(level).lower(), "event": event}
+    record.update(fields)
+    _logger.log(level, _render(record), exc_info=exc_info)
+
+
+def debug(event, **fields):
+    log(logging.DEBUG, event, **fields)
+
+
+def info(event, **fields):
+    log(logging.INFO, event, **fields)
+
+
+def warning(event, **fields):
+    log(logging.WARNING, event, **fields)
+
+
+def error(event, **fields):
+    log(logging.ERROR, event, **fields)
@@ -0,0 +1,159 @@
+# market_data.py
+# Background mark-price stream (!markPrice@arr@1s) feeding an in-process
+# price table, so get_live_price needs no network I/O while it is fresh.
+# Listeners get each tick's {symbol: price} on the stream thread.
+
+import json
+import threading
+import time
+
+from websockets.sync.client import connect
+
+import config
+import logs
+import metrics
+
+MARK_PRICE_STREAM = "!markPrice@arr@1s"
+RECONNECT_DELAY_MAX = 30  # seconds
+
+
+class MarkPriceStream:
+    """
+    One websocket for every USDT-M mark price. Each symbol maps to a
+    (price, received_at) tuple; readers never block on the socket thread.
+    """
+
+    def __init__(self, base_url=None, stream=MARK_PRICE_STREAM, listeners=None):
+        self.url = f"{(base_url or config.FSTREAM_URL).rstrip('/')}/ws/{stream}"
+        self.prices = {}
+        self.listeners = listeners if listeners is not None else []
+        self.connected = False
+        self.last_message_time = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mark-price-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self, symbol, max_age):
+        entry = self.prices.get(symbol)
+        if entry is None or time.time() - entry[1] > max_age:
+            return None
+        return entry[0]
+
+    def _handle(self, message):
+        now = time.time()
+        events = json.loads(message)
+        if isinstance(events, dict):
+            events = events.get("data", [events])
+        if isinstance(events, dict):
+            events = [events]
+        updates = {}
+        for e in events:
+            if e.get("e") == "markPriceUpdate":
+                updates[e["s"]] = float(e["p"])
+                self.prices[e["s"]] = (updates[e["s"]], now)
+        self.last_message_time = now
+        metrics.WS_MESSAGES.inc(stream="markPrice")
+        if events and events[-1].get("E"):
+            metrics.WS_LAG.observe(max(0.0, now - events[-1]["E"] / 1000), stream="markPrice")
+        for listener in self.listeners:
+            try:
+                listener(updates)
+            except Exception as e:
+                logs.warning("price_listener_error", error=str(e))
+
+    def _run(self):
+        delay = 1
+        while not self._stop.is_set():
+            try:
+                with connect(self.url, open_timeout=10) as ws:
+                    self.connected = True
+                    metrics.WS_CONNECTED.set(1, stream="markPrice")
+                    delay = 1
+                    logs.info("ws_connected", stream="markPrice", url=self.url)
+                    while not self._stop.is_set():
+                        try:
+                            message = ws.recv(timeout=1)
+                        except TimeoutError:
+                            continue
+                        self._handle(message)
+            except Exception as e:
+                if not self._stop.is_set():
+                    metrics.WS_RECONNECTS.inc(stream="markPrice")
+                    logs.warning("ws_disconnected", stream="markPrice", error=str(e), reconnect_in=delay)
+            finally:
+                self.connected = False
+                metrics.WS_CONNECTED.set(0, stream="markPrice")
+            self._stop.wait(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+
+_stream = None
+_stream_lock = threading.Lock()
+_listeners = []
+
+
+def start():
+    """Start the shared stream once per process"""
+    global _stream
+    with _stream_lock:
+        if _stream is None:
+            _stream = MarkPriceStream(listeners=_listeners)
+        _stream.start()
+    return _stream
+
+
+def add_listener(listener):
+    """Call listener({symbol: price}) on every tick (stream thread; keep it short)"""
+    with _stream_lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def get_price(symbol, max_age=None):
+    """Streamed mark price, or None if the stream is not running or the entry is stale"""
+    if _stream is None:
+        return None
+    if max_age is None:
+        max_age = config.PRICE_STREAM_STALE_AFTER
+    return _stream.get(symbol, max_age)
+
+
+# ────────────────────────────────────────────────────────────────
+#      Local replay server: python market_data.py
+# ────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    from websockets.exceptions import ConnectionClosed
+    from websockets.sync.server import serve
+
+    def replay(ws):
+        price = 65000.0
+        try:
+            while True:
+                price += 0.5
+                ws.send(json.dumps([{"e": "markPriceUpdate", "E": int(time.time() * 1000), "s": "BTCUSDT", "p": f"{price:.2f}"}]))
+                time.sleep(0.1)
+        except ConnectionClosed:
+            pass
+
+    server = serve(replay, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.socket.getsockname()[1]
+
+    stream = MarkPriceStream(base_url=f"ws://127.0.0.1:{port}")
+    stream.start()
+    time.sleep(1)
+    start_time = time.perf_counter()
+    for _ in range(100000):
+        stream.get("BTCUSDT", 3)
+    print(f"BTCUSDT {stream.get('BTCUSDT', 3)}  ({(time.perf_counter() - start_time) / 100000 * 1e6:.2f} µs/read)")
+    stream.stop()
+    server.shutdown()
@@ -0,0 +1,216 @@
+# metrics.py
+# In-process metrics in the Prometheus text exposition format (served on
+# /metrics). Counters and histograms are updated inline by the Binance
+# client/transport wrappers, the websocket streams and the web servers;
+# collectors add gauges read at scrape time (caches, rate-limit governor).
+
+import bisect
+import threading
+import time
+
+# Seconds; REST round trips to Binance sit in the 20-500 ms range
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # per-bucket (non-cumulative) counts, sum, count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def add_collector(self, collector):
+        """collector() -> [(name, kind, help, [({label: value}, number)])], called per scrape"""
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {_escape(e)}")
+                continue
+            for name, kind, help, samples in families:
+                lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}"])
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ── Binance REST ──────────────────────────────────────────────────
+BINANCE_LATENCY = Histogram(
+    "binance_request_duration_seconds", "Binance REST round trip, including response parsing",
+    ("method", "endpoint", "status"))
+BINANCE_WEIGHT = Counter(
+    "binance_request_weight_total", "Estimated IP request weight spent", ("endpoint",))
+BINANCE_ERRORS = Counter(
+    "binance_errors_total", "Failed Binance calls by API error code (or exception type)", ("endpoint", "code"))
+BINANCE_RETRIES = Counter(
+    "binance_retries_total", "Retried Binance calls", ("endpoint", "reason"))
+
+# ── Binance websockets ────────────────────────────────────────────
+WS_MESSAGES = Counter("binance_ws_messages_total", "Websocket messages received", ("stream",))
+WS_RECONNECTS = Counter("binance_ws_reconnects_total", "Websocket disconnects followed by a reconnect", ("stream",))
+WS_CONNECTED = Gauge("binance_ws_connected", "1 while the websocket is connected", ("stream",))
+WS_LAG = Histogram(
+    "binance_ws_event_lag_seconds", "Local receive time minus the event time in the message",
+    ("stream",), buckets=LAG_BUCKETS)
+
+# ── Local order books (order_book.py) ─────────────────────────────
+BOOK_RESYNCS = Counter(
+    "order_book_resyncs_total", "Depth snapshots loaded (initial, after a sequence gap, or a failed replay)",
+    ("symbol", "reason"))
+
+# ── Candle store (kline_store.py) ─────────────────────────────────
+KLINE_ROWS = Counter("kline_rows_appended_total", "Closed candles downloaded into the local store", ("interval",))
+KLINE_SYNC_ERRORS = Counter("kline_sync_errors_total", "Series whose top-up failed", ("interval",))
+
+# ── Server clock (clock.py) ───────────────────────────────────────
+CLOCK_OFFSET = Gauge("binance_clock_offset_seconds", "Estimated Binance server time minus local time")
+CLOCK_RTT = Histogram(
+    "binance_time_sync_rtt_seconds", "Round trip of the server-time sample each burst kept")
+CLOCK_RESYNCS = Counter("binance_clock_resyncs_total", "Immediate re-syncs triggered by a -1021")
+
+# ── Web servers and trade flow ────────────────────────────────────
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Dashboard/API request handling time", ("route", "method", "status"))
+TRADE_STAGE = Histogram(
+    "trade_stage_duration_seconds", "Bracket placement time per stage", ("stage", "mode"))
+
+
+def observe_binance(method, endpoint, seconds, status, weight=0, code=None):
+    """One REST call: latency, weight and (if it failed) its error code"""
+    BINANCE_LATENCY.observe(seconds, method=method, endpoint=endpoint, status=status)
+    if weight:
+        BINANCE_WEIGHT.inc(weight, endpoint=endpoint)
+    if code is not None:
+        BINANCE_ERRORS.inc(endpoint=endpoint, code=code)
+
+
+def observe_timings(timings, mode):
+    """result["timings"] of a bracket ({"entry_ms": ..., ...}) -> stage histograms"""
+    for stage, ms in (timings or {}).items():
+        if stage.endswith("_ms"):
+            TRADE_STAGE.observe(ms / 1000, stage=stage[:-3], mode=mode)
+
+
+class timer:
+    """with metrics.timer() as t: ...; t.seconds"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        return False
+
+
+def render():
+    return REGISTRY.render()
@@ -0,0 +1,398 @@
+# order_book.py
+# Local L2 order books for the symbols being traded: a REST depth snapshot
+# plus <symbol>@depth@100ms diffs on one combined websocket, checked by
+# update id (U / u / pu) and re-snapshotted on any gap. Each side is a pair
+# of sorted NumPy arrays (best level first) with running cumulative size
+# and notional; a diff builds new arrays and swaps them in, so readers never
+# lock and a fill estimate is one binary search.
+
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from websockets.sync.client import connect
+
+import config
+import logs
+import metrics
+from transport import get_transport
+
+DEPTH_STREAM = "{symbol}@depth@100ms"
+RECONNECT_DELAY_MAX = 30   # seconds
+MAX_BUFFERED = 1000        # diffs held per symbol while its snapshot loads
+MAX_LEVELS = 1000          # per side; diffs far from the touch are dropped beyond this
+
+BUY_SIDES = ("BUY", "LONG")
+
+
+def _side(prices, qtys):
+    """(prices, qtys, cumulative qty, cumulative notional), best level first"""
+    return prices, qtys, np.cumsum(qtys), np.cumsum(prices * qtys)
+
+
+_EMPTY = _side(np.empty(0), np.empty(0))
+
+
+def _levels(rows):
+    return np.asarray(rows, dtype=np.float64).reshape(-1, 2)
+
+
+def _from_snapshot(rows, bids):
+    levels = _levels(rows)
+    levels = levels[np.argsort(-levels[:, 0] if bids else levels[:, 0])]
+    levels = levels[levels[:, 1] > 0][:MAX_LEVELS]
+    return _side(levels[:, 0].copy(), levels[:, 1].copy())
+
+
+def _merge(side, rows, bids):
+    """Apply [[price, qty], ...] (qty 0 removes the level) to one side; returns a new side"""
+    if not rows:
+        return side
+    prices, qtys = side[0], side[1]
+    upd = _levels(rows)
+    # Search on ascending keys: asks by price, bids by -price
+    keys = -prices if bids else prices
+    new_keys = -upd[:, 0] if bids else upd[:, 0]
+    order = np.argsort(new_keys, kind="stable")
+    upd, new_keys = upd[order], new_keys[order]
+
+    idx = np.searchsorted(keys, new_keys)
+    hit = idx < len(keys)
+    hit[hit] = keys[idx[hit]] == new_keys[hit]
+    qtys = qtys.copy()
+    qtys[idx[hit]] = upd[hit, 1]
+    add = ~hit & (upd[:, 1] > 0)
+    prices = np.insert(prices, idx[add], upd[add, 0])
+    qtys = np.insert(qtys, idx[add], upd[add, 1])
+    keep = qtys > 0
+    return _side(prices[keep][:MAX_LEVELS], qtys[keep][:MAX_LEVELS])
+
+
+def _walk(side, qty):
+    """(filled qty, average price, last price touched, levels used) taking qty from one side"""
+    prices, _, cum_qty, cum_notional = side
+    n = len(prices)
+    if not n:
+        return 0.0, None, None, 0
+    i = int(np.searchsorted(cum_qty, qty))
+    if i >= n:
+        return float(cum_qty[-1]), float(cum_notional[-1] / cum_qty[-1]), float(prices[-1]), n
+    prev_qty = cum_qty[i - 1] if i else 0.0
+    prev_notional = cum_notional[i - 1] if i else 0.0
+    notional = prev_notional + (qty - prev_qty) * prices[i]
+    return float(qty), float(notional / qty), float(prices[i]), i + 1
+
+
+class OrderBook:
+    """One symbol's book. Writers (stream thread, snapshot worker) hold _lock; readers do not."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = _EMPTY
+        self.asks = _EMPTY
+        self.last_update_id = 0
+        self.synced = False
+        self.updated_at = 0.0
+        self.resyncs = 0
+        self._first = True
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    # ── writers ──────────────────────────────────────────────────
+    def reset(self):
+        """Drop the book until the next snapshot (reconnect / gap)"""
+        with self._lock:
+            self.synced = False
+            self._buffer = []
+
+    def load_snapshot(self, snapshot):
+        """Seed from GET /fapi/v1/depth and replay the buffered diffs; False if they do not line up"""
+        with self._lock:
+            self.bids = _from_snapshot(snapshot["bids"], bids=True)
+            self.asks = _from_snapshot(snapshot["asks"], bids=False)
+            self.last_update_id = snapshot["lastUpdateId"]
+            self.updated_at = time.time()
+            self.synced = True
+            self._first = True
+            buffered, self._buffer = self._buffer, []
+            return all(self._apply(event) for event in buffered)
+
+    def apply(self, event):
+        """One depthUpdate; False means a gap was found and a new snapshot is needed"""
+        with self._lock:
+            if not self.synced:
+                if len(self._buffer) < MAX_BUFFERED:
+                    self._buffer.append(event)
+                return True
+            return self._apply(event)
+
+    def _apply(self, event):
+        if event["u"] < self.last_update_id:
+            return True   # already in the snapshot
+        if self._first:
+            # straddles the snapshot, or starts right after it when the
+            # snapshot was cut on an event boundary
+            in_sequence = event["U"] <= self.last_update_id + 1
+        else:
+            in_sequence = event["pu"] == self.last_update_id
+        if not in_sequence:
+            self.synced = False
+            self._buffer = [event]
+            return False
+        self.bids = _merge(self.bids, event["b"], bids=True)
+        self.asks = _merge(self.asks, event["a"], bids=False)
+        self.last_update_id = event["u"]
+        self.updated_at = time.time()
+        self._first = False
+        return True
+
+    # ── readers ──────────────────────────────────────────────────
+    def live(self, max_age):
+        return self.synced and time.time() - self.updated_at <= max_age
+
+    def estimate(self, side, qty):
+        """Fill estimate for a market order of qty (side BUY/LONG takes the asks)"""
+        bids, asks = self.bids, self.asks
+        if not len(bids[0]) or not len(asks[0]):
+            return None
+        best_bid, best_ask = float(bids[0][0]), float(asks[0][0])
+        mid = (best_bid + best_ask) / 2
+        buy = side.upper() in BUY_SIDES
+        filled, avg_price, last_price, levels = _walk(asks if buy else bids, qty)
+        slippage = (avg_price - mid) / mid * 100 if buy else (mid - avg_price) / mid * 100
+        return {
+            "symbol": self.symbol,
+            "side": "BUY" if buy else "SELL",
+            "qty": qty,
+            "filled_qty": filled,
+            "complete": filled >= qty - 1e-12,
+            "avg_price": avg_price,
+            "worst_price": last_price,
+            "best_bid": best_bid,
+            "best_ask": best_ask,
+            "spread_bps": round((best_ask - best_bid) / mid * 1e4, 2),
+            "slippage_pct": round(slippage, 4),   # average fill vs mid, positive = worse
+            "levels": levels,
+            "age_ms": round((time.time() - self.updated_at) * 1000, 1)
+        }
+
+    def summary(self):
+        return {
+            "synced": self.synced,
+            "last_update_id": self.last_update_id,
+            "bid_levels": len(self.bids[0]),
+            "ask_levels": len(self.asks[0]),
+            "best_bid": float(self.bids[0][0]) if len(self.bids[0]) else None,
+            "best_ask": float(self.asks[0][0]) if len(self.asks[0]) else None,
+            "age_seconds": round(time.time() - self.updated_at, 1) if self.updated_at else None,
+            "resyncs": self.resyncs
+        }
+
+
+class OrderBookStream:
+    """
+    One combined websocket (/stream) carrying the diff stream of every
+    tracked symbol; symbols are added with SUBSCRIBE while it runs.
+    Snapshots load on a small pool so one symbol's REST call never holds
+    up the others' diffs.
+    """
+
+    def __init__(self, base_url=None):
+        self.url = f"{(base_url or config.FSTREAM_URL).rstrip('/')}/stream"
+        self.books = {}
+        self.connected = False
+        self._ws = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._snapshots = ThreadPoolExecutor(max_workers=4, thread_name_prefix="book-snapshot")
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="order-book-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def track(self, symbol):
+        with self._lock:
+            book = self.books.get(symbol)
+            if book is not None:
+                return book
+            book = self.books[symbol] = OrderBook(symbol)
+            ws = self._ws
+        if ws is not None:
+            self._subscribe(ws, [symbol])
+        return book
+
+    def _subscribe(self, ws, symbols):
+        try:
+            ws.send(json.dumps({"method": "SUBSCRIBE", "id": next(self._ids),
+                                "params": [DEPTH_STREAM.format(symbol=s.lower()) for s in symbols]}))
+        except Exception as e:
+            logs.warning("book_subscribe_failed", symbols=symbols, error=str(e))
+            return
+        for symbol in symbols:
+            self._resync(self.books[symbol], "initial")
+
+    def _resync(self, book, reason):
+        book.resyncs += 1
+        metrics.BOOK_RESYNCS.inc(symbol=book.symbol, reason=reason)
+        self._snapshots.submit(self._load_snapshot, book)
+
+    def _load_snapshot(self, book):
+        try:
+            response = get_transport().request('GET', '/fapi/v1/depth',
+                                               {"symbol": book.symbol, "limit": config.ORDER_BOOK_SNAPSHOT_LIMIT})
+            response.raise_for_status()
+            in_sequence = book.load_snapshot(response.json())
+        except Exception as e:
+            logs.warning("book_snapshot_failed", symbol=book.symbol, error=str(e))
+            self._stop.wait(1)
+            in_sequence = False
+        if not in_sequence and not self._stop.is_set() and self.connected:
+            self._resync(book, "snapshot")
+
+    def _handle(self, message):
+        now = time.time()
+        payload = json.loads(message)
+        event = payload.get("data")
+        if not isinstance(event, dict) or event.get("e") != "depthUpdate":
+            return   # SUBSCRIBE acks
+        metrics.WS_MESSAGES.inc(stream="depth")
+        if event.get("E"):
+            metrics.WS_LAG.observe(max(0.0, now - event["E"] / 1000), stream="depth")
+        book = self.books.get(event["s"])
+        if book is not None and not book.apply(event):
+            logs.warning("book_gap", symbol=book.symbol, pu=event.get("pu"), U=event["U"], u=event["u"])
+            self._resync(book, "gap")
+
+    def _run(self):
+        delay = 1
+        while not self._stop.is_set():
+            try:
+                with connect(self.url, open_timeout=10) as ws:
+                    with self._lock:
+                        self._ws = ws
+                        symbols = list(self.books)
+                    self.connected = True
+                    metrics.WS_CONNECTED.set(1, stream="depth")
+                    delay = 1
+                    logs.info("ws_connected", stream="depth", url=self.url, symbols=len(symbols))
+                    for book in self.books.values():
+                        book.reset()
+                    if symbols:
+                        self._subscribe(ws, symbols)
+                    while not self._stop.is_set():
+                        try:
+                            message = ws.recv(timeout=1)
+                        except TimeoutError:
+                            continue
+                        self._handle(message)
+            except Exception as e:
+                if not self._stop.is_set():
+                    metrics.WS_RECONNECTS.inc(stream="depth")
+                    logs.warning("ws_disconnected", stream="depth", error=str(e), reconnect_in=delay)
+            finally:
+                with self._lock:
+                    self._ws = None
+                self.connected = False
+                metrics.WS_CONNECTED.set(0, stream="depth")
+                for book in self.books.values():
+                    book.reset()
+            self._stop.wait(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+
+_stream = None
+_stream_lock = threading.Lock()
+
+
+def track(symbol):
+    """Start mirroring symbol's book (and the shared stream) if not already; returns the OrderBook"""
+    global _stream
+    with _stream_lock:
+        if _stream is None:
+            _stream = OrderBookStream()
+        _stream.start()
+    return _stream.track(symbol.upper())
+
+
+def get_book(symbol, max_age=None):
+    """The symbol's book if it is synced and fresh, else None"""
+    if _stream is None:
+        return None
+    book = _stream.books.get(symbol.upper())
+    if book is None or not book.live(config.ORDER_BOOK_STALE_AFTER if max_age is None else max_age):
+        return None
+    return book
+
+
+def estimate_fill(symbol, side, qty, max_age=None):
+    """Estimated market fill for qty from the local book; None if the book is not live"""
+    book = get_book(symbol, max_age)
+    return book.estimate(side, qty) if book is not None and qty > 0 else None
+
+
+def snapshot():
+    if _stream is None:
+        return {}
+    return {symbol: book.summary() for symbol, book in list(_stream.books.items())}
+
+
+def _collect():
+    if _stream is None:
+        return []
+    books = list(_stream.books.items())
+    now = time.time()
+    return [
+        ("order_book_synced", "gauge", "1 while the local book is in sequence with the exchange",
+         [({"symbol": s}, 1 if b.synced else 0) for s, b in books]),
+        ("order_book_levels", "gauge", "Price levels held per side",
+         [({"symbol": s, "side": side}, len(getattr(b, side)[0])) for s, b in books for side in ("bids", "asks")]),
+        ("order_book_age_seconds", "gauge", "Time since the last applied diff",
+         [({"symbol": s}, now - b.updated_at) for s, b in books if b.updated_at]),
+    ]
+
+
+metrics.REGISTRY.add_collector(_collect)
+
+
+# ────────────────────────────────────────────────────────────────
+#      Micro-benchmark: python order_book.py
+# ────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    rng = np.random.default_rng(7)
+    book = OrderBook("BTCUSDT")
+    prices = np.round(65000 - np.arange(1000) * 0.1, 1)
+    book.load_snapshot({
+        "lastUpdateId": 2,
+        "bids": [[p, q] for p, q in zip(prices, rng.uniform(0.01, 2, 1000))],
+        "asks": [[p + 100.1, q] for p, q in zip(prices[::-1], rng.uniform(0.01, 2, 1000))]
+    })
+
+    n = 20000
+    t0 = time.perf_counter()
+    for i in range(n):
+        book.estimate("BUY", 5.0)
+    estimate_us = (time.perf_counter() - t0) / n * 1e6
+
+    diffs = [{"U": i, "u": i, "pu": i - 1, "a": [],
+              "b": [[f"{65000 - k * 0.1:.1f}", q] for k, q in zip(rng.integers(0, 1200, 10), rng.choice(["0", "0.5"], 10))]}
+             for i in range(2, 2 + n // 10)]
+    t0 = time.perf_counter()
+    for diff in diffs:
+        book.apply(diff)
+    diff_us = (time.perf_counter() - t0) / len(diffs) * 1e6
+
+    assert book.synced and book.last_update_id == diffs[-1]["u"]
+    print(book.estimate("BUY", 5.0))
+    print(f"estimate {estimate_us:.1f} µs   10-level diff {diff_us:.1f} µs   "
+          f"({len(book.bids[0])} bids / {len(book.asks[0])} asks)")
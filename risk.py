@@ -0,0 +1,250 @@
+# risk.py
+# Portfolio risk over the open positions, held as NumPy column arrays.
+# The columns are rebuilt only when the position/order set changes; each
+# mark-price tick just overwrites the mark column, and every aggregate
+# (exposure, liquidation distance, stop-loss outcome, shock scenarios) is
+# one vectorized pass over those columns.
+
+import threading
+import time
+
+import numpy as np
+
+import config
+
+QUOTE_ASSETS = ("USDT", "USDC", "BUSD")
+STOP_TYPES = ("STOP_MARKET", "STOP")
+
+
+def base_asset(symbol):
+    """BTCUSDT -> BTC (fallback when exchangeInfo has no baseAsset)"""
+    for quote in QUOTE_ASSETS:
+        if symbol.endswith(quote) and len(symbol) > len(quote):
+            return symbol[:-len(quote)]
+    return symbol
+
+
+def _stop_price(orders, amount):
+    """Trigger price of the position's protective stop (closest to the mark), else nan"""
+    exit_side = "SELL" if amount > 0 else "BUY"
+    prices = [o['price'] for o in orders if o.get('type') in STOP_TYPES and o.get('side') == exit_side and o.get('price')]
+    if not prices:
+        return np.nan
+    # Long: the highest stop fires first; short: the lowest
+    return max(prices) if amount > 0 else min(prices)
+
+
+class PortfolioRisk:
+    """
+    load() takes futures_position_information rows and {symbol: [formatted
+    orders]}; on_marks() takes one tick's {symbol: price}. evaluate() is
+    safe to call from any thread and is cached until the next change.
+    """
+
+    def __init__(self, shocks=None, betas=None, default_beta=None):
+        self.shocks = np.array(config.RISK_SHOCKS if shocks is None else shocks, dtype=float)
+        self.betas = config.RISK_BETAS if betas is None else betas
+        self.default_beta = config.RISK_DEFAULT_BETA if default_beta is None else default_beta
+        self.version = None
+        self._lock = threading.Lock()
+        self._result = None
+        self._generation = 0   # bumped under the lock on every change to the columns
+        self.load([], {})
+
+    def load(self, positions, orders_by_symbol, asset_of=base_asset, version=None):
+        rows = [p for p in positions if float(p['positionAmt']) != 0]
+        symbols = [p['symbol'] for p in rows]
+        amount = np.array([float(p['positionAmt']) for p in rows], dtype=float)
+        assets = [asset_of(s) for s in symbols]
+        asset_names = sorted(set(assets))
+        asset_pos = {a: i for i, a in enumerate(asset_names)}
+
+        with self._lock:
+            self.symbols = symbols
+            self.index = {s: i for i, s in enumerate(symbols)}
+            self.amount = amount
+            self.entry = np.array([float(p['entryPrice']) for p in rows], dtype=float)
+            self.mark = np.array([float(p.get('markPrice') or p['entryPrice']) for p in rows], dtype=float)
+            self.leverage = np.maximum(np.array([float(p.get('leverage') or 1) for p in rows], dtype=float), 1.0)
+            self.liquidation = np.array([float(p.get('liquidationPrice') or 0) for p in rows], dtype=float)
+            self.stop = np.array([_stop_price(orders_by_symbol.get(s, []), a) for s, a in zip(symbols, amount)], dtype=float)
+            self.asset_names = asset_names
+            self.asset_idx = np.array([asset_pos[a] for a in assets], dtype=np.intp)
+            self.beta = np.array([self.betas.get(a, self.default_beta) for a in assets], dtype=float)
+            self.version = version
+            self._result = None
+            self._generation += 1
+
+    def on_marks(self, prices):
+        """Mark-price tick: overwrite the marks of the symbols we hold"""
+        index = self.index
+        if not index:
+            return
+        with self._lock:
+            # A tick carries every symbol; walk whichever side is smaller
+            if len(prices) < len(index):
+                for symbol, price in prices.items():
+                    i = index.get(symbol)
+                    if i is not None:
+                        self.mark[i] = price
+            else:
+                for symbol, i in index.items():
+                    price = prices.get(symbol)
+                    if price is not None:
+                        self.mark[i] = price
+            self._result = None
+            self._generation += 1
+
+    def evaluate(self):
+        """Aggregates over the current columns (cached until the next load/tick)"""
+        t0 = time.perf_counter()
+        with self._lock:
+            if self._result is not None:
+                return self._result
+            generation = self._generation
+            symbols, asset_names = self.symbols, self.asset_names
+            amount, entry, leverage, liquidation = self.amount, self.entry, self.leverage, self.liquidation
+            stop, asset_idx, beta = self.stop, self.asset_idx, self.beta
+            mark = self.mark.copy()
+
+        side = np.sign(amount)
+        notional = amount * mark
+        gross = np.abs(notional)
+        margin = gross / leverage
+        unrealized = (mark - entry) * amount
+
+        # Distance to liquidation, % of mark in the adverse direction
+        has_liq = liquidation > 0
+        liq_distance = np.full_like(mark, np.nan)
+        np.divide(side * (mark - liquidation) * 100, mark, out=liq_distance, where=has_liq & (mark > 0))
+
+        # Where each position leaves the book on an adverse move: its SL,
+        # else its liquidation price. With neither, the whole notional is at risk.
+        has_stop = ~np.isnan(stop)
+        exit_price = np.where(has_stop, stop, np.where(has_liq, liquidation, 0.0))
+        exit_pnl = (exit_price - mark) * amount          # from here
+        exit_pnl_entry = (exit_price - entry) * amount   # realized vs entry
+
+        # Shock scenarios: each asset moves shock * beta; a position that
+        # crosses its exit level closes there (SL or liquidation)
+        has_exit = has_stop | has_liq
+        moved = mark * (1.0 + np.outer(self.shocks, beta))           # scenarios x positions
+        crossed = has_exit & (side * (moved - exit_price) <= 0)
+        settled = np.where(crossed, exit_price, moved)
+        scenario_pnl = ((settled - mark) * amount).sum(axis=1)
+        stopped = (crossed & has_stop).sum(axis=1)
+        liquidated = (crossed & ~has_stop).sum(axis=1)
+
+        exposure = np.bincount(asset_idx, weights=notional, minlength=len(asset_names))
+        gross_exposure = np.bincount(asset_idx, weights=gross, minlength=len(asset_names))
+
+        valid_liq = ~np.isnan(liq_distance)
+        nearest = int(np.nanargmin(liq_distance)) if valid_liq.any() else None
+        worst = int(np.argmin(scenario_pnl)) if len(self.shocks) else None
+
+        result = {
+            "positions": len(symbols),
+            "total_notional": round(float(gross.sum()), 2),
+            "net_notional": round(float(notional.sum()), 2),
+            "long_notional": round(float(gross[side > 0].sum()), 2),
+            "short_notional": round(float(gross[side < 0].sum()), 2),
+            "margin": round(float(margin.sum()), 2),
+            "unrealized_pnl": round(float(unrealized.sum()), 2),
+            "exposure": {
+                a: {"net": n, "gross": g}
+                for a, n, g in zip(asset_names, np.round(exposure, 2).tolist(), np.round(gross_exposure, 2).tolist())
+            },
+            "liquidation": {
+                "nearest_symbol": symbols[nearest] if nearest is not None else None,
+                "nearest_pct": round(float(liq_distance[nearest]), 2) if nearest is not None else None,
+                "by_symbol": dict(zip(
+                    [symbols[i] for i in np.flatnonzero(valid_liq).tolist()],
+                    np.round(liq_distance[valid_liq], 2).tolist()
+                ))
+            },
+            "stop_loss": {
+                "worst_case_pnl": round(float(exit_pnl[has_exit].sum()), 2),
+                "worst_case_pnl_vs_entry": round(float(exit_pnl_entry[has_exit].sum()), 2),
+                "unprotected": [symbols[i] for i in np.flatnonzero(~has_stop).tolist()],
+                "unprotected_notional": round(float(gross[~has_stop].sum()), 2)
+            },
+            "scenarios": [
+                {"shock_pct": round(float(s) * 100, 2), "pnl": round(float(p), 2),
+                 "stopped": int(n_stop), "liquidated": int(n_liq)}
+                for s, p, n_stop, n_liq in zip(self.shocks, scenario_pnl, stopped, liquidated)
+            ],
+            "worst_scenario_pct": round(float(self.shocks[worst]) * 100, 2) if worst is not None else None,
+            "evaluated_ms": round((time.perf_counter() - t0) * 1000, 3)
+        }
+        # Publish only if nothing changed while computing, so a load or tick
+        # that raced this evaluation is not hidden behind a stale result
+        with self._lock:
+            if self._generation == generation:
+                self._result = result
+        return result
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Process-wide engine, fed by the mark-price stream once created"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                import market_data
+                _engine = PortfolioRisk()
+                market_data.add_listener(_engine.on_marks)
+    return _engine
+
+
+# ────────────────────────────────────────────────────────────────
+#      Micro-benchmark: python risk.py [n_positions]
+# ────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = np.random.default_rng(7)
+    positions, orders, tick = [], {}, {}
+    for i in range(n):
+        symbol = f"C{i % 120}X{i}USDT"
+        mark = float(rng.uniform(0.1, 60000))
+        amount = float(rng.choice([-1, 1]) * rng.uniform(0.01, 5))
+        long = amount > 0
+        positions.append({
+            "symbol": symbol, "positionAmt": str(amount), "entryPrice": str(mark * rng.uniform(0.97, 1.03)),
+            "markPrice": str(mark), "leverage": "10",
+            "liquidationPrice": str(mark * (0.9 if long else 1.1))
+        })
+        if i % 4:
+            orders[symbol] = [{"type": "STOP_MARKET", "side": "SELL" if long else "BUY",
+                               "price": mark * (0.97 if long else 1.03)}]
+        tick[symbol] = mark * 1.001
+    for j in range(400 - min(n, 400)):
+        tick[f"OTHER{j}USDT"] = 1.0
+
+    engine = PortfolioRisk()
+    start = time.perf_counter()
+    engine.load(positions, orders, asset_of=lambda s: s.split("X")[0])
+    load_ms = (time.perf_counter() - start) * 1000
+
+    rounds = 200
+    tick_s = eval_s = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        engine.on_marks(tick)
+        tick_s += time.perf_counter() - start
+        start = time.perf_counter()
+        result = engine.evaluate()
+        eval_s += time.perf_counter() - start
+
+    print(f"{n} positions, {len(tick)} symbols per tick")
+    print(f"  load      {load_ms:8.3f} ms (on position/order change)")
+    print(f"  tick      {tick_s / rounds * 1000:8.3f} ms")
+    print(f"  evaluate  {eval_s / rounds * 1000:8.3f} ms")
+    print(f"  notional {result['total_notional']:,.0f}  worst SL pnl {result['stop_loss']['worst_case_pnl']:,.0f}  "
+          f"worst scenario {result['worst_scenario_pct']}% -> "
+          f"{min(s['pnl'] for s in result['scenarios']):,.0f}")
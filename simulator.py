@@ -0,0 +1,813 @@
+# simulator.py
+# Local stand-in for Binance USDT-M Futures: the REST endpoints logic.py
+# uses (through python-binance and transport.py) plus the mark-price and
+# user-data websocket streams. Orders match against a random-walk mark
+# price; latency and -1021 / -4120 / 429 errors can be injected.
+#
+#   python simulator.py --port 8900 --ws-port 8901 --latency-ms 40
+#   BINANCE_FAPI_URL=http://127.0.0.1:8900 \
+#   BINANCE_FSTREAM_URL=ws://127.0.0.1:8901 python app.py
+
+import hashlib
+import hmac
+import json
+import math
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.server import serve
+
+DEFAULT_SYMBOLS = {
+    # symbol: (start price, tickSize, stepSize)
+    "BTCUSDT": (65000.0, "0.10", "0.001"),
+    "ETHUSDT": (3200.0, "0.01", "0.001"),
+    "BNBUSDT": (580.0, "0.010", "0.01"),
+    "SOLUSDT": (150.0, "0.0100", "1"),
+    "XRPUSDT": (0.55, "0.0001", "0.1"),
+}
+
+COMMISSION_RATE = 0.0004
+BOOK_LEVELS = 200             # price levels per side of the simulated book
+BOOK_LEVEL_NOTIONAL = 20000   # average USDT resting on one level
+KLINE_INTERVALS = {   # interval -> ms
+    "1m": 60000, "3m": 180000, "5m": 300000, "15m": 900000, "30m": 1800000,
+    "1h": 3600000, "2h": 7200000, "4h": 14400000, "6h": 21600000, "8h": 28800000,
+    "12h": 43200000, "1d": 86400000, "3d": 259200000, "1w": 604800000,
+}
+CONDITIONAL_TYPES = ("STOP", "STOP_MARKET", "TAKE_PROFIT", "TAKE_PROFIT_MARKET", "TRAILING_STOP_MARKET")
+
+# Request weights for the endpoints the app calls (everything else costs 1)
+WEIGHTS = {
+    ("GET", "/fapi/v1/exchangeInfo"): 1,
+    ("GET", "/fapi/v2/account"): 5,
+    ("GET", "/fapi/v3/account"): 5,
+    ("GET", "/fapi/v2/positionRisk"): 5,
+    ("GET", "/fapi/v3/positionRisk"): 5,
+    ("GET", "/fapi/v1/openOrders"): 40,   # without symbol; 1 with
+    ("GET", "/fapi/v1/userTrades"): 5,
+    ("GET", "/fapi/v1/income"): 30,
+    ("GET", "/fapi/v1/klines"): 5,
+    ("GET", "/fapi/v1/depth"): 10,
+    ("POST", "/fapi/v1/batchOrders"): 5,
+}
+ORDER_ENDPOINTS = {
+    ("POST", "/fapi/v1/order"), ("POST", "/fapi/v1/algoOrder"), ("POST", "/fapi/v1/batchOrders")
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, code, msg):
+        super().__init__(msg)
+        self.status = status
+        self.code = code
+        self.msg = msg
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _fmt(x):
+    return f"{x:.8f}".rstrip('0').rstrip('.') if x else "0"
+
+
+# ────────────────────────────────────────────────────────────────
+#      Exchange state and matching
+# ────────────────────────────────────────────────────────────────
+class Exchange:
+    def __init__(self, symbols=None, balance=10000.0, volatility=0.0002):
+        self.symbols = dict(symbols or DEFAULT_SYMBOLS)
+        self.prices = {s: v[0] for s, v in self.symbols.items()}
+        self.volatility = volatility
+        self.wallet = balance
+        self.positions = {}     # symbol -> {"amt", "entry", "leverage", "margin_type"}
+        self.orders = {}        # orderId -> order dict (resting conditional/limit orders)
+        self.algo_orders = {}   # algoId -> algo order dict
+        self.trades = []
+        self.income = []
+        self.listeners = {"user": set(), "mark": set(), "depth": set()}
+        self.books = {}         # symbol -> {"bids", "asks": {price: qty}, "u": last update id}
+        self._ids = Counter()
+        self._lock = threading.RLock()
+
+    def _next_id(self, kind):
+        self._ids[kind] += 1
+        return self._ids[kind]
+
+    # ── streams ──────────────────────────────────────────────────
+    def _emit(self, channel, payload):
+        for q in list(self.listeners[channel]):
+            try:
+                q.put_nowait(payload)
+            except queue.Full:
+                pass
+
+    def _position(self, symbol):
+        return self.positions.setdefault(symbol, {"amt": 0.0, "entry": 0.0, "leverage": 20, "margin_type": "CROSSED"})
+
+    def _emit_account_update(self, symbol, reason="ORDER"):
+        pos = self._position(symbol)
+        mark = self.prices[symbol]
+        self._emit("user", {
+            "e": "ACCOUNT_UPDATE", "E": _now_ms(), "T": _now_ms(),
+            "a": {
+                "m": reason,
+                "B": [{"a": "USDT", "wb": _fmt(self.wallet), "cw": _fmt(self.wallet), "bc": "0"}],
+                "P": [{
+                    "s": symbol, "pa": _fmt(pos["amt"]), "ep": _fmt(pos["entry"]), "cr": "0",
+                    "up": _fmt((mark - pos["entry"]) * pos["amt"]), "mt": pos["margin_type"].lower(),
+                    "iw": "0", "ps": "BOTH"
+                }]
+            }
+        })
+
+    def _emit_order_update(self, order, status, last_qty=0.0, last_price=0.0):
+        self._emit("user", {
+            "e": "ORDER_TRADE_UPDATE", "E": _now_ms(), "T": _now_ms(),
+            "o": {
+                "s": order["symbol"], "c": order.get("clientOrderId", ""), "S": order["side"],
+                "o": order["type"], "f": "GTC", "q": _fmt(order["origQty"]), "p": _fmt(order.get("price", 0)),
+                "ap": _fmt(last_price), "sp": _fmt(order.get("stopPrice", 0)), "x": "TRADE" if last_qty else status,
+                "X": status, "i": order["orderId"], "l": _fmt(last_qty), "z": _fmt(last_qty),
+                "L": _fmt(last_price), "T": _now_ms(), "R": order.get("reduceOnly", False), "ps": "BOTH"
+            }
+        })
+
+    # ── order book ───────────────────────────────────────────────
+    def _levels(self, symbol):
+        """(bids, asks) {price: qty} around the mark; a level's size is a fixed hash of its price"""
+        mark = self.prices[symbol]
+        tick, step = float(self.symbols[symbol][1]), float(self.symbols[symbol][2])
+        base = BOOK_LEVEL_NOTIONAL / mark
+        top = int(mark / tick)
+
+        def size(k):
+            return max(step, round(base * (0.2 + 1.6 * (k * 2654435761 % 997) / 997) / step) * step)
+
+        bids = {round((top - i) * tick, 8): size(top - i) for i in range(BOOK_LEVELS)}
+        asks = {round((top + 1 + i) * tick, 8): size(top + 1 + i) for i in range(BOOK_LEVELS)}
+        return bids, asks
+
+    def _book(self, symbol):
+        book = self.books.get(symbol)
+        if book is None:
+            bids, asks = self._levels(symbol)
+            book = self.books[symbol] = {"bids": bids, "asks": asks, "u": random.randint(10**9, 2 * 10**9)}
+        return book
+
+    def depth_snapshot(self, symbol, limit):
+        with self._lock:
+            book = self._book(symbol)
+            return {
+                "lastUpdateId": book["u"], "E": _now_ms(), "T": _now_ms(),
+                "bids": [[_fmt(p), _fmt(q)] for p, q in sorted(book["bids"].items(), reverse=True)[:limit]],
+                "asks": [[_fmt(p), _fmt(q)] for p, q in sorted(book["asks"].items())[:limit]]
+            }
+
+    def depth_update(self, symbol):
+        """Diff of the tracked book against the current mark (depthUpdate event), or None"""
+        book = self._book(symbol)
+        bids, asks = self._levels(symbol)
+        changes = []
+        for old, new, key in ((book["bids"], bids, "b"), (book["asks"], asks, "a")):
+            changes.append([[_fmt(p), "0"] for p in old.keys() - new.keys()] +
+                           [[_fmt(p), _fmt(q)] for p, q in new.items() if old.get(p) != q])
+        if not changes[0] and not changes[1]:
+            return None
+        first, book["u"] = book["u"], book["u"] + len(changes[0]) + len(changes[1])
+        book["bids"], book["asks"] = bids, asks
+        now = _now_ms()
+        return {"e": "depthUpdate", "E": now, "T": now, "s": symbol, "U": first + 1, "u": book["u"],
+                "pu": first, "b": changes[0], "a": changes[1]}
+
+    def _sweep_price(self, symbol, side, qty):
+        """Average price of a market order taking qty from the book (beyond it: the last level)"""
+        bids, asks = self._levels(symbol)
+        levels = sorted(asks.items()) if side == "BUY" else sorted(bids.items(), reverse=True)
+        left, notional = qty, 0.0
+        for price, size in levels:
+            take = min(left, size)
+            notional += take * price
+            left -= take
+            if left <= 0:
+                break
+        return (notional + max(left, 0) * levels[-1][0]) / qty
+
+    # ── candles ──────────────────────────────────────────────────
+    def _path(self, symbol, t_ms):
+        """Deterministic price at t_ms: a few overlapping cycles around the start price"""
+        t = t_ms / 1000
+        swing = (0.05 * math.sin(2 * math.pi * t / (7 * 86400)) + 0.02 * math.sin(2 * math.pi * t / 86400)
+                 + 0.004 * math.sin(2 * math.pi * t / 3600))
+        return self.symbols[symbol][0] * math.exp(swing)
+
+    def klines(self, symbol, interval_ms, start_ms, end_ms, limit):
+        """Candles (kline rows) from start_ms; the last one may still be open"""
+        tick = float(self.symbols[symbol][1])
+        scale = 0.001 * math.sqrt(interval_ms / 60000)
+        first = start_ms - start_ms % interval_ms
+        if first < start_ms:
+            first += interval_ms
+        rows = []
+        for t in range(first, min(end_ms, _now_ms()) + 1, interval_ms):
+            rng = random.Random(f"{symbol}:{interval_ms}:{t}")
+            o, c = self._path(symbol, t), self._path(symbol, t + interval_ms)
+            h = max(o, c) * (1 + scale * rng.random())
+            lo = min(o, c) * (1 - scale * rng.random())
+            o, h, lo, c = (round(x / tick) * tick for x in (o, h, lo, c))
+            volume = rng.uniform(100, 1000) * 1000 / o
+            rows.append([t, _fmt(o), _fmt(h), _fmt(lo), _fmt(c), _fmt(volume), t + interval_ms - 1,
+                         _fmt(volume * c), rng.randint(100, 5000), _fmt(volume / 2), _fmt(volume * c / 2), "0"])
+            if len(rows) == limit:
+                break
+        return rows
+
+    # ── matching ─────────────────────────────────────────────────
+    def fill(self, symbol, side, qty, reduce_only=False, order=None):
+        """Market fill sweeping the simulated book; returns (filled_qty, avg price)"""
+        with self._lock:
+            pos = self._position(symbol)
+            price = self.prices[symbol]
+            signed = qty if side == "BUY" else -qty
+            if reduce_only:
+                if pos["amt"] == 0 or (pos["amt"] > 0) == (signed > 0):
+                    return 0.0, price
+                signed = max(-abs(pos["amt"]), min(abs(pos["amt"]), signed))
+                qty = abs(signed)
+            if qty <= 0:
+                return 0.0, price
+            price = self._sweep_price(symbol, side, qty)
+
+            realized = 0.0
+            amt = pos["amt"]
+            if amt == 0 or (amt > 0) == (signed > 0):
+                new_amt = amt + signed
+                pos["entry"] = (abs(amt) * pos["entry"] + qty * price) / abs(new_amt)
+            else:
+                closed = min(abs(amt), qty)
+                realized = (price - pos["entry"]) * closed * (1 if amt > 0 else -1)
+                new_amt = amt + signed
+                if new_amt != 0 and (new_amt > 0) != (amt > 0):
+                    pos["entry"] = price
+                elif new_amt == 0:
+                    pos["entry"] = 0.0
+            pos["amt"] = round(new_amt, 10)
+
+            commission = qty * price * COMMISSION_RATE
+            self.wallet += realized - commission
+            trade_id = self._next_id("trade")
+            now = _now_ms()
+            self.trades.append({
+                "symbol": symbol, "id": trade_id, "orderId": order["orderId"] if order else 0,
+                "side": side, "price": _fmt(price), "qty": _fmt(qty), "realizedPnl": _fmt(realized),
+                "quoteQty": _fmt(qty * price), "commission": _fmt(commission), "commissionAsset": "USDT",
+                "time": now, "positionSide": "BOTH", "buyer": side == "BUY", "maker": False
+            })
+            self.income.append({"symbol": symbol, "incomeType": "COMMISSION", "income": _fmt(-commission),
+                                "asset": "USDT", "time": now, "tranId": trade_id})
+            if realized:
+                self.income.append({"symbol": symbol, "incomeType": "REALIZED_PNL", "income": _fmt(realized),
+                                    "asset": "USDT", "time": now, "tranId": trade_id})
+            if order is not None:
+                self._emit_order_update(order, "FILLED", qty, price)
+            self._emit_account_update(symbol)
+            return qty, price
+
+    def _triggered(self, o, mark):
+        up = mark >= o["stopPrice"]
+        down = mark <= o["stopPrice"]
+        if o["type"].startswith("STOP"):
+            return down if o["side"] == "SELL" else up
+        return up if o["side"] == "SELL" else down
+
+    def tick(self):
+        """Random-walk every mark price and fire any triggered algo orders"""
+        with self._lock:
+            for s in self.prices:
+                self.prices[s] *= 1 + random.gauss(0, self.volatility)
+            for algo_id, o in list(self.algo_orders.items()):
+                if not self._triggered(o, self.prices[o["symbol"]]):
+                    continue
+                del self.algo_orders[algo_id]
+                pos = self._position(o["symbol"])
+                qty = abs(pos["amt"]) if o["closePosition"] else o["quantity"]
+                order = {"orderId": self._next_id("order"), "symbol": o["symbol"], "side": o["side"],
+                         "type": "MARKET", "origQty": qty}
+                self.fill(o["symbol"], o["side"], qty, reduce_only=True, order=order)
+                self._emit_algo_update(o, "TRIGGERED")
+
+    def mark_price_event(self):
+        now = _now_ms()
+        with self._lock:
+            return [{"e": "markPriceUpdate", "E": now, "s": s, "p": _fmt(p), "i": _fmt(p),
+                     "r": "0.00010000", "T": now + 3600000} for s, p in self.prices.items()]
+
+    def _emit_algo_update(self, o, status):
+        self._emit("user", {
+            "e": "ALGO_UPDATE", "E": _now_ms(), "T": _now_ms(),
+            "o": {
+                "aid": o["algoId"], "at": "CONDITIONAL", "o": o["type"], "s": o["symbol"], "S": o["side"],
+                "ps": "BOTH", "f": "GTC", "q": _fmt(o["quantity"]), "X": status, "tp": _fmt(o["stopPrice"]),
+                "p": "0", "wt": o["workingType"], "cp": o["closePosition"], "R": True
+            }
+        })
+
+    # ── views ────────────────────────────────────────────────────
+    def position_rows(self, symbol=None):
+        with self._lock:
+            rows = []
+            for s in ([symbol] if symbol else self.symbols):
+                pos = self._position(s)
+                mark = self.prices[s]
+                lev = pos["leverage"]
+                if pos["amt"] > 0:
+                    liq = pos["entry"] * (1 - 1 / lev)
+                elif pos["amt"] < 0:
+                    liq = pos["entry"] * (1 + 1 / lev)
+                else:
+                    liq = 0.0
+                rows.append({
+                    "symbol": s, "positionAmt": _fmt(pos["amt"]), "entryPrice": _fmt(pos["entry"]),
+                    "markPrice": _fmt(mark), "unRealizedProfit": _fmt((mark - pos["entry"]) * pos["amt"]),
+                    "liquidationPrice": _fmt(liq), "leverage": str(lev), "notional": _fmt(pos["amt"] * mark),
+                    "marginType": pos["margin_type"].lower(), "positionSide": "BOTH", "isolatedMargin": "0",
+                    "updateTime": _now_ms()
+                })
+            return rows
+
+    def account(self):
+        with self._lock:
+            margin = sum(abs(p["amt"] * p["entry"]) / p["leverage"] for p in self.positions.values())
+            upnl = sum((self.prices[s] - p["entry"]) * p["amt"] for s, p in self.positions.items())
+            return {
+                "totalWalletBalance": _fmt(self.wallet), "totalInitialMargin": _fmt(margin),
+                "totalUnrealizedProfit": _fmt(upnl), "totalMarginBalance": _fmt(self.wallet + upnl),
+                "availableBalance": _fmt(self.wallet - margin), "assets": [], "positions": []
+            }
+
+
+# ────────────────────────────────────────────────────────────────
+#      REST endpoints
+# ────────────────────────────────────────────────────────────────
+class Simulator:
+    """
+    latency_ms / jitter_ms   added to every REST response
+    error_rates              {-1021: p, -4120: p, 429: p} injection probabilities
+    api_secret               if set, signatures are verified (-1022 on mismatch)
+    clock_skew_ms            server clock minus local clock; signed calls outside
+                             [serverTime - recvWindow, serverTime + 1000) get -1021
+    """
+
+    def __init__(self, exchange=None, latency_ms=0, jitter_ms=0, error_rates=None, api_secret=None,
+                 tick_interval=0.25, clock_skew_ms=0):
+        self.exchange = exchange or Exchange()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rates = error_rates or {}
+        self.api_secret = api_secret
+        self.tick_interval = tick_interval
+        self.clock_skew_ms = clock_skew_ms
+        self.calls = Counter()
+        self.weight_used = 0
+        self.order_count = 0
+        self._minute = int(time.time() // 60)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.http_server = None
+        self.ws_server = None
+
+        self.routes = {
+            ("GET", "/api/v3/ping"): lambda p: {},
+            ("GET", "/fapi/v1/ping"): lambda p: {},
+            ("GET", "/fapi/v1/time"): lambda p: {"serverTime": self.server_time()},
+            ("GET", "/fapi/v1/exchangeInfo"): self.exchange_info,
+            ("GET", "/fapi/v1/account"): lambda p: self.exchange.account(),
+            ("GET", "/fapi/v2/account"): lambda p: self.exchange.account(),
+            ("GET", "/fapi/v3/account"): lambda p: self.exchange.account(),
+            ("GET", "/fapi/v2/positionRisk"): lambda p: self.exchange.position_rows(p.get("symbol")),
+            ("GET", "/fapi/v3/positionRisk"): lambda p: self.exchange.position_rows(p.get("symbol")),
+            ("GET", "/fapi/v1/ticker/price"): self.ticker_price,
+            ("GET", "/fapi/v2/ticker/price"): self.ticker_price,
+            ("GET", "/fapi/v1/premiumIndex"): self.premium_index,
+            ("GET", "/fapi/v1/depth"): self.depth,
+            ("GET", "/fapi/v1/klines"): self.klines,
+            ("GET", "/fapi/v1/openOrders"): self.open_orders,
+            ("POST", "/fapi/v1/order"): self.create_order,
+            ("POST", "/fapi/v1/batchOrders"): self.batch_orders,
+            ("DELETE", "/fapi/v1/order"): self.cancel_order,
+            ("DELETE", "/fapi/v1/allOpenOrders"): self.cancel_all,
+            ("POST", "/fapi/v1/leverage"): self.change_leverage,
+            ("POST", "/fapi/v1/marginType"): self.change_margin_type,
+            ("POST", "/fapi/v1/algoOrder"): self.create_algo_order,
+            ("DELETE", "/fapi/v1/algoOrder"): self.cancel_algo_order,
+            ("GET", "/fapi/v1/openAlgoOrders"): self.open_algo_orders,
+            ("GET", "/fapi/v1/userTrades"): self.user_trades,
+            ("GET", "/fapi/v1/income"): self.income,
+            ("POST", "/fapi/v1/listenKey"): lambda p: {"listenKey": "simulated-listen-key"},
+            ("PUT", "/fapi/v1/listenKey"): lambda p: {},
+            ("DELETE", "/fapi/v1/listenKey"): lambda p: {},
+        }
+
+    # ── handlers ─────────────────────────────────────────────────
+    def exchange_info(self, params):
+        symbols = []
+        for s, (_, tick, step) in self.exchange.symbols.items():
+            symbols.append({
+                "symbol": s, "status": "TRADING", "baseAsset": s[:-4], "quoteAsset": "USDT",
+                "contractType": "PERPETUAL",
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": tick, "minPrice": tick, "maxPrice": "1000000"},
+                    {"filterType": "LOT_SIZE", "stepSize": step, "minQty": step, "maxQty": "100000"},
+                    {"filterType": "MARKET_LOT_SIZE", "stepSize": step, "minQty": step, "maxQty": "100000"},
+                    {"filterType": "MIN_NOTIONAL", "notional": "5"},
+                ]
+            })
+        rate_limits = [
+            {"rateLimitType": "REQUEST_WEIGHT", "interval": "MINUTE", "intervalNum": 1, "limit": 2400},
+            {"rateLimitType": "ORDERS", "interval": "MINUTE", "intervalNum": 1, "limit": 1200},
+            {"rateLimitType": "ORDERS", "interval": "SECOND", "intervalNum": 10, "limit": 300},
+        ]
+        return {"timezone": "UTC", "serverTime": self.server_time(), "rateLimits": rate_limits, "symbols": symbols}
+
+    def _symbol(self, params):
+        symbol = params.get("symbol")
+        if symbol not in self.exchange.symbols:
+            raise ApiError(400, -1121, "Invalid symbol.")
+        return symbol
+
+    def ticker_price(self, params):
+        if "symbol" in params:
+            s = self._symbol(params)
+            return {"symbol": s, "price": _fmt(self.exchange.prices[s]), "time": _now_ms()}
+        return [{"symbol": s, "price": _fmt(p), "time": _now_ms()} for s, p in self.exchange.prices.items()]
+
+    def premium_index(self, params):
+        s = self._symbol(params)
+        return {"symbol": s, "markPrice": _fmt(self.exchange.prices[s]), "indexPrice": _fmt(self.exchange.prices[s]),
+                "lastFundingRate": "0.0001", "time": _now_ms()}
+
+    def depth(self, params):
+        return self.exchange.depth_snapshot(self._symbol(params), int(params.get("limit", 500)))
+
+    def klines(self, params):
+        symbol = self._symbol(params)
+        interval_ms = KLINE_INTERVALS.get(params.get("interval"))
+        if interval_ms is None:
+            raise ApiError(400, -1120, "Invalid interval.")
+        limit = min(int(params.get("limit", 500)), 1500)
+        end_ms = int(params.get("endTime", _now_ms()))
+        start_ms = int(params.get("startTime", end_ms - end_ms % interval_ms - (limit - 1) * interval_ms))
+        return self.exchange.klines(symbol, interval_ms, start_ms, end_ms, limit)
+
+    def _order_view(self, o):
+        return {
+            "symbol": o["symbol"], "orderId": o["orderId"], "clientOrderId": o.get("clientOrderId", ""),
+            "type": o["type"], "side": o["side"], "price": _fmt(o.get("price", 0)),
+            "stopPrice": _fmt(o.get("stopPrice", 0)), "origQty": _fmt(o["origQty"]), "executedQty": "0",
+            "status": "NEW", "reduceOnly": o.get("reduceOnly", False), "positionSide": "BOTH",
+            "time": o.get("time", _now_ms()), "updateTime": _now_ms()
+        }
+
+    def open_orders(self, params):
+        symbol = params.get("symbol")
+        return [self._order_view(o) for o in self.exchange.orders.values() if symbol in (None, o["symbol"])]
+
+    def create_order(self, params):
+        ex = self.exchange
+        symbol = self._symbol(params)
+        order_type = params.get("type", "MARKET")
+        if order_type in CONDITIONAL_TYPES:
+            raise ApiError(400, -4120, "Order type not supported for this endpoint. Please use the Algo Order API endpoints instead.")
+        side = params["side"]
+        qty = float(params.get("quantity", 0))
+        if qty <= 0:
+            raise ApiError(400, -4003, "Quantity less than or equal to zero.")
+        reduce_only = str(params.get("reduceOnly", "false")).lower() == "true"
+        order = {"orderId": ex._next_id("order"), "symbol": symbol, "side": side, "type": order_type,
+                 "origQty": qty, "price": float(params.get("price", 0) or 0), "reduceOnly": reduce_only,
+                 "clientOrderId": params.get("newClientOrderId", ""), "time": _now_ms()}
+
+        if order_type == "LIMIT":
+            with ex._lock:
+                ex.orders[order["orderId"]] = order
+            ex._emit_order_update(order, "NEW")
+            return self._order_view(order)
+
+        filled, price = ex.fill(symbol, side, qty, reduce_only=reduce_only, order=order)
+        view = self._order_view(order)
+        view.update({"status": "FILLED" if filled else "EXPIRED", "executedQty": _fmt(filled),
+                     "avgPrice": _fmt(price if filled else 0), "cumQuote": _fmt(filled * price)})
+        return view
+
+    def batch_orders(self, params):
+        raw = params.get("batchOrders", "[]")
+        orders = json.loads(unquote(raw) if raw.startswith("%") else raw)
+        if not 0 < len(orders) <= 5:
+            raise ApiError(400, -1102, "Param 'batchOrders' must contain 1 to 5 orders.")
+        results = []
+        for o in orders:
+            try:
+                results.append(self.create_order(o))
+            except ApiError as e:
+                results.append({"code": e.code, "msg": e.msg})
+        return results
+
+    def cancel_order(self, params):
+        order = self.exchange.orders.pop(int(params.get("orderId", 0)), None)
+        if order is None:
+            raise ApiError(400, -2011, "Unknown order sent.")
+        self.exchange._emit_order_update(order, "CANCELED")
+        view = self._order_view(order)
+        view["status"] = "CANCELED"
+        return view
+
+    def cancel_all(self, params):
+        symbol = self._symbol(params)
+        ex = self.exchange
+        with ex._lock:
+            for oid in [i for i, o in ex.orders.items() if o["symbol"] == symbol]:
+                ex._emit_order_update(ex.orders.pop(oid), "CANCELED")
+        return {"code": 200, "msg": "The operation of cancel all open order is done."}
+
+    def change_leverage(self, params):
+        symbol = self._symbol(params)
+        self.exchange._position(symbol)["leverage"] = int(params["leverage"])
+        self.exchange._emit("user", {"e": "ACCOUNT_CONFIG_UPDATE", "E": _now_ms(), "T": _now_ms(),
+                                     "ac": {"s": symbol, "l": int(params["leverage"])}})
+        return {"symbol": symbol, "leverage": int(params["leverage"]), "maxNotionalValue": "1000000"}
+
+    def change_margin_type(self, params):
+        symbol = self._symbol(params)
+        pos = self.exchange._position(symbol)
+        if pos["margin_type"] == params["marginType"]:
+            raise ApiError(400, -4046, "No need to change margin type.")
+        pos["margin_type"] = params["marginType"]
+        return {"code": 200, "msg": "success"}
+
+    def create_algo_order(self, params):
+        ex = self.exchange
+        symbol = self._symbol(params)
+        o = {
+            "algoId": ex._next_id("algo"), "symbol": symbol, "side": params["side"],
+            "type": params.get("type") or params.get("orderType"),
+            "stopPrice": float(params.get("stopPrice") or params.get("triggerPrice") or 0),
+            "quantity": float(params.get("quantity", 0) or 0),
+            "closePosition": str(params.get("closePosition", "false")).lower() == "true",
+            "workingType": params.get("workingType", "MARK_PRICE"), "time": _now_ms()
+        }
+        if o["stopPrice"] <= 0:
+            raise ApiError(400, -1102, "Mandatory parameter 'stopPrice' was not sent.")
+        with ex._lock:
+            ex.algo_orders[o["algoId"]] = o
+        ex._emit_algo_update(o, "NEW")
+        return {"algoId": o["algoId"], "status": "NEW", "symbol": symbol}
+
+    def cancel_algo_order(self, params):
+        o = self.exchange.algo_orders.pop(int(params.get("algoId", 0)), None)
+        if o is None:
+            raise ApiError(400, -2011, "Unknown order sent.")
+        self.exchange._emit_algo_update(o, "CANCELED")
+        return {"algoId": o["algoId"], "status": "CANCELED"}
+
+    def open_algo_orders(self, params):
+        symbol = params.get("symbol")
+        return [{
+            "algoId": o["algoId"], "symbol": o["symbol"], "side": o["side"], "orderType": o["type"],
+            "triggerPrice": _fmt(o["stopPrice"]), "quantity": _fmt(o["quantity"]),
+            "closePosition": o["closePosition"], "algoStatus": "NEW", "createTime": o["time"]
+        } for o in list(self.exchange.algo_orders.values()) if symbol in (None, o["symbol"])]
+
+    def user_trades(self, params):
+        symbol = self._symbol(params)
+        limit = int(params.get("limit", 500))
+        rows = [t for t in self.exchange.trades if t["symbol"] == symbol]
+        if "fromId" in params:
+            return [t for t in rows if t["id"] >= int(params["fromId"])][:limit]
+        end = int(params.get("endTime", _now_ms()))
+        start = int(params.get("startTime", end - 7 * 86400000))
+        if end - start > 7 * 86400000:
+            raise ApiError(400, -4166, "The time between startTime and endTime cannot be longer than 7 days.")
+        rows = [t for t in rows if start <= t["time"] <= end]
+        return rows[:limit] if "startTime" in params else rows[-limit:]
+
+    def income(self, params):
+        rows = self.exchange.income
+        if "incomeType" in params:
+            rows = [r for r in rows if r["incomeType"] == params["incomeType"]]
+        if "startTime" in params:
+            rows = [r for r in rows if r["time"] >= int(params["startTime"])]
+        return rows[:int(params.get("limit", 100))]
+
+    # ── request pipeline ─────────────────────────────────────────
+    def _verify_signature(self, raw_query, body):
+        total = raw_query + body if raw_query and body else (raw_query or body)
+        payload, _, signature = total.rpartition("&signature=")
+        expected = hmac.new(self.api_secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
+        if signature != expected:
+            raise ApiError(400, -1022, "Signature for this request is not valid.")
+
+    def _account_usage(self, key, params):
+        with self._lock:
+            minute = int(time.time() // 60)
+            if minute != self._minute:
+                self._minute, self.weight_used, self.order_count = minute, 0, 0
+            weight = WEIGHTS.get(key, 1)
+            if key == ("GET", "/fapi/v1/openOrders") and "symbol" in params:
+                weight = 1
+            self.weight_used += weight
+            if key in ORDER_ENDPOINTS:
+                self.order_count += 1
+            self.calls[f"{key[0]} {key[1]}"] += 1
+            return self.weight_used, self.order_count
+
+    def server_time(self):
+        return _now_ms() + self.clock_skew_ms
+
+    def _timestamp_ok(self, params):
+        """Binance's rule: timestamp < serverTime + 1000 and serverTime - timestamp <= recvWindow"""
+        now = self.server_time()
+        timestamp = int(params.get("timestamp", 0))
+        return timestamp < now + 1000 and now - timestamp <= int(params.get("recvWindow", 5000))
+
+    def handle(self, method, raw_path, body):
+        """Returns (status, payload, headers)"""
+        url = urlsplit(raw_path)
+        params = dict(parse_qsl(url.query))
+        params.update(dict(parse_qsl(body)))
+        key = (method, url.path)
+
+        if self.latency_ms or self.jitter_ms:
+            time.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+        weight, orders = self._account_usage(key, params)
+        headers = {"X-MBX-USED-WEIGHT-1M": str(weight)}
+        if key in ORDER_ENDPOINTS:
+            headers["X-MBX-ORDER-COUNT-1M"] = str(orders)
+
+        try:
+            if key not in self.routes:
+                raise ApiError(404, -5000, f"Path {url.path} not simulated.")
+            if random.random() < self.error_rates.get(429, 0):
+                raise ApiError(429, -1003, "Too many requests; current limit is 2400 request weight per 1 MINUTE.")
+            if "signature" in params:
+                if random.random() < self.error_rates.get(-1021, 0) or not self._timestamp_ok(params):
+                    raise ApiError(400, -1021, "Timestamp for this request is outside of the recvWindow.")
+                if self.api_secret:
+                    self._verify_signature(url.query, body)
+            if key in ORDER_ENDPOINTS and random.random() < self.error_rates.get(-4120, 0):
+                raise ApiError(400, -4120, "Order type not supported for this endpoint. Please use the Algo Order API endpoints instead.")
+            return 200, self.routes[key](params), headers
+        except ApiError as e:
+            if e.status == 429:
+                headers["Retry-After"] = "1"
+            return e.status, {"code": e.code, "msg": e.msg}, headers
+
+    # ── servers ──────────────────────────────────────────────────
+    def _ws_depth(self, ws):
+        """Combined /stream connection: SUBSCRIBE {"params": ["btcusdt@depth@100ms"]}, then diffs"""
+        subscribed = set()
+        q = queue.Queue(maxsize=1000)
+        self.exchange.listeners["depth"].add(q)
+        try:
+            while not self._stop.is_set():
+                try:
+                    request = json.loads(ws.recv(timeout=0))
+                    symbols = {name.split("@")[0].upper() for name in request.get("params", [])}
+                    if request.get("method") == "SUBSCRIBE":
+                        with self.exchange._lock:
+                            for symbol in symbols & set(self.exchange.symbols):
+                                self.exchange._book(symbol)
+                        subscribed |= symbols
+                    elif request.get("method") == "UNSUBSCRIBE":
+                        subscribed -= symbols
+                    ws.send(json.dumps({"result": None, "id": request.get("id")}))
+                except TimeoutError:
+                    pass
+                try:
+                    event = q.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                if event["s"] in subscribed:
+                    ws.send(json.dumps({"stream": f"{event['s'].lower()}@depth@100ms", "data": event}))
+        except ConnectionClosed:
+            pass
+        finally:
+            self.exchange.listeners["depth"].discard(q)
+
+    def _ws_handler(self, ws):
+        path = ws.request.path
+        if path.startswith("/stream"):
+            return self._ws_depth(ws)
+        channel = "mark" if "markPrice" in path else "user"
+        q = queue.Queue(maxsize=1000)
+        self.exchange.listeners[channel].add(q)
+        try:
+            while not self._stop.is_set():
+                try:
+                    ws.send(json.dumps(q.get(timeout=0.5)))
+                except queue.Empty:
+                    continue
+        except ConnectionClosed:
+            pass
+        finally:
+            self.exchange.listeners[channel].discard(q)
+
+    def _tick_loop(self):
+        last_mark = 0
+        while not self._stop.wait(self.tick_interval):
+            self.exchange.tick()
+            with self.exchange._lock:
+                updates = [self.exchange.depth_update(s) for s in list(self.exchange.books)]
+            for event in filter(None, updates):
+                self.exchange._emit("depth", event)
+            if time.time() - last_mark >= 1:
+                self.exchange._emit("mark", self.exchange.mark_price_event())
+                last_mark = time.time()
+
+    def start(self, host="127.0.0.1", port=0, ws_port=0):
+        sim = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                status, payload, headers = sim.handle(self.command, self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 128   # default 5 drops bursts of concurrent connects (1 s SYN retry)
+
+        self.http_server = Server((host, port), Handler)
+        self.http_server.daemon_threads = True
+        self.ws_server = serve(self._ws_handler, host, ws_port)
+        threading.Thread(target=self.http_server.serve_forever, name="sim-http", daemon=True).start()
+        threading.Thread(target=self.ws_server.serve_forever, name="sim-ws", daemon=True).start()
+        threading.Thread(target=self._tick_loop, name="sim-tick", daemon=True).start()
+        return self
+
+    @property
+    def rest_url(self):
+        host, port = self.http_server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def ws_url(self):
+        host, port = self.ws_server.socket.getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    def stop(self):
+        self._stop.set()
+        if self.http_server:
+            self.http_server.shutdown()
+        if self.ws_server:
+            self.ws_server.shutdown()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local Binance USDT-M Futures simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ws-port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--err-1021", type=float, default=0, help="probability of -1021 on signed calls")
+    parser.add_argument("--err-4120", type=float, default=0, help="probability of -4120 on order calls")
+    parser.add_argument("--err-429", type=float, default=0, help="probability of HTTP 429")
+    parser.add_argument("--secret", default=None, help="verify signatures with this API secret")
+    parser.add_argument("--clock-skew-ms", type=int, default=0, help="server clock minus local clock")
+    args = parser.parse_args()
+
+    sim = Simulator(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, api_secret=args.secret,
+        error_rates={-1021: args.err_1021, -4120: args.err_4120, 429: args.err_429},
+        clock_skew_ms=args.clock_skew_ms
+    ).start(args.host, args.port, args.ws_port)
+    print(f"REST  {sim.rest_url}\nWS    {sim.ws_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sim.stop()
@@ -0,0 +1,119 @@
+# sizing.py
+# Vectorized position sizing for a whole watchlist: the same formula as
+# logic.calculate_position_sizing plus the same lot-step / tick rounding as
+# logic._round_qty / _round_price, evaluated as NumPy column operations.
+
+import numpy as np
+
+import config
+
+SL_PERCENT = "SL % Movement"
+SL_BUFFER_PERCENT = 0.2   # fee/slippage allowance added to the SL distance
+MAX_LEVERAGE = 125
+DEFAULT_LEVERAGE = 10     # when no SL is given
+DEFAULT_STEP = 0.001
+MAX_BATCH = 1000          # rows per /sizing/batch request
+STEP_EPSILON = 1e-9       # float slack when flooring to a whole number of steps
+
+
+def _round_decimals(values, precision):
+    """Round each value to its own number of decimals"""
+    scale = 10.0 ** precision
+    return np.round(values * scale) / scale
+
+
+def round_qty(qty, step, precision):
+    """Vectorized logic._round_qty: floor to the lot step, never below one step"""
+    step = np.where(step > 0, step, DEFAULT_STEP)
+    floored = _round_decimals(np.floor(qty / step + STEP_EPSILON) * step, precision)
+    rounded = np.where(step >= 1, np.maximum(1.0, np.trunc(qty)), floored)
+    return np.where(rounded > 0, rounded, step)
+
+
+def round_price(price, tick, precision):
+    """
+    Vectorized logic._round_price: floor to the tick (tick 0 = unchanged,
+    NaN / None = no PRICE_FILTER, rounded to 2 decimals)
+    """
+    tick = np.asarray(tick, dtype=float)
+    safe_tick = np.where(tick > 0, tick, 1.0)
+    floored = _round_decimals(np.floor(price / safe_tick + STEP_EPSILON) * safe_tick, precision)
+    return np.where(np.isnan(tick), np.round(price, 2),
+                    np.where(tick <= 0, price, np.where(tick >= 1, np.trunc(price), floored)))
+
+
+def position_sizing(unutilized_margin, entry, sl_is_percent, sl_value):
+    """
+    Columns in (entry, sl_is_percent, sl_value), columns out. Rows with an
+    invalid entry or zero SL distance are flagged in "error" (0 = ok,
+    1 = invalid entry, 2 = invalid SL distance) and their sizes are 0.
+    """
+    entry = np.asarray(entry, dtype=float)
+    sl_value = np.asarray(sl_value, dtype=float)
+    sl_is_percent = np.asarray(sl_is_percent, dtype=bool)
+
+    risk_amount = unutilized_margin * (config.MAX_RISK_PERCENT / 100)
+    valid_entry = entry > 0
+    safe_entry = np.where(valid_entry, entry, 1.0)
+
+    has_sl = sl_value > 0
+    sl_distance = np.where(sl_is_percent, safe_entry * (sl_value / 100), np.abs(safe_entry - sl_value))
+    sl_percent = np.where(sl_is_percent, sl_value, sl_distance / safe_entry * 100)
+
+    buffered = sl_percent + SL_BUFFER_PERCENT
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sl_leverage = np.minimum(np.floor(100 / buffered), MAX_LEVERAGE)
+        sl_units = (risk_amount / buffered) * 100 / safe_entry
+
+    leverage = np.where(has_sl, sl_leverage, DEFAULT_LEVERAGE)
+    units = np.where(has_sl, sl_units, risk_amount / safe_entry)
+
+    error = np.where(~valid_entry, 1, np.where(has_sl & (sl_distance <= 0), 2, 0))
+    ok = error == 0
+    return {
+        "units": np.where(ok, np.round(units, 6), 0.0),
+        "leverage": np.where(ok, leverage, 0).astype(int),
+        "risk_amount": round(risk_amount, 2),
+        "sl_percent": np.where(ok & has_sl, sl_percent, 0.0),
+        "notional": np.where(ok, units * safe_entry, 0.0),
+        "error": error
+    }
+
+
+def stop_prices(entry, sl_is_percent, sl_value, is_long):
+    """SL trigger price per row: percent SLs are applied to the entry in the trade direction"""
+    entry = np.asarray(entry, dtype=float)
+    sl_value = np.asarray(sl_value, dtype=float)
+    direction = np.where(is_long, -1.0, 1.0)
+    return np.where(sl_is_percent, entry * (1 + direction * sl_value / 100), sl_value)
+
+
+def _column(data, name, n, default):
+    value = data.get(name, default)
+    if not isinstance(value, list):
+        return [value] * n
+    if len(value) != n:
+        raise ValueError(f"{name} must have one value per symbol ({n})")
+    return value
+
+
+def request_columns(data):
+    """
+    /sizing/batch JSON -> (symbols, entries, sl_types, sl_values, sides).
+    Every field but "symbols" may be a list (one per symbol) or a single
+    value for all rows; a missing/0 entry means "use the live price".
+    Raises ValueError on malformed input.
+    """
+    symbols = data.get("symbols")
+    if not isinstance(symbols, list) or not symbols:
+        raise ValueError("symbols must be a non-empty list")
+    if len(symbols) > MAX_BATCH:
+        raise ValueError(f"At most {MAX_BATCH} symbols per batch")
+
+    n = len(symbols)
+    symbols = [str(s).upper() for s in symbols]
+    entries = [float(e or 0) for e in _column(data, "entries", n, 0)]
+    sl_types = _column(data, "sl_types", n, SL_PERCENT)
+    sl_values = [float(v or 0) for v in _column(data, "sl_values", n, 0)]
+    sides = [str(s).upper() for s in _column(data, "sides", n, "LONG")]
+    return symbols, entries, sl_types, sl_values, sides
@@ -0,0 +1,17 @@
+# Tests import the flat modules from the repository root. config reads the
+# environment once at import, so point the databases and kline files at a
+# scratch directory before anything imports it.
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_scratch = tempfile.mkdtemp(prefix="trading-tests-")
+os.environ.setdefault("BINANCE_API_KEY", "test")
+os.environ.setdefault("BINANCE_API_SECRET", "test")
+os.environ.setdefault("TRADE_DB_PATH", os.path.join(_scratch, "trades.db"))
+os.environ.setdefault("KLINE_DIR", os.path.join(_scratch, "klines"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,176 @@
+import threading
+
+import pytest
+
+import account_state
+from account_state import AccountState
+
+WALLET = 1000.0
+
+
+def position(symbol, amt, entry, **extra):
+    return {"symbol": symbol, "positionAmt": str(amt), "entryPrice": str(entry), "markPrice": str(entry),
+            "unRealizedProfit": "0", "liquidationPrice": "0", "notional": str(amt * entry),
+            "positionSide": "BOTH", **extra}
+
+
+def account_update(symbol, amt, entry, wallet=WALLET):
+    return {"e": "ACCOUNT_UPDATE", "a": {
+        "B": [{"a": "USDT", "wb": str(wallet)}],
+        "P": [{"s": symbol, "pa": str(amt), "ep": str(entry), "up": "0", "ps": "BOTH"}]}}
+
+
+def order_update(symbol, order_id, status, order_type="LIMIT", price=100.0, qty=1.0, reduce_only=False, stop=0.0):
+    return {"e": "ORDER_TRADE_UPDATE", "o": {
+        "s": symbol, "i": order_id, "o": order_type, "S": "BUY", "p": str(price), "sp": str(stop),
+        "q": str(qty), "X": status, "R": reduce_only}}
+
+
+def algo_update(symbol, algo_id, status, **fields):
+    payload = {"s": symbol, "aid": algo_id, "X": status, "o": "STOP_MARKET", "S": "SELL", "tp": "90", "q": "0"}
+    payload.update(fields)
+    return {"e": "ALGO_UPDATE", "o": {k: v for k, v in payload.items() if v is not None}}
+
+
+def leverage_update(symbol, leverage):
+    return {"e": "ACCOUNT_CONFIG_UPDATE", "ac": {"s": symbol, "l": leverage}}
+
+
+@pytest.fixture
+def state():
+    snapshot = {
+        "positions": [position("BTCUSDT", 0.5, 60000, leverage="20"),
+                      position("ETHUSDT", -2, 3000, initialMargin="600", notional="-6000")],   # v3 row
+        "orders": {"BTCUSDT": [{"orderId": 7, "type": "STOP_MARKET", "side": "SELL", "price": 55000.0,
+                                "origQty": 0.0, "status": "NEW", "algo": True}]},
+        "balance": (WALLET, 2100.0),
+    }
+    state = AccountState(client=None, seed=lambda client: snapshot, refresh_algo_orders=lambda: {})
+    state.reseed()
+    return state
+
+
+def margin(state):
+    return state.get_balance()[1]
+
+
+def test_seed_reads_leverage_from_both_row_formats(state):
+    assert state.leverage == {"BTCUSDT": 20, "ETHUSDT": 10}
+    assert state.get_position("ETHUSDT")["leverage"] == "10"
+    assert state.get_orders_by_symbol()["BTCUSDT"][0]["orderId"] == 7
+
+
+def test_account_update_moves_position_and_margin(state):
+    state.handle_event(account_update("BTCUSDT", 1.0, 61000, wallet=1200))
+    row = state.get_position("BTCUSDT")
+    assert row["positionAmt"] == "1.0" and row["entryPrice"] == "61000"
+    assert state.get_balance()[0] == 1200.0
+    assert margin(state) == pytest.approx(61000 / 20 + 6000 / 10)
+    state.handle_event(account_update("BTCUSDT", 0, 0))
+    assert state.get_position("BTCUSDT") is None
+    assert [p["symbol"] for p in state.get_positions()] == ["ETHUSDT"]
+
+
+def test_leverage_seen_before_the_position_is_used(state):
+    state.handle_event(leverage_update("SOLUSDT", 5))
+    state.handle_event(account_update("SOLUSDT", 10, 150))
+    assert state.get_position("SOLUSDT")["leverage"] == "5"
+    assert not state._reseed_due
+    assert margin(state) == pytest.approx(30000 / 20 + 6000 / 10 + 1500 / 5)
+
+
+def test_unknown_leverage_asks_for_a_reseed(state):
+    state.handle_event(account_update("XRPUSDT", 100, 0.5))
+    assert state._reseed_due
+    assert state.get_position("XRPUSDT")["leverage"] == "1"
+
+
+def test_leverage_change_reprices_margin(state):
+    state.handle_event(leverage_update("BTCUSDT", 50))
+    assert state.get_position("BTCUSDT")["leverage"] == "50"
+    assert margin(state) == pytest.approx(30000 / 50 + 6000 / 10)
+
+
+def test_order_updates_track_resting_orders_and_their_margin(state):
+    base = margin(state)
+    state.handle_event(order_update("BTCUSDT", 1, "NEW", price=58000, qty=0.2))
+    state.handle_event(order_update("BTCUSDT", 2, "NEW", price=65000, qty=0.5, reduce_only=True))
+    state.handle_event(order_update("BTCUSDT", 3, "NEW", order_type="STOP_MARKET", price=0, stop=57000))
+    orders = {o["orderId"]: o for o in state.get_orders_by_symbol()["BTCUSDT"]}
+    assert set(orders) == {1, 2, 3, 7}
+    assert orders[3]["price"] == 57000.0
+    assert margin(state) == pytest.approx(base + 58000 * 0.2 / 20)   # reduce-only and stops hold none
+    state.handle_event(order_update("BTCUSDT", 1, "PARTIALLY_FILLED", price=58000, qty=0.2))
+    assert 1 in {o["orderId"] for o in state.get_orders_by_symbol()["BTCUSDT"]}
+    state.handle_event(order_update("BTCUSDT", 1, "FILLED", price=58000, qty=0.2))
+    assert 1 not in {o["orderId"] for o in state.get_orders_by_symbol()["BTCUSDT"]}
+    assert margin(state) == pytest.approx(base)
+
+
+def test_algo_updates_apply_locally(state):
+    state.handle_event(algo_update("BTCUSDT", 8, "NEW", o="TAKE_PROFIT_MARKET", tp="70000", q="0.25"))
+    algo = {o["orderId"]: o for o in state.get_orders_by_symbol()["BTCUSDT"] if o.get("algo")}
+    assert algo[8]["price"] == 70000.0 and algo[8]["origQty"] == 0.25
+    state.handle_event(algo_update("BTCUSDT", 7, "TRIGGERING", S=None))   # status only: keeps the order
+    state.handle_event(algo_update("BTCUSDT", 8, "CANCELED"))
+    algo = {o["orderId"] for o in state.get_orders_by_symbol()["BTCUSDT"] if o.get("algo")}
+    assert algo == {7}
+    assert state._algo_refresh is None
+
+
+def test_unappliable_algo_update_refreshes_once_off_thread(state, monkeypatch):
+    monkeypatch.setattr(account_state, "ALGO_REFRESH_DELAY", 0.05)
+    calls = []
+    done = threading.Event()
+
+    def refresh():
+        calls.append(threading.current_thread().name)
+        done.set()
+        return {"ETHUSDT": [{"orderId": 9, "type": "STOP_MARKET", "price": 3300.0, "algo": True}]}
+
+    state.refresh_algo_orders = refresh
+    state.handle_event(algo_update("BTCUSDT", 99, "NEW", S=None))   # unknown order, no side: cannot apply
+    state.handle_event({"e": "ALGO_UPDATE", "o": {"X": "NEW"}})
+    assert done.wait(5)
+    state._algo_refresh.join(5)
+    assert len(calls) == 1 and calls[0] != threading.current_thread().name
+    assert state.get_orders_by_symbol() == {"ETHUSDT": [{"orderId": 9, "type": "STOP_MARKET",
+                                                         "price": 3300.0, "algo": True}]}
+
+
+def test_readers_get_copies(state):
+    state.get_positions()[0]["positionAmt"] = "999"
+    state.get_orders_by_symbol()["BTCUSDT"][0]["price"] = 1.0
+    assert state.get_position("BTCUSDT")["positionAmt"] == "0.5"
+    assert state.get_orders_by_symbol()["BTCUSDT"][0]["price"] == 55000.0
+
+
+def test_readers_run_alongside_the_stream(state):
+    stop = threading.Event()
+    errors = []
+
+    def stream():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            state.handle_event(account_update(f"S{i % 50}USDT", 1 + i % 3, 10))
+            state.handle_event(order_update(f"S{i % 50}USDT", i, "NEW" if i % 2 else "CANCELED"))
+
+    writer = threading.Thread(target=stream)
+    writer.start()
+    try:
+        for _ in range(2000):
+            try:
+                state.get_positions()
+                state.get_orders_by_symbol()
+            except Exception as e:   # e.g. dictionary changed size during iteration
+                errors.append(e)
+    finally:
+        stop.set()
+        writer.join(5)
+    assert errors == []
+
+
+def test_listen_key_expiry_ends_the_connection(state):
+    with pytest.raises(ConnectionError):
+        state.handle_event({"e": "listenKeyExpired"})
@@ -0,0 +1,34 @@
+import numpy as np
+
+from backtest import first_hits
+
+
+def naive_first_hits(rows, levels):
+    out = np.full(levels.shape, rows.shape[1])
+    for t in range(rows.shape[0]):
+        for p in range(levels.shape[1]):
+            reached = np.nonzero(rows[t] >= levels[t, p])[0]
+            if len(reached):
+                out[t, p] = reached[0]
+    return out
+
+
+def test_first_hits_matches_a_scan():
+    rng = np.random.default_rng(11)
+    rows = np.maximum.accumulate(rng.uniform(0, 5, (200, 48)), axis=1)
+    levels = rng.uniform(-1, 6, (200, 3))
+    assert np.array_equal(first_hits(rows, levels), naive_first_hits(rows, levels))
+
+
+def test_first_hits_edges():
+    rows = np.array([[1.0, 2.0, 2.0, 3.0],
+                     [0.0, 0.0, 0.0, 0.0]])
+    levels = np.array([[2.0, 3.5, 0.5],
+                       [0.0, 1e-9, -4.0]])
+    assert first_hits(rows, levels).tolist() == [[1, 4, 0], [0, 4, 0]]
+
+
+def test_first_hits_large_prices_do_not_bleed_across_rows():
+    rows = np.array([[65000.0, 65010.0], [10.0, 70000.0]])
+    levels = np.array([[65020.0], [65005.0]])
+    assert first_hits(rows, levels).tolist() == [[2], [1]]
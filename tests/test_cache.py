@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import types
+
+import pytest
+
+import cache
+from cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+class Loader:
+    """Counts calls; optionally blocks until released"""
+
+    def __init__(self, value="v", gate=None):
+        self.value = value
+        self.gate = gate
+        self.calls = 0
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return f"{self.value}{self.calls}"
+
+
+def test_hit_until_expiry(clock):
+    c = TTLCache("test-expiry", ttl=10)
+    load = Loader()
+    assert c.get_or_load("k", load) == "v1"
+    clock.now += 9.9
+    assert c.get_or_load("k", load) == "v1"
+    clock.now += 0.2
+    assert c.get("k") is None
+    assert c.peek("k") == "v1"
+    assert c.get_or_load("k", load) == "v2"
+    assert load.calls == 2
+    assert c.stats()["hits"] == 1
+
+
+def test_per_key_ttl(clock):
+    c = TTLCache("test-key-ttl", ttl=10)
+    c.set("short", 1, ttl=1)
+    c.set("long", 2)
+    clock.now += 5
+    assert c.get("short") is None
+    assert c.get("long") == 2
+
+
+def test_concurrent_misses_make_one_load(clock):
+    c = TTLCache("test-single-flight", ttl=10)
+    gate = threading.Event()
+    load = Loader(gate=gate)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(c.get_or_load("k", load))) for _ in range(8)]
+    threads[0].start()
+    assert load.started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    while c.stats()["coalesced"] < 7:
+        threading.Event().wait(0.001)
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert load.calls == 1
+    assert results == ["v1"] * 8
+
+
+def test_loader_errors_reach_every_waiter_and_are_not_cached(clock):
+    c = TTLCache("test-errors", ttl=10)
+
+    def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        c.get_or_load("k", failing)
+    assert c.stats()["errors"] == 1
+    assert c.get_or_load("k", Loader()) == "v1"
+
+
+def test_stale_while_revalidate(clock):
+    c = TTLCache("test-swr", ttl=10, stale_ttl=5)
+    load = Loader()
+    assert c.get_or_load("k", load) == "v1"
+    clock.now += 12
+    gate = threading.Event()
+    slow = Loader(value="new", gate=gate)
+    assert c.get_or_load("k", slow) == "v1"   # stale value served at once
+    assert c.get_or_load("k", slow) == "v1"   # only one background reload
+    gate.set()
+    for _ in range(500):
+        if c.peek("k") == "new1":
+            break
+        threading.Event().wait(0.01)
+    assert c.get_or_load("k", slow) == "new1"
+    assert slow.calls == 1
+    assert c.stats()["stale_hits"] == 2
+
+
+def test_past_the_stale_window_is_a_miss(clock):
+    c = TTLCache("test-swr-expired", ttl=10, stale_ttl=5)
+    load = Loader()
+    c.get_or_load("k", load)
+    clock.now += 16
+    assert c.get_or_load("k", load) == "v2"
+    assert c.stats()["stale_hits"] == 0
+
+
+def test_lru_eviction(clock):
+    c = TTLCache("test-lru", ttl=10, maxsize=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1   # a is now the most recent
+    c.set("c", 3)
+    assert c.peek("b") is None
+    assert c.peek("a") == 1 and c.peek("c") == 3
+    assert c.stats()["evictions"] == 1
+
+
+def test_invalidate(clock):
+    c = TTLCache("test-invalidate", ttl=10)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.invalidate("a")
+    assert c.peek("a") is None and c.peek("b") == 2
+    c.invalidate()
+    assert c.stats()["size"] == 0
+
+
+def test_async_concurrent_misses_make_one_load(clock):
+    c = TTLCache("test-async", ttl=10)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "v"
+
+    async def main():
+        return await asyncio.gather(*(c.get_or_load_async("k", loader) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["v"] * 5
+    assert len(calls) == 1
+    assert c.stats()["coalesced"] == 4
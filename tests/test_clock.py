@@ -0,0 +1,189 @@
+import asyncio
+import json
+import types
+
+import pytest
+from binance.exceptions import BinanceAPIException
+
+import clock
+import config
+from clock import AsyncClockedClientMixin, ClockedClientMixin, ClockTracker
+
+
+def tracker_with(samples):
+    """Tracker whose bursts take (offset, rtt) samples from a list; an Exception entry fails that sample"""
+    tracker = ClockTracker(transport=None)
+    samples = iter(samples)
+
+    def sample():
+        s = next(samples)
+        if isinstance(s, Exception):
+            raise s
+        return s
+
+    tracker._sample = sample
+    return tracker
+
+
+@pytest.fixture(autouse=True)
+def burst(monkeypatch):
+    monkeypatch.setattr(config, "CLOCK_SYNC_BURST", 3)
+    monkeypatch.setattr(config, "CLOCK_SMOOTHING", 0.5)
+    monkeypatch.setattr(config, "CLOCK_STEP_MS", 250)
+
+
+def test_sample_offset_is_taken_at_the_midpoint(monkeypatch):
+    times = iter([100.0, 100.2])   # 200 ms round trip
+    monkeypatch.setattr(clock, "time", types.SimpleNamespace(time=lambda: next(times)))
+    response = types.SimpleNamespace(json=lambda: {"serverTime": 100_600})
+    tracker = ClockTracker(types.SimpleNamespace(request=lambda method, path: response))
+    offset, rtt = tracker._sample()
+    assert offset == pytest.approx(500)
+    assert rtt == pytest.approx(200)
+
+
+def test_first_sync_steps_to_the_lowest_rtt_sample():
+    tracker = tracker_with([(40.0, 30.0), (10.0, 5.0), (90.0, 50.0)])
+    assert tracker.sync()
+    assert tracker.offset == 10.0
+    assert tracker.rtt == 5.0
+    assert tracker.steps == 1
+
+
+def test_small_moves_are_smoothed():
+    tracker = tracker_with([(100.0, 5.0)] * 3 + [(200.0, 5.0)] * 3 + [(200.0, 5.0)] * 3)
+    tracker.sync()
+    tracker.sync()
+    assert tracker.offset == pytest.approx(150.0)
+    tracker.sync()
+    assert tracker.offset == pytest.approx(175.0)
+    assert tracker.steps == 1
+
+
+def test_large_jumps_step_at_once():
+    tracker = tracker_with([(0.0, 5.0)] * 3 + [(-1000.0, 5.0)] * 3)
+    tracker.sync()
+    tracker.sync()
+    assert tracker.offset == -1000.0
+    assert tracker.steps == 2
+
+
+def test_failed_burst_keeps_the_estimate():
+    tracker = tracker_with([(100.0, 5.0)] * 3 + [OSError("down")] * 3)
+    tracker.sync()
+    assert not tracker.sync()
+    assert tracker.offset == 100.0
+    assert tracker.errors == 1
+
+
+def test_partly_failed_burst_uses_what_it_got():
+    tracker = tracker_with([OSError("down"), (70.0, 9.0), OSError("down")])
+    assert tracker.sync()
+    assert tracker.offset == 70.0
+
+
+def test_resync_skips_when_a_burst_finished_after_the_call_was_signed():
+    tracker = tracker_with([(100.0, 5.0)] * 3 + [(300.0, 5.0)] * 3)
+    tracker.sync()
+    tracker.resync(signed_at=tracker.synced_at - 1)
+    assert tracker.syncs == 1
+    tracker.resync(signed_at=tracker.synced_at + 1)
+    assert tracker.syncs == 2
+    assert tracker.offset == pytest.approx(200.0)   # smoothed: under CLOCK_STEP_MS
+
+
+def timestamp_error():
+    return BinanceAPIException(None, 400, json.dumps({"code": -1021, "msg": "Timestamp outside recvWindow"}))
+
+
+class FakeBase:
+    """Stands in for python-binance: records each call's data and fails as scripted"""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.calls = []
+
+    def _request(self, method, uri, signed, force_params=False, **kwargs):
+        data = kwargs.get("data")
+        self.calls.append(dict(data) if data is not None else None)
+        if data is not None:
+            data["signature"] = "signed"   # python-binance signs the dict in place
+        if self.failures:
+            raise self.failures.pop(0)
+        return {"ok": True}
+
+
+class FakeClient(ClockedClientMixin, FakeBase):
+    pass
+
+
+class AsyncFakeBase(FakeBase):
+    async def _request(self, method, uri, signed, force_params=False, **kwargs):
+        return FakeBase._request(self, method, uri, signed, force_params, **kwargs)
+
+
+class AsyncFakeClient(AsyncClockedClientMixin, AsyncFakeBase):
+    pass
+
+
+@pytest.fixture
+def resyncs(monkeypatch):
+    calls = []
+    monkeypatch.setattr(clock, "resync", calls.append)
+    return calls
+
+
+URI = "https://fapi.binance.com/fapi/v1/order"
+
+
+def test_signed_calls_carry_recv_window(resyncs):
+    client = FakeClient()
+    assert client._request("post", URI, True, data={"symbol": "BTCUSDT"}) == {"ok": True}
+    assert client.calls == [{"symbol": "BTCUSDT", "recvWindow": config.RECV_WINDOW}]
+
+
+def test_unsigned_calls_are_untouched(resyncs):
+    client = FakeClient()
+    client._request("get", URI, False)
+    assert client.calls == [None]
+
+
+def test_timestamp_error_resyncs_and_retries_once(resyncs):
+    client = FakeClient(failures=[timestamp_error()])
+    assert client._request("post", URI, True, data={"symbol": "BTCUSDT"}) == {"ok": True}
+    assert len(resyncs) == 1
+    assert len(client.calls) == 2
+    assert client.calls[1] == client.calls[0]   # re-signed from the unsigned data
+
+
+def test_second_timestamp_error_is_raised(resyncs):
+    client = FakeClient(failures=[timestamp_error(), timestamp_error()])
+    with pytest.raises(BinanceAPIException):
+        client._request("post", URI, True, data={})
+    assert len(client.calls) == 2
+
+
+def test_other_errors_are_not_retried(resyncs):
+    error = BinanceAPIException(None, 400, json.dumps({"code": -2019, "msg": "Margin is insufficient."}))
+    client = FakeClient(failures=[error])
+    with pytest.raises(BinanceAPIException):
+        client._request("post", URI, True, data={})
+    assert resyncs == []
+    assert len(client.calls) == 1
+
+
+def test_async_timestamp_error_resyncs_and_retries_once(resyncs):
+    client = AsyncFakeClient(failures=[timestamp_error()])
+    result = asyncio.run(client._request("post", URI, True, data={"symbol": "BTCUSDT"}))
+    assert result == {"ok": True}
+    assert len(resyncs) == 1
+    assert client.calls[1] == {"symbol": "BTCUSDT", "recvWindow": config.RECV_WINDOW}
+
+
+def test_clients_read_the_shared_offset(monkeypatch):
+    monkeypatch.setattr(clock, "_tracker", tracker_with([(1234.4, 5.0)] * 3))
+    clock._tracker.sync()
+    client = FakeClient()
+    client.timestamp_offset = 0   # ignored: the tracker owns it
+    assert client.timestamp_offset == 1234
+    assert AsyncFakeClient().timestamp_offset == 1234
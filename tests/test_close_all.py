@@ -0,0 +1,144 @@
+import threading
+
+import pytest
+
+import logic
+
+POSITIONS = {
+    "BTCUSDT": "0.5", "ETHUSDT": "-2.0", "SOLUSDT": "10", "XRPUSDT": "-100",
+    "BNBUSDT": "1.25", "ADAUSDT": "-300", "DOGEUSDT": "1000",
+}
+
+
+class StubClient:
+    """Positions, batchOrders and cancel-all; rejects closes and cancels as told"""
+
+    def __init__(self, reject_close=(), fail_cancel=()):
+        self.reject_close = set(reject_close)
+        self.fail_cancel = set(fail_cancel)
+        self.lock = threading.Lock()
+        self.batches = []
+        self.cancelled = []
+
+    def futures_position_information(self):
+        rows = [{"symbol": s, "positionAmt": amt} for s, amt in POSITIONS.items()]
+        return rows + [{"symbol": "LTCUSDT", "positionAmt": "0"}]
+
+    def futures_place_batch_order(self, batchOrders):
+        with self.lock:
+            self.batches.append(batchOrders)
+        return [{"code": -2022, "msg": "ReduceOnly Order is rejected."} if o["symbol"] in self.reject_close
+                else {"orderId": i, "status": "FILLED", "executedQty": o["quantity"], "avgPrice": "1"}
+                for i, o in enumerate(batchOrders)]
+
+    def futures_cancel_all_open_orders(self, symbol):
+        if symbol in self.fail_cancel:
+            raise RuntimeError(f"cancel failed for {symbol}")
+        with self.lock:
+            self.cancelled.append(symbol)
+
+
+@pytest.fixture
+def algo_cancels(monkeypatch):
+    """Every symbol has one SL algo order, id = its position in POSITIONS; id 3 fails to cancel"""
+    algo = {s: [{"orderId": i, "algo": True}, {"orderId": 100 + i, "type": "LIMIT"}]
+            for i, s in enumerate(POSITIONS)}
+    cancelled = []
+
+    def cancel(algo_id, transport=None):
+        if algo_id == 3:
+            raise RuntimeError("Unknown algo order")
+        cancelled.append(algo_id)
+
+    monkeypatch.setattr(logic, "get_account_state", lambda: None)
+    monkeypatch.setattr(logic, "_refresh_algo_orders", lambda: algo)
+    monkeypatch.setattr(logic, "cancel_algo_order", cancel)
+    return cancelled
+
+
+def run(monkeypatch, client):
+    monkeypatch.setattr(logic, "get_client", lambda: client)
+    return logic.close_all_positions()
+
+
+def test_every_position_gets_a_reduce_only_close(monkeypatch, algo_cancels):
+    client = StubClient()
+    result = run(monkeypatch, client)
+    assert result["success"]
+    assert sorted(len(b) for b in client.batches) == [2, 5]
+    sent = {o["symbol"]: o for b in client.batches for o in b}
+    assert set(sent) == set(POSITIONS)
+    for symbol, amt in POSITIONS.items():
+        order = sent[symbol]
+        assert order["reduceOnly"] == "true" and order["type"] == "MARKET"
+        assert order["side"] == ("SELL" if float(amt) > 0 else "BUY")
+        assert order["quantity"] == amt.lstrip("-")
+    assert sorted(client.cancelled) == sorted(POSITIONS)
+    assert sorted(algo_cancels) == [0, 1, 2, 4, 5, 6]   # plain orders go through cancel-all
+
+
+def test_cancel_failures_do_not_stop_the_closes(monkeypatch, algo_cancels):
+    client = StubClient(fail_cancel={"ETHUSDT", "DOGEUSDT"})
+    result = run(monkeypatch, client)
+    assert result["success"]
+    assert [r["symbol"] for r in result["results"]] == list(POSITIONS)
+    by_symbol = {r["symbol"]: r for r in result["results"]}
+    assert all(r["success"] for r in by_symbol.values())
+    assert by_symbol["ETHUSDT"]["cancel_errors"] == ["cancel failed for ETHUSDT"]
+    assert by_symbol["XRPUSDT"]["cancel_errors"] == ["Unknown algo order"]   # algo id 3
+    assert by_symbol["XRPUSDT"]["algo_cancelled"] == 0
+    assert by_symbol["BTCUSDT"]["algo_cancelled"] == 1
+    assert "cancel_errors" not in by_symbol["BTCUSDT"]
+
+
+def test_rejected_close_keeps_its_orders(monkeypatch, algo_cancels):
+    client = StubClient(reject_close={"SOLUSDT"})
+    result = run(monkeypatch, client)
+    assert not result["success"]
+    assert result["message"].endswith("Closed 6/7 positions")
+    sol = next(r for r in result["results"] if r["symbol"] == "SOLUSDT")
+    assert sol["code"] == -2022
+    assert "SOLUSDT" not in client.cancelled
+    assert 2 not in algo_cancels
+
+
+def test_algo_listing_failure_still_closes(monkeypatch, algo_cancels):
+    def failing():
+        raise RuntimeError("openAlgoOrders timed out")
+
+    monkeypatch.setattr(logic, "_refresh_algo_orders", failing)
+    client = StubClient()
+    result = run(monkeypatch, client)
+    assert result["success"]
+    assert sorted(client.cancelled) == sorted(POSITIONS)
+    assert algo_cancels == []
+
+
+def test_positions_and_orders_come_from_the_live_store(monkeypatch, algo_cancels):
+    class State:
+        def get_positions(self):
+            return [{"symbol": "BTCUSDT", "positionAmt": "-0.2"}]
+
+        def get_orders_by_symbol(self):
+            return {"BTCUSDT": [{"orderId": 5, "algo": True}]}
+
+    class NoRest(StubClient):
+        def futures_position_information(self):
+            raise AssertionError("positions should come from the store")
+
+    monkeypatch.setattr(logic, "get_account_state", lambda: State())
+    client = NoRest()
+    result = run(monkeypatch, client)
+    assert result["success"]
+    assert client.batches == [[{"symbol": "BTCUSDT", "side": "BUY", "type": "MARKET", "quantity": "0.2",
+                                "reduceOnly": "true", "newOrderRespType": "RESULT"}]]
+    assert algo_cancels == [5]
+
+
+def test_nothing_to_close(monkeypatch, algo_cancels):
+    class Flat(StubClient):
+        def futures_position_information(self):
+            return []
+
+    result = run(monkeypatch, Flat())
+    assert result["success"] and result["results"] == []
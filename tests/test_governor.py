@@ -0,0 +1,112 @@
+import pytest
+
+import config
+import governor
+from governor import (ORDER, READ, Governor, RateLimitExceeded, TokenBucket, order_priority, request_cost,
+                      submit_in_context)
+
+
+def test_bucket_capacity_and_rate_include_headroom():
+    bucket = TokenBucket(60, 2400)
+    assert bucket.capacity == pytest.approx(2400 * config.RATE_LIMIT_HEADROOM)
+    assert bucket.rate == pytest.approx(bucket.capacity / 60)
+    assert bucket.tokens == bucket.capacity
+
+
+def test_bucket_refills_continuously_up_to_capacity():
+    bucket = TokenBucket(10, 100)
+    bucket.tokens, bucket.updated = 0.0, 1000.0
+    bucket.refill(1005.0)
+    assert bucket.tokens == pytest.approx(bucket.capacity / 2)
+    bucket.refill(1100.0)
+    assert bucket.tokens == bucket.capacity
+
+
+def test_bucket_wait_time_respects_floor():
+    bucket = TokenBucket(10, 100)   # capacity 90, 9 tokens/s
+    bucket.tokens = 10.0
+    assert bucket.wait_time(10, 0) == 0.0
+    assert bucket.wait_time(19, 0) == pytest.approx(1.0)
+    assert bucket.wait_time(10, 18) == pytest.approx(2.0)
+
+
+def test_bucket_observe_trusts_the_exchange_count():
+    bucket = TokenBucket(60, 1000)
+    bucket.observe(300, 5.0)
+    assert bucket.tokens == pytest.approx(bucket.capacity - 300)
+    assert bucket.exchange_used == 300
+    assert bucket.updated == 5.0
+    bucket.observe(5000, 6.0)
+    assert bucket.tokens == 0.0
+
+
+def test_request_cost():
+    assert request_cost("POST", "/fapi/v1/order") == (0, 1)
+    assert request_cost("POST", "/fapi/v1/batchOrders", {"batchOrders": [{}, {}, {}]}) == (5, 3)
+    assert request_cost("GET", "/fapi/v1/openOrders", {"symbol": "BTCUSDT"}) == (1, 0)
+    assert request_cost("GET", "/fapi/v1/openOrders") == (40, 0)
+    assert request_cost("GET", "/fapi/v1/depth", {"limit": 1000}) == (20, 0)
+    assert request_cost("GET", "/fapi/v1/klines", {"limit": 1000}) == (5, 0)
+    assert request_cost("GET", "/fapi/v1/time") == (1, 0)
+
+
+def test_acquire_deducts_from_the_right_buckets():
+    gov = Governor()
+    weight = gov.buckets[("REQUEST_WEIGHT", 60)]
+    orders = gov.buckets[("ORDERS", 10)]
+    gov.acquire("GET", "/fapi/v2/account")
+    assert weight.tokens == pytest.approx(weight.capacity - 5, abs=0.5)
+    gov.acquire("POST", "/fapi/v1/order")
+    assert orders.tokens == pytest.approx(orders.capacity - 1, abs=0.5)
+    assert gov.granted == {ORDER: 1, READ: 1}
+
+
+def test_reads_stop_at_the_order_reserve(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_MAX_WAIT", 0.05)
+    gov = Governor()
+    weight = gov.buckets[("REQUEST_WEIGHT", 60)]
+    gov.record_headers(200, {"X-MBX-USED-WEIGHT-1M": str(int(weight.capacity * 0.85))})
+    with pytest.raises(RateLimitExceeded):
+        gov.acquire("GET", "/fapi/v1/income")
+    assert gov.rejected[READ] == 1
+    gov.acquire("POST", "/fapi/v1/batchOrders", {"batchOrders": [{}]})   # orders may use the reserve
+    assert gov.granted[ORDER] == 1
+
+
+def test_429_backs_off_every_call(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_MAX_WAIT", 0.05)
+    gov = Governor()
+    gov.record_headers(429, {"Retry-After": "2"})
+    assert gov.throttled == 1
+    with pytest.raises(RateLimitExceeded):
+        gov.acquire("POST", "/fapi/v1/order")
+    assert gov.snapshot()["backoff_seconds"] > 1
+
+
+def test_order_counts_are_per_account():
+    gov = Governor()
+    gov.acquire("POST", "/fapi/v1/order", account="sub1")
+    shared = gov.buckets[("ORDERS", 10)]
+    own = gov.account_buckets["sub1"][("ORDERS", 10)]
+    assert own is not shared
+    assert shared.tokens == pytest.approx(shared.capacity, abs=0.5)
+    assert own.tokens == pytest.approx(own.capacity - 1, abs=0.5)
+    assert gov.account_buckets["sub1"][("REQUEST_WEIGHT", 60)] is gov.buckets[("REQUEST_WEIGHT", 60)]
+
+
+def test_configure_adopts_exchange_limits():
+    gov = Governor()
+    gov.configure([{"rateLimitType": "REQUEST_WEIGHT", "interval": "MINUTE", "intervalNum": 1, "limit": 6000}])
+    assert gov.buckets[("REQUEST_WEIGHT", 60)].limit == 6000
+
+
+def test_order_priority_reaches_pool_workers_only_through_submit_in_context():
+    from concurrent.futures import ThreadPoolExecutor
+
+    def urgent():
+        return governor._urgent.get()
+
+    with ThreadPoolExecutor(max_workers=1) as pool, order_priority():
+        assert urgent()
+        assert not pool.submit(urgent).result()
+        assert submit_in_context(pool, urgent).result()
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+
+import kline_store
+from kline_store import ATR_WINDOW_PERIODS, Series, atr
+
+
+def wilder_atr(high, low, close, period):
+    """Textbook recursive form: seed with the mean of the first period true ranges"""
+    tr = [max(h - l, abs(h - c), abs(l - c)) for h, l, c in zip(high[1:], low[1:], close[:-1])]
+    value = sum(tr[:period]) / period
+    for x in tr[period:]:
+        value = (value * (period - 1) + x) / period
+    return value
+
+
+def random_bars(rng, n, start=100.0):
+    close = start * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    spread = close * rng.uniform(0.001, 0.02, n)
+    return close + spread * rng.uniform(0, 1, n), close - spread * rng.uniform(0, 1, n), close
+
+
+def test_atr_matches_recursive_wilder():
+    rng = np.random.default_rng(7)
+    period = 14
+    window = period * ATR_WINDOW_PERIODS + 1
+    rows = [random_bars(rng, window, start) for start in (100.0, 0.05, 65000.0)]
+    high, low, close = (np.array(col) for col in zip(*rows))
+    values = atr(high, low, close, period)
+    for i, (h, l, c) in enumerate(rows):
+        assert values[i] == pytest.approx(wilder_atr(h, l, c, period), rel=1e-3)
+
+
+def test_atr_left_padding_and_short_history():
+    rng = np.random.default_rng(3)
+    period, window = 5, 60
+    full = random_bars(rng, window)
+    short = random_bars(rng, 4)
+    high, low, close = (np.full((2, window), np.nan) for _ in range(3))
+    for i, bars in enumerate((full, short)):
+        n = len(bars[0])
+        high[i, -n:], low[i, -n:], close[i, -n:] = bars
+    values = atr(high, low, close, period)
+    assert values[0] == pytest.approx(wilder_atr(*full, period), rel=1e-3)
+    assert np.isnan(values[1])
+
+
+def klines(start, n, step=60000):
+    return [[start + i * step, str(1 + i), str(2 + i), str(i), str(1.5 + i), "10"] for i in range(n)]
+
+
+def test_series_append_tail_and_reopen(tmp_path):
+    series = Series(str(tmp_path), "BTCUSDT", "1m")
+    assert len(series) == 0
+    assert series.first_open_time() is None
+    series.append(klines(0, 5))
+    series.append(klines(300000, 3))
+    assert len(series) == 8
+    assert series.last_open_time() == 420000
+
+    tail = series.tail(3, ("open_time", "close"))
+    assert list(tail["open_time"]) == [300000, 360000, 420000]
+    assert list(tail["close"]) == [1.5, 2.5, 3.5]
+    assert len(series.tail(100)["open"]) == 8
+
+    reopened = Series(str(tmp_path), "BTCUSDT", "1m")
+    assert len(reopened) == 8
+    assert reopened.first_open_time() == 0
+    assert list(reopened.read(("high",))["high"]) == [2, 3, 4, 5, 6, 2, 3, 4]
+
+
+def test_series_repairs_a_torn_append(tmp_path):
+    series = Series(str(tmp_path), "ETHUSDT", "1h")
+    series.append(klines(0, 4))
+    with open(os.path.join(series.path, "close.bin"), "ab") as f:   # row without its open_time
+        f.write(np.float64(9.0).tobytes())
+    repaired = Series(str(tmp_path), "ETHUSDT", "1h")
+    assert len(repaired) == 4
+    assert os.path.getsize(os.path.join(series.path, "close.bin")) == 4 * kline_store.DTYPES["close"].itemsize
+    assert repaired.last_open_time() == 180000
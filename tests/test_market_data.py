@@ -0,0 +1,47 @@
+import json
+import threading
+import time
+
+import pytest
+from websockets.sync.server import serve
+
+from market_data import MarkPriceStream
+
+
+@pytest.fixture
+def server():
+    def replay(ws):
+        ws.send(json.dumps([
+            {"e": "markPriceUpdate", "E": int(time.time() * 1000), "s": "BTCUSDT", "p": "65000.10"},
+            {"e": "markPriceUpdate", "E": int(time.time() * 1000), "s": "ETHUSDT", "p": "3200.50"},
+        ]))
+        ws.recv()   # hold the connection until the client leaves
+
+    server = serve(replay, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"ws://127.0.0.1:{server.socket.getsockname()[1]}"
+    server.shutdown()
+
+
+def test_stream_fills_the_price_table_and_calls_listeners(server):
+    ticks = []
+    stream = MarkPriceStream(base_url=server, listeners=[ticks.append])
+    stream.start()
+    try:
+        deadline = time.time() + 5
+        while not ticks and time.time() < deadline:
+            time.sleep(0.01)
+        assert ticks == [{"BTCUSDT": 65000.10, "ETHUSDT": 3200.50}]
+        assert stream.get("BTCUSDT", 3) == 65000.10
+        assert stream.get("SOLUSDT", 3) is None
+    finally:
+        stream.stop()
+
+
+def test_stale_prices_are_not_served():
+    stream = MarkPriceStream(base_url="ws://127.0.0.1:1")
+    stream._handle(json.dumps({"stream": "!markPrice@arr@1s",
+                               "data": [{"e": "markPriceUpdate", "s": "BTCUSDT", "p": "1.5"}]}))
+    assert stream.get("BTCUSDT", 60) == 1.5
+    stream.prices["BTCUSDT"] = (1.5, time.time() - 120)
+    assert stream.get("BTCUSDT", 60) is None
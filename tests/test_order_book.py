@@ -0,0 +1,112 @@
+from order_book import OrderBook
+
+SNAPSHOT = {
+    "lastUpdateId": 100,
+    "bids": [["99.0", "2"], ["100.0", "1"], ["98.0", "0"]],
+    "asks": [["102.0", "2"], ["101.0", "1"]],
+}
+
+
+def diff(first, last, prev, bids=(), asks=()):
+    return {"e": "depthUpdate", "U": first, "u": last, "pu": prev, "b": list(bids), "a": list(asks)}
+
+
+def synced_book():
+    book = OrderBook("BTCUSDT")
+    assert book.load_snapshot(SNAPSHOT)
+    return book
+
+
+def test_snapshot_sorts_best_first_and_drops_empty_levels():
+    book = synced_book()
+    assert list(book.bids[0]) == [100.0, 99.0]
+    assert list(book.asks[0]) == [101.0, 102.0]
+    assert book.summary()["best_bid"] == 100.0
+    assert book.summary()["best_ask"] == 101.0
+
+
+def test_in_sequence_diffs_update_levels():
+    book = synced_book()
+    assert book.apply(diff(95, 105, 90, bids=[["100.0", "0"], ["100.5", "3"]]))
+    assert book.apply(diff(106, 110, 105, asks=[["101.0", "4"], ["103.0", "1"]]))
+    assert book.last_update_id == 110
+    assert list(book.bids[0]) == [100.5, 99.0]
+    assert list(book.bids[1]) == [3.0, 2.0]
+    assert list(book.asks[0]) == [101.0, 102.0, 103.0]
+    assert list(book.asks[2]) == [4.0, 6.0, 7.0]   # running cumulative size
+
+
+def test_diffs_before_the_snapshot_are_skipped():
+    book = synced_book()
+    assert book.apply(diff(80, 99, 79, bids=[["100.0", "9"]]))
+    assert book.last_update_id == 100
+    assert list(book.bids[1]) == [1.0, 2.0]
+
+
+def test_first_diff_must_reach_the_snapshot():
+    book = synced_book()
+    assert not book.apply(diff(102, 105, 101))
+    assert not book.synced
+    assert book.apply(diff(106, 108, 105))   # buffered until the next snapshot
+    assert [e["u"] for e in book._buffer] == [105, 108]
+
+
+def test_pu_gap_unsyncs_the_book():
+    book = synced_book()
+    assert book.apply(diff(95, 105, 90))
+    assert not book.apply(diff(108, 110, 107))
+    assert not book.synced
+    assert book.last_update_id == 105
+
+
+def test_buffered_diffs_replay_on_snapshot():
+    book = OrderBook("BTCUSDT")
+    assert book.apply(diff(90, 95, 89, bids=[["100.0", "7"]]))     # older than the snapshot
+    assert book.apply(diff(96, 104, 95, asks=[["101.0", "0"]]))
+    assert book.apply(diff(105, 107, 104, bids=[["100.0", "5"]]))
+    assert not book.synced
+    assert book.load_snapshot(SNAPSHOT)
+    assert book.synced
+    assert book.last_update_id == 107
+    assert list(book.asks[0]) == [102.0]
+    assert list(book.bids[1]) == [5.0, 2.0]
+
+
+def test_buffered_gap_fails_the_snapshot_and_keeps_the_gap_event():
+    book = OrderBook("BTCUSDT")
+    book.apply(diff(96, 104, 95))
+    book.apply(diff(110, 112, 109))
+    assert not book.load_snapshot(SNAPSHOT)
+    assert not book.synced
+    assert [e["u"] for e in book._buffer] == [112]
+
+
+def test_resync_after_gap():
+    book = synced_book()
+    assert book.apply(diff(95, 105, 90))
+    assert not book.apply(diff(108, 110, 107))
+    assert book.apply(diff(111, 115, 110, bids=[["100.0", "8"]]))
+    assert book.load_snapshot({"lastUpdateId": 112, "bids": [["100.0", "1"]], "asks": [["101.0", "1"]]})
+    assert book.synced
+    assert book.last_update_id == 115
+    assert list(book.bids[1]) == [8.0]
+
+
+def test_reset_drops_the_buffer():
+    book = synced_book()
+    book.reset()
+    assert not book.synced
+    assert book._buffer == []
+    assert not book.live(60)
+
+
+def test_estimate_walks_the_asks():
+    book = synced_book()
+    fill = book.estimate("BUY", 2)
+    assert fill["complete"]
+    assert fill["levels"] == 2
+    assert fill["avg_price"] == (101.0 + 102.0) / 2
+    assert fill["worst_price"] == 102.0
+    short = book.estimate("SELL", 5)
+    assert not short["complete"]
+    assert short["filled_qty"] == 3.0
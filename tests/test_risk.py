@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+import risk
+from risk import PortfolioRisk
+
+POSITIONS = [
+    {"symbol": "BTCUSDT", "positionAmt": "0.5", "entryPrice": "60000", "markPrice": "60000",
+     "leverage": "10", "liquidationPrice": "54000"},
+    {"symbol": "ETHUSDT", "positionAmt": "-2", "entryPrice": "3000", "markPrice": "3000",
+     "leverage": "5", "liquidationPrice": "3600"},
+]
+ORDERS = {"BTCUSDT": [{"type": "STOP_MARKET", "side": "SELL", "price": 58000.0}]}
+
+
+@pytest.fixture
+def engine():
+    engine = PortfolioRisk(shocks=[-0.1, 0.1])
+    engine.load(POSITIONS, ORDERS)
+    return engine
+
+
+def test_evaluate_is_cached_until_a_tick(engine):
+    first = engine.evaluate()
+    assert first["total_notional"] == 36000.0
+    assert engine.evaluate() is first
+    engine.on_marks({"BTCUSDT": 62000.0})
+    assert engine.evaluate()["total_notional"] == 37000.0
+    assert first["stop_loss"]["unprotected"] == ["ETHUSDT"]
+
+
+def test_a_tick_during_evaluation_is_not_hidden(engine, monkeypatch):
+    """A tick that lands while evaluate() computes must not be masked by its (stale) result"""
+    clock = {"calls": 0}
+    real = time.perf_counter
+
+    def perf_counter():
+        clock["calls"] += 1
+        if clock["calls"] == 2:   # evaluate() is past its snapshot, computing
+            engine.on_marks({"BTCUSDT": 70000.0})
+        return real()
+
+    monkeypatch.setattr(risk.time, "perf_counter", perf_counter)
+    stale = engine.evaluate()
+    assert stale["total_notional"] == 36000.0
+    monkeypatch.setattr(risk.time, "perf_counter", real)
+    assert engine.evaluate()["total_notional"] == 41000.0
+
+
+def test_a_load_during_evaluation_is_not_hidden(engine, monkeypatch):
+    clock = {"calls": 0}
+    real = time.perf_counter
+
+    def perf_counter():
+        clock["calls"] += 1
+        if clock["calls"] == 2:
+            engine.load(POSITIONS[:1], ORDERS)
+        return real()
+
+    monkeypatch.setattr(risk.time, "perf_counter", perf_counter)
+    assert engine.evaluate()["positions"] == 2
+    monkeypatch.setattr(risk.time, "perf_counter", real)
+    assert engine.evaluate()["positions"] == 1
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+import config
+import logic
+import sizing
+
+INDEX = logic._build_filter_index({"symbols": [
+    {"symbol": "BTCUSDT", "filters": [{"filterType": "LOT_SIZE", "stepSize": "0.001"},
+                                      {"filterType": "PRICE_FILTER", "tickSize": "0.10"}]},
+    {"symbol": "DOGEUSDT", "filters": [{"filterType": "LOT_SIZE", "stepSize": "1"},
+                                       {"filterType": "PRICE_FILTER", "tickSize": "0.00001"}]},
+    {"symbol": "BIGUSDT", "filters": [{"filterType": "LOT_SIZE", "stepSize": "0.1"},
+                                      {"filterType": "PRICE_FILTER", "tickSize": "5"}]},
+    {"symbol": "NOTICKUSDT", "filters": [{"filterType": "LOT_SIZE", "stepSize": "0.01"}]},
+]})
+SYMBOLS = list(INDEX) + ["MISSINGUSDT"]
+
+
+@pytest.fixture(autouse=True)
+def filters(monkeypatch):
+    monkeypatch.setattr(logic, "_filter_index", lambda: INDEX)
+    monkeypatch.setattr(config, "USE_ORDER_BOOK", False)
+
+
+def scalar_row(margin, symbol, entry, sl_type, sl_value, side):
+    """What the single-trade path gives for one row"""
+    result = logic.calculate_position_sizing(margin, entry, sl_type, sl_value)
+    if result["error"]:
+        return {"error": result["error"]}
+    info = INDEX.get(symbol)
+    row = {
+        "error": None,
+        "suggested_units": result["suggested_units"],
+        "max_leverage": result["max_leverage"],
+        "risk_amount": result["risk_amount"],
+        "qty": logic._round_qty(info, result["suggested_units"]),
+        "entry": logic._round_price(info, entry),
+    }
+    if sl_value > 0:
+        if sl_type == sizing.SL_PERCENT:
+            stop = entry * (1 - sl_value / 100) if side == "LONG" else entry * (1 + sl_value / 100)
+        else:
+            stop = sl_value
+        row["sl_price"] = logic._round_price(info, stop)
+    return row
+
+
+def assert_rows_match(margin, symbols, entries, sl_types, sl_values, sides):
+    rows = logic.calculate_position_sizing_batch(margin, symbols, entries, sl_types, sl_values, sides)
+    assert [r["symbol"] for r in rows] == symbols
+    for row, args in zip(rows, zip(symbols, entries, sl_types, sl_values, sides)):
+        expected = scalar_row(margin, *args)
+        assert row["error"] == expected["error"], args
+        if expected["error"]:
+            assert row["qty"] == 0 and row["suggested_units"] == 0
+            continue
+        for key, value in expected.items():
+            assert row[key] == pytest.approx(value, rel=1e-12, abs=1e-12), (key, args)
+
+
+def test_batch_matches_scalar_row_by_row():
+    rng = np.random.default_rng(5)
+    n = 400
+    symbols = [SYMBOLS[i] for i in rng.integers(0, len(SYMBOLS), n)]
+    entries = [float(np.round(x, 5)) for x in rng.uniform(0.05, 70000, n)]
+    sl_types = [sizing.SL_PERCENT if p else "SL Price" for p in rng.random(n) < 0.5]
+    sides = ["LONG" if p else "SHORT" for p in rng.random(n) < 0.5]
+    sl_values = []
+    for entry, sl_type, side in zip(entries, sl_types, sides):
+        pct = float(np.round(rng.uniform(0.1, 20), 2))
+        if sl_type == sizing.SL_PERCENT:
+            sl_values.append(pct)
+        else:
+            sl_values.append(entry * (1 - pct / 100) if side == "LONG" else entry * (1 + pct / 100))
+    assert_rows_match(2500.0, symbols, entries, sl_types, sl_values, sides)
+
+
+def test_edge_cases_match():
+    cases = [
+        ("BTCUSDT", 0.0, sizing.SL_PERCENT, 1.0, "LONG"),         # no entry
+        ("BTCUSDT", -5.0, sizing.SL_PERCENT, 1.0, "LONG"),        # negative entry
+        ("BTCUSDT", 65000.0, sizing.SL_PERCENT, 0.0, "LONG"),     # no SL: default leverage
+        ("BTCUSDT", 65000.0, "SL Price", 0.0, "SHORT"),
+        ("BTCUSDT", 65000.0, "SL Price", 65000.0, "LONG"),        # zero SL distance
+        ("MISSINGUSDT", 1.23456, sizing.SL_PERCENT, 2.0, "LONG"), # no symbol info
+        ("NOTICKUSDT", 3.14159, sizing.SL_PERCENT, 2.0, "SHORT"), # no PRICE_FILTER
+        ("DOGEUSDT", 0.12345, sizing.SL_PERCENT, 0.05, "LONG"),   # leverage capped at 125
+        ("BIGUSDT", 123457.0, "SL Price", 120000.0, "LONG"),      # tick >= 1
+        ("DOGEUSDT", 1e6, sizing.SL_PERCENT, 50.0, "LONG"),       # under one lot: one step
+    ]
+    assert_rows_match(1000.0, *(list(col) for col in zip(*cases)))
+
+
+def test_empty_margin_sizes_to_the_minimum():
+    assert_rows_match(0.0, ["BTCUSDT", "DOGEUSDT"], [65000.0, 0.1], [sizing.SL_PERCENT] * 2, [1.0, 1.0],
+                      ["LONG", "SHORT"])
+
+
+def test_request_columns_broadcasts_scalars():
+    symbols, entries, sl_types, sl_values, sides = sizing.request_columns(
+        {"symbols": ["btcusdt", "ethusdt"], "sl_values": 1.5, "entries": [100, None], "sides": "short"})
+    assert symbols == ["BTCUSDT", "ETHUSDT"]
+    assert entries == [100.0, 0.0]
+    assert sl_types == [sizing.SL_PERCENT] * 2
+    assert sl_values == [1.5, 1.5]
+    assert sides == ["SHORT", "SHORT"]
+
+
+@pytest.mark.parametrize("data", [{}, {"symbols": []}, {"symbols": ["A", "B"], "entries": [1]},
+                                  {"symbols": ["A"] * (sizing.MAX_BATCH + 1)}])
+def test_request_columns_rejects_bad_input(data):
+    with pytest.raises(ValueError):
+        sizing.request_columns(data)
@@ -0,0 +1,146 @@
+import pytest
+
+import logic
+import trade_limits
+
+SYMBOL = "BTCUSDT"
+INFO = logic._build_filter_index({"symbols": [{
+    "symbol": SYMBOL,
+    "baseAsset": "BTC",
+    "filters": [
+        {"filterType": "LOT_SIZE", "stepSize": "0.001"},
+        {"filterType": "PRICE_FILTER", "tickSize": "0.10"},
+    ],
+}]})[SYMBOL]
+
+
+class StubClient:
+    """Fills market orders at 100 and answers batchOrders per order"""
+
+    def __init__(self, reject=()):
+        self.reject = set(reject)   # batch positions (0-based, across calls) to reject
+        self.batches = []
+        self.orders = []
+
+    def futures_change_leverage(self, **params):
+        pass
+
+    def futures_change_margin_type(self, **params):
+        pass
+
+    def futures_create_order(self, **params):
+        self.orders.append(params)
+        return {"orderId": len(self.orders), "avgPrice": "100.0"}
+
+    def futures_place_batch_order(self, batchOrders):
+        start = sum(len(b) for b in self.batches)
+        self.batches.append(batchOrders)
+        return [{"code": -2022, "msg": "ReduceOnly Order is rejected."} if start + i in self.reject
+                else {"orderId": 1000 + start + i} for i in range(len(batchOrders))]
+
+
+@pytest.mark.parametrize("qty", [0.001, 0.01, 0.023, 0.1, 1.337, 7.0])
+@pytest.mark.parametrize("pcts", [(50, 50), (33, 33, 34), (10, 20, 30, 40), (25,) * 4, (12.5,) * 8])
+def test_full_ladder_adds_up_to_the_position(qty, pcts):
+    levels = [(101 + i, pct) for i, pct in enumerate(pcts)]
+    legs, runner = logic._ladder_legs(INFO, qty, levels)
+    assert runner == 0
+    assert sum(round(leg_qty / INFO["step"]) for _, _, leg_qty in legs) == round(qty / INFO["step"])
+    for _, _, leg_qty in legs:
+        assert leg_qty == round(leg_qty, INFO["qty_precision"])
+        assert leg_qty >= 0
+
+
+def test_partial_ladder_leaves_a_runner_in_whole_steps():
+    legs, runner = logic._ladder_legs(INFO, 0.023, [(101, 30), (102, 30)])
+    assert [leg_qty for _, _, leg_qty in legs] == [0.006, 0.006]
+    assert runner == 0.011
+
+
+def test_ladder_prices_round_to_the_tick():
+    legs, _ = logic._ladder_legs(INFO, 1, [(101.27, 50), (102.99, 50)])
+    assert [(name, price) for name, price, _ in legs] == [("TP1", 101.2), ("TP2", 102.9)]
+
+
+def test_legs_under_one_step_are_not_sent():
+    legs, _ = logic._ladder_legs(INFO, 0.002, [(101, 10), (102, 90)])
+    orders = logic._ladder_orders(SYMBOL, "SELL", INFO, legs)
+    assert [o["quantity"] for o in orders] == ["0.002"]
+    report = logic._ladder_report(legs, [{"orderId": 7}])
+    assert [leg["success"] for leg in report] == [False, True]
+
+
+@pytest.mark.parametrize("count, sizes", [(1, [1]), (5, [5]), (6, [5, 1]), (12, [5, 5, 2])])
+def test_batch_orders_split_in_fives(count, sizes):
+    client = StubClient(reject={5})
+    orders = [{"symbol": SYMBOL, "quantity": str(i)} for i in range(count)]
+    results = [r for f in logic.place_batch_orders(client, orders) for r in f.result()]
+    assert sorted(len(b) for b in client.batches) == sorted(sizes)
+    assert len(results) == count
+    if count > 5:
+        assert sum("orderId" not in r for r in results) == 1
+
+
+def test_batch_call_error_fails_every_order_in_it():
+    class Failing(StubClient):
+        def futures_place_batch_order(self, batchOrders):
+            raise RuntimeError("timeout")
+
+    results = logic._batch_call(Failing(), [{"a": "1"}, {"a": "2"}])
+    assert [r["msg"] for r in results] == ["timeout", "timeout"]
+
+
+@pytest.fixture
+def bracket(tmp_path, monkeypatch):
+    """execute_trade_action against a stub client and a fresh ledger"""
+    ledger = trade_limits.TradeLimitLedger(str(tmp_path / "trades.db"))
+    monkeypatch.setattr(trade_limits, "_ledger", ledger)
+    monkeypatch.setattr(logic, "get_symbol_info", lambda symbol: INFO)
+    monkeypatch.setattr(logic, "get_transport", lambda: None)
+    monkeypatch.setattr(logic, "_slippage_guard", lambda *args: None)
+    monkeypatch.setattr(logic, "get_live_price", lambda symbol: 100.0)
+    monkeypatch.setattr(logic.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(logic, "place_algo_order",
+                        lambda **params: {"success": True, "algoId": 1, "order": params})
+
+    def run(client, ladder, parallel=True):
+        monkeypatch.setattr(logic, "get_client", lambda: client)
+        return logic.execute_trade_action(
+            1000, SYMBOL, "LONG", 100, "MARKET", "SL % Movement", 1.0,
+            {"suggested_units": 0.1, "max_leverage": 10}, 0, 0, "ISOLATED",
+            0, 0, 0, parallel=parallel, tp_ladder=ladder)
+
+    run.ledger = ledger
+    return run
+
+
+@pytest.mark.parametrize("parallel", [True, False])
+def test_ladder_bracket_sends_every_leg(bracket, parallel):
+    client = StubClient()
+    levels = [(101 + i, 100 / 7) for i in range(7)]
+    result = bracket(client, levels, parallel)
+    assert result["success"] and not result.get("partial")
+    assert result["tp_landed"] == 7
+    assert sorted(len(b) for b in client.batches) == [2, 5]
+    sent = [o for b in client.batches for o in b]
+    assert sum(float(o["quantity"]) for o in sent) == pytest.approx(0.1)
+    assert all(o["reduceOnly"] == "true" and o["side"] == "SELL" for o in sent)
+    assert bracket.ledger.today_counts() == (1, {SYMBOL: 1})
+
+
+def test_ladder_with_no_leg_landed_keeps_the_limit_slot(bracket):
+    client = StubClient(reject=range(10))
+    result = bracket(client, [(101, 50), (102, 50)])
+    assert result["success"] and result["partial"]
+    assert result["tp_landed"] == 0
+    assert "TP ladder failed" in result["warning"]
+    assert bracket.ledger.today_counts() == (1, {SYMBOL: 1})
+
+
+def test_failed_stop_loss_releases_the_limit_slot(bracket, monkeypatch):
+    monkeypatch.setattr(logic, "place_algo_order", lambda **params: {"success": False, "error": "-2021"})
+    client = StubClient()
+    result = bracket(client, [(101, 100)])
+    assert not result["success"]
+    assert client.orders[-1]["type"] == "MARKET" and client.orders[-1]["side"] == "SELL"   # emergency close
+    assert bracket.ledger.today_counts() == (0, {})
@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+import config
+import trade_limits
+from trade_limits import TradeLimitLedger
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    day = {"value": "2026-03-01"}
+    monkeypatch.setattr(trade_limits, "today", lambda: day["value"])
+    monkeypatch.setattr(config, "MAX_TRADES_PER_DAY", 4)
+    monkeypatch.setattr(config, "MAX_TRADES_PER_SYMBOL_PER_DAY", 2)
+    ledger = TradeLimitLedger(str(tmp_path / "trades.db"))
+    ledger.day = day
+    return ledger
+
+
+def test_limits_apply_within_a_day(ledger):
+    assert ledger.reserve("BTCUSDT")[0]
+    assert ledger.reserve("BTCUSDT")[0]
+    allowed, message = ledger.reserve("BTCUSDT")
+    assert not allowed and "Symbol limit" in message
+    assert ledger.reserve("ETHUSDT")[0]
+    ledger.record("SOLUSDT")
+    allowed, message = ledger.reserve("XRPUSDT")
+    assert not allowed and "Daily limit" in message
+    assert ledger.today_counts() == (4, {"BTCUSDT": 2, "ETHUSDT": 1, "SOLUSDT": 1})
+
+
+def test_release_gives_the_slot_back(ledger):
+    ledger.reserve("BTCUSDT")
+    ledger.reserve("BTCUSDT")
+    ledger.release("BTCUSDT")
+    assert ledger.check("BTCUSDT")[0]
+    assert ledger.today_counts() == (1, {"BTCUSDT": 1})
+
+
+def test_counters_reset_when_the_day_rolls_over(ledger):
+    ledger.reserve("BTCUSDT")
+    ledger.reserve("BTCUSDT")
+    assert not ledger.check("BTCUSDT")[0]
+    ledger.day["value"] = "2026-03-02"
+    assert ledger.today_counts() == (0, {})   # cached counters are keyed by day
+    assert ledger.check("BTCUSDT")[0]
+    assert ledger.reserve("BTCUSDT")[0]
+    assert ledger.today_counts() == (1, {"BTCUSDT": 1})
+
+
+def test_old_days_expire(ledger, monkeypatch):
+    monkeypatch.setattr(config, "TRADE_LIMIT_RETENTION_DAYS", 7)
+    ledger.reserve("BTCUSDT")
+    ledger.day["value"] = "2026-03-05"
+    ledger.reserve("BTCUSDT")
+    ledger.day["value"] = "2026-03-09"
+    ledger.reserve("ETHUSDT")
+    days = [row[0] for row in sqlite3.connect(ledger.path).execute(
+        "SELECT DISTINCT day FROM trade_limits ORDER BY day")]
+    assert days == ["2026-03-05", "2026-03-09"]
+
+
+def test_counts_are_shared_across_connections(ledger):
+    other = TradeLimitLedger(ledger.path)
+    assert ledger.reserve("BTCUSDT")[0]
+    assert other.reserve("BTCUSDT")[0]
+    assert not ledger.check("BTCUSDT")[0]
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+import trade_store
+from trade_store import PAGE_LIMIT, TRADE_WINDOW_MS, TradeStore
+
+DAY_MS = 86400 * 1000
+
+
+class StubClient:
+    """userTrades / income pages the way Binance serves them"""
+
+    def __init__(self):
+        self.trades = []
+        self.calls = []
+
+    def add(self, symbol, times):
+        next_id = max([t["id"] for t in self.trades if t["symbol"] == symbol], default=1000)
+        for i, t in enumerate(times):
+            self.trades.append({"symbol": symbol, "id": next_id + 1 + i, "time": int(t), "side": "BUY",
+                                "qty": "0.01", "price": "100", "realizedPnl": "0", "commission": "0.01"})
+
+    def futures_account_trades(self, symbol, fromId=None, startTime=None, endTime=None, limit=500):
+        self.calls.append(("trades", symbol, fromId, startTime, endTime))
+        rows = sorted((t for t in self.trades if t["symbol"] == symbol), key=lambda t: t["id"])
+        if fromId is not None:
+            rows = [t for t in rows if t["id"] >= fromId]
+        else:
+            now = int(time.time() * 1000)
+            if startTime is None and endTime is None:
+                startTime, endTime = now - TRADE_WINDOW_MS, now
+            endTime = endTime if endTime is not None else startTime + TRADE_WINDOW_MS
+            startTime = startTime if startTime is not None else endTime - TRADE_WINDOW_MS
+            if endTime - startTime > TRADE_WINDOW_MS:
+                raise ValueError("-4166 Search window is restricted to recent 7 days only")
+            rows = [t for t in rows if startTime <= t["time"] <= endTime]
+        return rows[:limit]
+
+    def futures_income_history(self, incomeType, startTime, limit=100):
+        self.calls.append(("income", startTime))
+        rows = sorted((t for t in self.trades if t["time"] >= startTime), key=lambda t: t["time"])
+        return [{"symbol": t["symbol"], "time": t["time"], "incomeType": incomeType} for t in rows[:limit]]
+
+    def count(self, kind, symbol=None):
+        return sum(1 for c in self.calls if c[0] == kind and (symbol is None or c[1] == symbol))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TradeStore(str(tmp_path / "trades.db"))
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def test_first_sync_backfills_from_the_lookback_start(store):
+    client = StubClient()
+    old = now_ms() - 80 * DAY_MS
+    client.add("BTCUSDT", [old + i * 1000 for i in range(2500)])   # older than the 7-day default
+    client.add("BTCUSDT", [now_ms() - 3600 * 1000])
+    store.sync(client, min_interval=0)
+    assert store.count(symbol="BTCUSDT") == 2501
+    assert store._get_cursor("trade:BTCUSDT") == 1000 + 2501
+    windows = [c for c in client.calls if c[0] == "trades" and c[2] is None]
+    assert all(c[4] - c[3] < TRADE_WINDOW_MS for c in windows)
+    assert windows[0][3] <= now_ms() - trade_store.INITIAL_LOOKBACK_MS + 60000
+
+
+def test_fills_past_the_lookback_are_not_fetched(store):
+    client = StubClient()
+    client.add("ETHUSDT", [now_ms() - 120 * DAY_MS, now_ms() - 60 * DAY_MS])
+    store.sync(client, min_interval=0)
+    assert store.count(symbol="ETHUSDT") == 1
+
+
+def test_cursor_advances_and_later_syncs_fetch_only_new_fills(store):
+    client = StubClient()
+    client.add("BTCUSDT", [now_ms() - 2 * DAY_MS + i for i in range(1500)])
+    store.sync(client, min_interval=0)
+    assert store._get_cursor("trade:BTCUSDT") == 2500
+
+    client.calls.clear()
+    store.sync(client, min_interval=0)
+    assert client.count("trades") == 0   # the income feed shows nothing new
+
+    client.add("BTCUSDT", [now_ms() + i for i in range(3)])
+    client.add("SOLUSDT", [now_ms()])
+    client.calls.clear()
+    store.sync(client, min_interval=0)
+    btc = [c for c in client.calls if c[0] == "trades" and c[1] == "BTCUSDT"]
+    assert [c[2] for c in btc] == [2501]   # straight from the cursor, no window scan
+    assert store.count(symbol="BTCUSDT") == 1503
+    assert store.count(symbol="SOLUSDT") == 1
+    assert store._get_cursor("trade:BTCUSDT") == 2503
+
+
+def test_full_pages_keep_paging(store):
+    client = StubClient()
+    client.add("BTCUSDT", [now_ms() - DAY_MS + i for i in range(PAGE_LIMIT * 2)])
+    store.sync(client, min_interval=0)
+    from_ids = [c[2] for c in client.calls if c[0] == "trades" and c[2] is not None]
+    assert from_ids == [1001, 1001 + PAGE_LIMIT, 1001 + 2 * PAGE_LIMIT]
+    assert store.count() == PAGE_LIMIT * 2
+
+
+def test_recent_sync_is_skipped(store):
+    client = StubClient()
+    store.sync(client, min_interval=0)
+    client.calls.clear()
+    store.sync(client, min_interval=60)
+    assert client.calls == []
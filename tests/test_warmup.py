@@ -0,0 +1,46 @@
+import types
+
+import pytest
+
+import clock
+import config
+import logic
+import warmup
+
+
+class Transport:
+    def __init__(self):
+        self.down = True
+
+    def request(self, method, path):
+        if self.down:
+            raise ConnectionError("connection refused")
+        return types.SimpleNamespace(json=lambda: {"serverTime": 0})
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    transport = Transport()
+    monkeypatch.setattr(clock, "_tracker", None)
+    monkeypatch.setattr(logic, "get_transport", lambda: transport)
+    monkeypatch.setattr(clock.ClockTracker, "start", lambda self: None)   # no background thread
+    monkeypatch.setattr(config, "CLOCK_SYNC_BURST", 1)
+    return transport
+
+
+def test_failed_clock_sync_fails_the_step(transport):
+    w = warmup.WarmUp()
+    assert not w._step("clock", warmup._sync_clock)
+    assert w.steps["clock"]["status"] == "failed"
+    assert "connection refused" in w.steps["clock"]["error"]
+
+
+def test_clock_step_retries_until_a_burst_succeeds(transport):
+    w = warmup.WarmUp()
+    assert not w._step("clock", warmup._sync_clock)
+    transport.down = False
+    assert w._step("clock", warmup._sync_clock)
+    assert w.steps["clock"]["status"] == "ok"
+    assert clock.synced()
+    transport.down = True
+    assert w._step("clock", warmup._sync_clock)   # synced once: no new burst needed
@@ -0,0 +1,196 @@
+# trade_limits.py
+# Daily trade-limit ledger shared by every request, browser, worker and
+# server process: one SQLite row per (day, symbol) plus a per-day total row,
+# in the trade database. A slot is reserved atomically before the entry
+# order goes out and released if the bracket fails, so concurrent
+# submissions cannot overshoot the limits. Old days expire; a lost ledger
+# is rebuilt from the local fills (trade_store).
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import config
+import logs
+
+TOTAL = ""   # symbol key of the per-day total row
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trade_limits (
+    day    TEXT    NOT NULL,
+    symbol TEXT    NOT NULL,
+    count  INTEGER NOT NULL,
+    PRIMARY KEY (day, symbol)
+);
+"""
+
+# One entry = the opening fills (no realized P&L) of one market order, which
+# share a timestamp and side. Used only to rebuild a lost ledger.
+REBUILD_SQL = """
+INSERT INTO trade_limits (day, symbol, count)
+SELECT ?, symbol, COUNT(DISTINCT time || side)
+FROM trades
+WHERE realized_pnl = 0 AND time >= ? AND time < ?
+GROUP BY symbol
+"""
+
+
+def today():
+    return datetime.utcnow().date().isoformat()
+
+
+def _day_bounds_ms(day):
+    start = datetime.fromisoformat(day).replace(tzinfo=timezone.utc)
+    return int(start.timestamp() * 1000), int((start + timedelta(days=1)).timestamp() * 1000)
+
+
+def limit_check(total, symbol_count, symbol):
+    """(allowed, message) for one day's counters"""
+    if total >= config.MAX_TRADES_PER_DAY:
+        return False, f"❌ Daily limit reached ({config.MAX_TRADES_PER_DAY} trades)"
+    if symbol_count >= config.MAX_TRADES_PER_SYMBOL_PER_DAY:
+        return False, f"❌ Symbol limit reached ({config.MAX_TRADES_PER_SYMBOL_PER_DAY} trades for {symbol} today)"
+    return True, "OK"
+
+
+class TradeLimitLedger:
+    """
+    Reads are served from an in-process copy of today's counters, reloaded
+    only when SQLite reports a commit from any connection (data_version).
+    Writes run in BEGIN IMMEDIATE transactions, which serialize across
+    processes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or config.TRADE_DB_PATH
+        self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        created = self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'trade_limits'").fetchone() is None
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._cache = None          # (day, data_version, {symbol: count})
+        self._expired_day = None
+        if created:
+            self.rebuild()
+
+    # ── reads ────────────────────────────────────────────────────
+    def _counts(self, day):
+        """{symbol: count} for day; caller holds the lock"""
+        version = self.db.execute("PRAGMA data_version").fetchone()[0]
+        if self._cache is not None and self._cache[0] == day and self._cache[1] == version:
+            return self._cache[2]
+        counts = dict(self.db.execute("SELECT symbol, count FROM trade_limits WHERE day = ?", (day,)).fetchall())
+        self._cache = (day, version, counts)
+        return counts
+
+    def today_counts(self):
+        """(total, {symbol: count}) for today"""
+        with self._lock:
+            counts = self._counts(today())
+        return counts.get(TOTAL, 0), {s: n for s, n in counts.items() if s != TOTAL and n > 0}
+
+    def check(self, symbol):
+        with self._lock:
+            counts = self._counts(today())
+        return limit_check(counts.get(TOTAL, 0), counts.get(symbol, 0), symbol)
+
+    # ── writes ───────────────────────────────────────────────────
+    def _add(self, day, symbol, delta):
+        for key in (TOTAL, symbol):
+            self.db.execute(
+                "INSERT INTO trade_limits (day, symbol, count) VALUES (?, ?, MAX(?, 0)) "
+                "ON CONFLICT (day, symbol) DO UPDATE SET count = MAX(count + ?, 0)",
+                (day, key, delta, delta))
+
+    def _write(self, fn):
+        """Run fn(day) in one cross-process write transaction"""
+        day = today()
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(day)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self._cache = None
+            if self._expired_day != day:
+                self._expire(day)
+            return result
+
+    def reserve(self, symbol):
+        """Check and count one trade atomically; (allowed, message)"""
+        def reserve_slot(day):
+            row = dict(self.db.execute(
+                "SELECT symbol, count FROM trade_limits WHERE day = ? AND symbol IN (?, ?)",
+                (day, TOTAL, symbol)).fetchall())
+            allowed, message = limit_check(row.get(TOTAL, 0), row.get(symbol, 0), symbol)
+            if allowed:
+                self._add(day, symbol, 1)
+            return allowed, message
+        return self._write(reserve_slot)
+
+    def release(self, symbol):
+        """Give back a reserved slot (the trade did not open)"""
+        self._write(lambda day: self._add(day, symbol, -1))
+
+    def record(self, symbol):
+        """Count a trade without checking the limits"""
+        self._write(lambda day: self._add(day, symbol, 1))
+
+    # ── maintenance ──────────────────────────────────────────────
+    def _expire(self, day):
+        """Drop days older than TRADE_LIMIT_RETENTION_DAYS; caller holds the lock"""
+        cutoff = (datetime.fromisoformat(day) - timedelta(days=config.TRADE_LIMIT_RETENTION_DAYS)).date().isoformat()
+        self.db.execute("DELETE FROM trade_limits WHERE day < ?", (cutoff,))
+        self._expired_day = day
+
+    def rebuild(self, day=None):
+        """Recount a day's trades from the local fills table (trade_store)"""
+        day = day or today()
+        start_ms, end_ms = _day_bounds_ms(day)
+        with self._lock:
+            has_trades = self.db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'trades'").fetchone()
+            if not has_trades:
+                return
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute("DELETE FROM trade_limits WHERE day = ?", (day,))
+                self.db.execute(REBUILD_SQL, (day, start_ms, end_ms))
+                self.db.execute(
+                    "INSERT INTO trade_limits (day, symbol, count) "
+                    "SELECT ?, ?, COALESCE(SUM(count), 0) FROM trade_limits WHERE day = ?",
+                    (day, TOTAL, day))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self._cache = None
+        logs.info("trade_limits_rebuilt", day=day)
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = TradeLimitLedger()
+    return _ledger
+
+
+# ────────────────────────────────────────────────────────────────
+#      python trade_limits.py [--rebuild [YYYY-MM-DD]]
+# ────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    import sys
+
+    ledger = get_ledger()
+    if len(sys.argv) > 1 and sys.argv[1] == "--rebuild":
+        ledger.rebuild(sys.argv[2] if len(sys.argv) > 2 else None)
+    total, symbols = ledger.today_counts()
+    print(f"{today()}: {total}/{config.MAX_TRADES_PER_DAY} trades  {symbols}")
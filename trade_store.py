@@ -0,0 +1,216 @@
+# trade_store.py
+# Local SQLite copy of account fills. Each sync downloads only what is new:
+# the COMMISSION income feed (one account-wide call) tells which symbols
+# traded since the last sync, and each of those is pulled from its own
+# fromId cursor. A symbol's first sync walks forward from the lookback
+# start in 7-day windows (userTrades without startTime/fromId only returns
+# the last 7 days) until it finds its first fill. Queries are served from
+# the local table.
+
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import config
+
+PAGE_LIMIT = 1000                  # max rows per userTrades / income call
+INITIAL_LOOKBACK_MS = 90 * 86400 * 1000
+TRADE_WINDOW_MS = 7 * 86400 * 1000  # widest startTime/endTime range userTrades accepts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    symbol       TEXT    NOT NULL,
+    id           INTEGER NOT NULL,
+    time         INTEGER NOT NULL,
+    side         TEXT    NOT NULL,
+    qty          REAL    NOT NULL,
+    price        REAL    NOT NULL,
+    realized_pnl REAL    NOT NULL,
+    commission   REAL    NOT NULL,
+    PRIMARY KEY (symbol, id)
+);
+CREATE INDEX IF NOT EXISTS trades_time ON trades (time DESC, id DESC);
+CREATE INDEX IF NOT EXISTS trades_symbol_time ON trades (symbol, time DESC);
+CREATE TABLE IF NOT EXISTS cursors (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+COLUMNS = "id, symbol, time, side, qty, price, realized_pnl, commission"
+
+
+def format_row(row):
+    """DB row -> the dict shape the dashboard and CSV export use"""
+    return {
+        'id': row[0],
+        'symbol': row[1],
+        'time': datetime.fromtimestamp(row[2] / 1000).strftime("%Y-%m-%d %H:%M:%S"),
+        'time_ms': row[2],
+        'side': row[3],
+        'qty': row[4],
+        'price': row[5],
+        'realized_pnl': row[6],
+        'commission': row[7]
+    }
+
+
+class TradeStore:
+    def __init__(self, path=None):
+        self.path = path or config.TRADE_DB_PATH
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.last_sync = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    # ── cursors ──────────────────────────────────────────────────
+    def _get_cursor(self, name):
+        with self._lock:
+            row = self.db.execute("SELECT value FROM cursors WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_cursor(self, name, value):
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO cursors (name, value) VALUES (?, ?)", (name, value))
+            self.db.commit()
+
+    # ── sync ─────────────────────────────────────────────────────
+    def _insert(self, trades):
+        rows = [(
+            t['symbol'], t['id'], t['time'],
+            'LONG' if t['side'] == 'BUY' else 'SHORT',
+            float(t['qty']), float(t['price']),
+            float(t['realizedPnl']), float(t['commission'])
+        ) for t in trades]
+        with self._lock:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO trades (symbol, id, time, side, qty, price, realized_pnl, commission) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.commit()
+
+    def _symbols_with_new_fills(self, client):
+        """Symbols that paid commission since the income cursor (one call per 1000 fills)"""
+        start = self._get_cursor('income')
+        if start is None:
+            start = int(time.time() * 1000) - INITIAL_LOOKBACK_MS
+
+        symbols = set()
+        while True:
+            income = client.futures_income_history(
+                incomeType="COMMISSION", startTime=start, limit=PAGE_LIMIT)
+            for item in income:
+                if item.get('symbol'):
+                    symbols.add(item['symbol'])
+            if income:
+                start = max(int(item['time']) for item in income) + 1
+            if len(income) < PAGE_LIMIT:
+                break
+        return symbols, start
+
+    def _first_trade_id(self, client, symbol):
+        """Id of the symbol's first fill within the lookback, scanning 7-day windows; None if there is none"""
+        now = int(time.time() * 1000)
+        start = now - INITIAL_LOOKBACK_MS
+        while start <= now:
+            trades = client.futures_account_trades(
+                symbol=symbol, startTime=start, endTime=min(start + TRADE_WINDOW_MS - 1, now),
+                limit=PAGE_LIMIT)
+            if trades:
+                return min(t['id'] for t in trades)
+            start += TRADE_WINDOW_MS
+        return None
+
+    def _sync_symbol(self, client, symbol):
+        last_id = self._get_cursor(f"trade:{symbol}")
+        if last_id is None:
+            first_id = self._first_trade_id(client, symbol)
+            if first_id is None:
+                return
+            last_id = first_id - 1
+        while True:
+            trades = client.futures_account_trades(
+                symbol=symbol, fromId=last_id + 1, limit=PAGE_LIMIT)
+            if not trades:
+                break
+            self._insert(trades)
+            last_id = max(t['id'] for t in trades)
+            self._set_cursor(f"trade:{symbol}", last_id)
+            if len(trades) < PAGE_LIMIT:
+                break
+
+    def sync(self, client, min_interval=None):
+        """Fetch only fills newer than the stored cursors; skipped if synced recently"""
+        if min_interval is None:
+            min_interval = config.TRADE_SYNC_INTERVAL
+        if time.time() - self.last_sync < min_interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return  # another thread is already syncing
+        try:
+            symbols, income_cursor = self._symbols_with_new_fills(client)
+            for symbol in sorted(symbols):
+                self._sync_symbol(client, symbol)
+            self._set_cursor('income', income_cursor)
+            self.last_sync = time.time()
+        finally:
+            self._sync_lock.release()
+
+    # ── queries ──────────────────────────────────────────────────
+    def _where(self, symbol, start_ms, end_ms):
+        clauses, args = [], []
+        if symbol:
+            clauses.append("symbol = ?")
+            args.append(symbol)
+        if start_ms is not None:
+            clauses.append("time >= ?")
+            args.append(int(start_ms))
+        if end_ms is not None:
+            clauses.append("time < ?")
+            args.append(int(end_ms))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def query(self, symbol=None, start_ms=None, end_ms=None, limit=500, offset=0):
+        """Newest first, paged"""
+        where, args = self._where(symbol, start_ms, end_ms)
+        sql = f"SELECT {COLUMNS} FROM trades{where} ORDER BY time DESC, id DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self.db.execute(sql, args + [int(limit), int(offset)]).fetchall()
+        return [format_row(r) for r in rows]
+
+    def iter_batches(self, symbol=None, start_ms=None, end_ms=None, batch_size=1000):
+        """
+        Raw rows (COLUMNS order), newest first, in batches of batch_size.
+        Uses its own read connection so a long export never holds the
+        store lock; WAL lets it read while syncs write.
+        """
+        where, args = self._where(symbol, start_ms, end_ms)
+        db = sqlite3.connect(self.path)
+        try:
+            cursor = db.execute(f"SELECT {COLUMNS} FROM trades{where} ORDER BY time DESC, id DESC", args)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            db.close()
+
+    def count(self, symbol=None, start_ms=None, end_ms=None):
+        where, args = self._where(symbol, start_ms, end_ms)
+        with self._lock:
+            return self.db.execute(f"SELECT COUNT(*) FROM trades{where}", args).fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TradeStore()
+    return _store
@@ -0,0 +1,176 @@
+# warmup.py
+# Start-up in the background: clock sync, client connect, then exchangeInfo,
+# balance, the price / user-data streams and the candle sync in parallel.
+# Nothing here runs inside a request: until the client is connected
+# logic.get_client() returns None at once and routes serve cached or
+# degraded data. GET /ready reports the state of each step.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import clock
+import config
+import kline_store
+import logic
+import logs
+import market_data
+import metrics
+
+RETRY_DELAY_MAX = 30   # seconds between connect attempts
+
+NOT_CONFIGURED = "not_configured"
+STARTING = "starting"
+RETRYING = "retrying"
+READY = "ready"
+DEGRADED = "degraded"   # connected, but a preload step failed (served lazily instead)
+
+SERVING_STATES = (READY, DEGRADED)
+
+
+def _sync_clock():
+    """First clock burst; the tracker swallows its errors, so check the outcome here"""
+    logic.sync_time_with_binance()
+    if not clock.synced():
+        state = clock.snapshot() or {}
+        raise Exception(f"Clock sync failed: {state.get('last_error')}")
+
+
+def _load_balance():
+    if logic.get_live_balance()[0] is None:
+        raise Exception("Balance unavailable")
+
+
+def _start_price_stream():
+    if config.USE_PRICE_STREAM:
+        market_data.start()
+
+
+def _start_user_stream():
+    if config.USE_USER_STREAM:
+        logic.get_account_state()
+
+
+def _start_kline_store():
+    if config.USE_KLINE_STORE:
+        kline_store.start(logic.get_all_exchange_symbols)
+
+
+# Run concurrently once the client is connected
+PRELOAD_STEPS = (
+    ("exchange_info", logic._exchange_info),
+    ("balance", _load_balance),
+    ("price_stream", _start_price_stream),
+    ("user_stream", _start_user_stream),
+    ("kline_store", _start_kline_store),
+)
+
+
+class WarmUp:
+    def __init__(self):
+        self.state = STARTING
+        self.steps = {}
+        self.attempts = 0
+        self.started_at = None
+        self.ready_at = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.started_at = time.time()
+            if not config.CREDENTIALS_ERROR:
+                logic.defer_connect()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        """True once the client is connected and the preloads have run"""
+        return self._ready.wait(timeout)
+
+    def _step(self, name, fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+            self.steps[name] = {"status": "ok", "ms": round((time.perf_counter() - t0) * 1000, 1)}
+            return True
+        except Exception as e:
+            self.steps[name] = {"status": "failed", "ms": round((time.perf_counter() - t0) * 1000, 1),
+                                "error": str(e)}
+            return False
+
+    def _connect(self):
+        if logic.connect_client() is None:
+            raise Exception("Binance client not connected")
+
+    def _run(self):
+        if config.CREDENTIALS_ERROR:
+            self.state = NOT_CONFIGURED
+            self.steps["credentials"] = {"status": "failed", "error": config.CREDENTIALS_ERROR}
+            logs.error("warmup_not_configured", error=config.CREDENTIALS_ERROR)
+            return
+
+        delay = 1
+        while True:
+            self.attempts += 1
+            if self._step("clock", _sync_clock) and self._step("client", self._connect):
+                break
+            if self.attempts == 1:
+                logic.defer_connect(False)   # requests may try too while we back off
+            self.state = RETRYING
+            logs.warning("warmup_retry", attempt=self.attempts, retry_in=delay,
+                         steps={n: s.get("error") for n, s in self.steps.items() if s["status"] == "failed"})
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_DELAY_MAX)
+        logic.defer_connect(False)
+
+        with ThreadPoolExecutor(max_workers=len(PRELOAD_STEPS), thread_name_prefix="warmup") as pool:
+            ok = all(pool.map(lambda step: self._step(*step), PRELOAD_STEPS))
+
+        self.state = READY if ok else DEGRADED
+        self.ready_at = time.time()
+        self._ready.set()
+        logs.info("warmup_done", state=self.state, attempts=self.attempts,
+                  ms=round((self.ready_at - self.started_at) * 1000, 1),
+                  failed=[n for n, s in self.steps.items() if s["status"] != "ok"])
+
+    def snapshot(self):
+        now = self.ready_at or time.time()
+        return {
+            "state": self.state,
+            "ready": self.state in SERVING_STATES,
+            "elapsed_ms": round((now - self.started_at) * 1000, 1) if self.started_at else None,
+            "attempts": self.attempts,
+            "steps": dict(self.steps)
+        }
+
+
+_warmup = WarmUp()
+
+
+def start():
+    """Begin warming up (once per process); returns immediately"""
+    _warmup.start()
+
+
+def wait(timeout=None):
+    return _warmup.wait(timeout)
+
+
+def is_ready():
+    return _warmup.state in SERVING_STATES
+
+
+def snapshot():
+    return _warmup.snapshot()
+
+
+def _collect():
+    return [("app_ready", "gauge", "1 once start-up warm-up has connected and preloaded",
+             [({"state": _warmup.state}, 1 if is_ready() else 0)])]
+
+
+metrics.REGISTRY.add_collector(_collect)